@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Encoder Backend Benchmark for Caliper-AI
+Measures throughput of the torch, onnx-fp32 and onnx-int8 backends on
+snippet texts and checks cosine-similarity parity against torch.
+
+    python scripts/bench_encoders.py [csv_path] [n_texts]
+"""
+
+import os
+import sys
+import time
+import logging
+from typing import Dict, List
+import numpy as np
+import pandas as pd
+from encoder_backends import BACKENDS
+from local_embeddings import create_encoder
+
+# Configure logging based on environment variable
+log_level = logging.DEBUG if os.getenv('DEBUG') else logging.WARNING
+logging.basicConfig(level=log_level, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# A backend passes parity when its worst per-text cosine to torch is at least this
+PARITY_THRESHOLD = 0.99
+BATCH_SIZE = 32
+
+
+def load_texts(csv_path: str, n_texts: int) -> List[str]:
+    # Snippet texts, repeated until there are n_texts of them
+    texts = pd.read_csv(csv_path)['snippet_text'].astype(str).tolist()
+    return (texts * (-(-n_texts // len(texts))))[:n_texts]
+
+
+def cosine_rows(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    # Row-wise cosine similarity between two embedding matrices
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return (a * b).sum(axis=1)
+
+
+def run_benchmark(csv_path: str = "data/diy_snippets.csv", n_texts: int = 1000) -> Dict[str, Dict[str, float]]:
+    # Encode the same texts with every backend and compare against torch
+    texts = load_texts(csv_path, n_texts)
+    results: Dict[str, Dict[str, float]] = {}
+    reference = None
+
+    for backend in BACKENDS:
+        encoder = create_encoder(backend)
+        if encoder is None:
+            logger.error(f"Skipping {backend}: encoder unavailable")
+            continue
+
+        # Warm up so one-time graph setup is not counted
+        encoder.encode(texts[:BATCH_SIZE], batch_size=BATCH_SIZE, convert_to_numpy=True)
+
+        start = time.perf_counter()
+        embeddings = encoder.encode(texts, batch_size=BATCH_SIZE, convert_to_numpy=True,
+                                    show_progress_bar=False)
+        elapsed = time.perf_counter() - start
+
+        if reference is None:
+            reference = embeddings
+        cosines = cosine_rows(np.asarray(embeddings, dtype=np.float32), reference)
+        results[backend] = {
+            'seconds': elapsed,
+            'texts_per_sec': len(texts) / elapsed,
+            'mean_cosine': float(cosines.mean()),
+            'min_cosine': float(cosines.min()),
+        }
+
+    if 'torch' in results:
+        for backend in results:
+            results[backend]['speedup'] = results['torch']['seconds'] / results[backend]['seconds']
+    return results
+
+
+def main() -> bool:
+    # Run the benchmark and print a small report
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else "data/diy_snippets.csv"
+    n_texts = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+
+    results = run_benchmark(csv_path, n_texts)
+    print(f"Encoder backend benchmark ({n_texts} texts, batch size {BATCH_SIZE})")
+    print("=" * 72)
+    print(f"  {'backend':<10} {'texts/sec':>10} {'speedup':>8} {'mean cos':>9} {'min cos':>9}  parity")
+
+    passed = True
+    for backend, stats in results.items():
+        ok = stats['min_cosine'] >= PARITY_THRESHOLD
+        passed = passed and ok
+        print(f"  {backend:<10} {stats['texts_per_sec']:>10.1f} {stats.get('speedup', 1.0):>7.2f}x "
+              f"{stats['mean_cosine']:>9.4f} {stats['min_cosine']:>9.4f}  {'✅' if ok else '❌'}")
+    return passed
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
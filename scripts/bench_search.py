@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Vector Search Benchmark for Caliper-AI
+Compares latency and recall@k of the in-process NumPy engine (exact and IVF)
+against ChromaDB on a synthetic clustered corpus of 384-dim unit vectors, and
+the recall-vs-memory trade-off of fp16 / int8 / PQ storage with and without
+exact re-ranking, and of PCA projections to fewer dimensions.
+
+    python scripts/bench_search.py [n_vectors] [n_queries]
+"""
+
+import os
+import sys
+import time
+import shutil
+import logging
+import tempfile
+from typing import Callable, Dict, List
+import numpy as np
+from numpy_search import NumpySearchIndex, normalize_rows
+from vector_codecs import STORAGE_TYPES
+from projection import Projection
+
+# Configure logging based on environment variable
+log_level = logging.DEBUG if os.getenv('DEBUG') else logging.WARNING
+logging.basicConfig(level=log_level, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DIM = 384
+TOP_K = 10
+PROJECTION_DIMS = (128, 64)
+PROJECTION_FIT_ROWS = 20000
+
+
+def make_corpus(n_vectors: int, n_queries: int, seed: int = 0):
+    # Clustered unit vectors (closer to real embeddings than uniform noise) and nearby queries
+    rng = np.random.default_rng(seed)
+    centers = normalize_rows(rng.standard_normal((max(8, n_vectors // 500), DIM)))
+    assignment = rng.integers(0, len(centers), n_vectors)
+    vectors = normalize_rows(centers[assignment] + 0.6 * rng.standard_normal((n_vectors, DIM)) / np.sqrt(DIM) * 4)
+    picks = rng.integers(0, n_vectors, n_queries)
+    queries = normalize_rows(vectors[picks] + 0.3 * rng.standard_normal((n_queries, DIM)) / np.sqrt(DIM) * 4)
+    return vectors.astype(np.float32), queries.astype(np.float32)
+
+
+def recall_at_k(truth: List[List[str]], found: List[List[str]]) -> float:
+    # Mean fraction of the exact top-k that each engine returned
+    return float(np.mean([len(set(t) & set(f)) / len(t) for t, f in zip(truth, found)]))
+
+
+def time_queries(search: Callable[[np.ndarray], List[List[str]]], queries: np.ndarray) -> Dict[str, object]:
+    # Per-query latency (one query per call, like interactive traffic)
+    latencies, found = [], []
+    for query in queries:
+        start = time.perf_counter()
+        found.extend(search(query[None, :]))
+        latencies.append((time.perf_counter() - start) * 1000.0)
+    return {'found': found, 'p50_ms': float(np.percentile(latencies, 50)),
+            'p95_ms': float(np.percentile(latencies, 95))}
+
+
+def run_benchmark(n_vectors: int = 100000, n_queries: int = 200) -> Dict[str, Dict[str, float]]:
+    vectors, queries = make_corpus(n_vectors, n_queries)
+    ids = [str(i) for i in range(n_vectors)]
+    empty_docs = [''] * n_vectors
+    metadatas = [{'category': 'bench'}] * n_vectors
+    workdir = tempfile.mkdtemp(prefix='caliper-bench-')
+    results: Dict[str, Dict[str, float]] = {}
+
+    try:
+        index = NumpySearchIndex.build(os.path.join(workdir, 'numpy'), ids, empty_docs, metadatas,
+                                       vectors, use_ivf=True)
+
+        def ids_of(hits):
+            return [[hit['id'] for hit in per_query] for per_query in hits]
+
+        exact = time_queries(lambda q: ids_of(index.search(q, TOP_K, exact=True)), queries)
+        truth = exact['found']
+        vector_mb = vectors.nbytes / 2 ** 20
+        results['numpy-exact'] = {'p50_ms': exact['p50_ms'], 'p95_ms': exact['p95_ms'], 'recall': 1.0,
+                                  'memory_mb': vector_mb}
+
+        ivf = time_queries(lambda q: ids_of(index.search(q, TOP_K)), queries)
+        results['numpy-ivf'] = {'p50_ms': ivf['p50_ms'], 'p95_ms': ivf['p95_ms'],
+                                'recall': recall_at_k(truth, ivf['found']), 'memory_mb': vector_mb}
+
+        # Compressed storage: exact scan over the codes, then optionally re-rank with float32 vectors
+        for storage in STORAGE_TYPES[1:]:
+            compressed = NumpySearchIndex.build(os.path.join(workdir, storage), ids, empty_docs, metadatas,
+                                                vectors, use_ivf=False, storage=storage)
+            for rerank in (False, True):
+                run = time_queries(lambda q: ids_of(compressed.search(q, TOP_K, rerank=rerank)), queries)
+                results[storage + ('+rerank' if rerank else '')] = {
+                    'p50_ms': run['p50_ms'], 'p95_ms': run['p95_ms'],
+                    'recall': recall_at_k(truth, run['found']), 'memory_mb': compressed.codec.nbytes / 2 ** 20}
+
+        # PCA projections fitted on a sample, as at ingest; queries are projected with the same matrix
+        for dims in PROJECTION_DIMS:
+            projection = Projection.fit(vectors[:PROJECTION_FIT_ROWS], dims)
+            projected = NumpySearchIndex.build(os.path.join(workdir, f"pca{dims}"), ids, empty_docs, metadatas,
+                                               projection.apply(vectors), use_ivf=False)
+            run = time_queries(lambda q: ids_of(projected.search(projection.apply(q), TOP_K)), queries)
+            results[f"pca-{dims}"] = {'p50_ms': run['p50_ms'], 'p95_ms': run['p95_ms'],
+                                      'recall': recall_at_k(truth, run['found']),
+                                      'memory_mb': projected.vectors.nbytes / 2 ** 20}
+
+        try:
+            import chromadb
+            client = chromadb.PersistentClient(path=os.path.join(workdir, 'chroma'))
+            collection = client.get_or_create_collection(name='bench', embedding_function=None)
+            batch = client.get_max_batch_size() if hasattr(client, 'get_max_batch_size') else 5000
+            for start in range(0, n_vectors, batch):
+                collection.add(ids=ids[start:start + batch],
+                               embeddings=vectors[start:start + batch].tolist())
+            chroma = time_queries(
+                lambda q: collection.query(query_embeddings=q.tolist(), n_results=TOP_K)['ids'], queries)
+            results['chroma'] = {'p50_ms': chroma['p50_ms'], 'p95_ms': chroma['p95_ms'],
+                                 'recall': recall_at_k(truth, chroma['found'])}
+        except ImportError:
+            logger.warning("chromadb not installed, skipping ChromaDB comparison")
+
+        return results
+
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    # Run the benchmark and print a small report
+    n_vectors = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    n_queries = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    results = run_benchmark(n_vectors, n_queries)
+    print(f"Vector search benchmark ({n_vectors} vectors, {n_queries} queries, top {TOP_K})")
+    print("=" * 60)
+    print(f"  {'engine':<12} {'p50 ms':>9} {'p95 ms':>9} {'recall@' + str(TOP_K):>10} {'scan MB':>9}")
+    for engine, stats in results.items():
+        memory = f"{stats['memory_mb']:>9.1f}" if 'memory_mb' in stats else f"{'-':>9}"
+        print(f"  {engine:<12} {stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} {stats['recall']:>10.3f} {memory}")
+
+
+if __name__ == "__main__":
+    main()
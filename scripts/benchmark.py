@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Retrieval Benchmark for Caliper-AI
+Replays a labeled query set through ingest -> embed -> search in a scratch
+workspace and reports per-stage latency percentiles, QPS, ingest throughput,
+peak RSS and recall@k. Results are saved as JSON and can be compared against
+an earlier run to flag regressions.
+
+    python scripts/benchmark.py [--queries data/benchmark_queries.jsonl] [--csv data/diy_snippets.csv]
+                                [--top-k 3] [--repeat 5] [--mode vector|hybrid]
+                                [--json out.json] [--baseline old.json] [--metrics]
+                                [--projection-dims 128] [--rerank]
+
+Query files are JSON Lines: {"query": "...", "relevant": ["13", ...]}.
+The embedding and query caches are off unless EMBEDDING_CACHE / QUERY_CACHE_SIZE
+are set, so repeated runs measure the model and the index rather than the caches.
+--metrics turns on stage tracing and adds the counters and stage histograms to the results.
+--projection-dims fits a PCA projection at ingest; compare its latency and recall@k
+against a full-dimension run with --baseline. --rerank adds the cross-encoder
+stage (within RERANK_BUDGET_MS) and reports its latency as its own stage.
+"""
+
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import logging
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import metrics
+
+# Configure logging based on environment variable
+log_level = logging.DEBUG if os.getenv('DEBUG') else logging.WARNING
+logging.basicConfig(level=log_level, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUERIES = "data/benchmark_queries.jsonl"
+DEFAULT_CSV = "data/diy_snippets.csv"
+
+# Allowed drift against a baseline before a metric counts as a regression
+LATENCY_THRESHOLD = 0.20    # relative increase of a p95
+THROUGHPUT_THRESHOLD = 0.20  # relative decrease of QPS or ingest rows/sec
+RSS_THRESHOLD = 0.20         # relative increase of peak RSS
+RECALL_THRESHOLD = 0.02      # absolute decrease of recall@k
+
+
+def load_labeled_queries(path: str) -> List[Dict[str, Any]]:
+    # Queries with the ids of the snippets that should be retrieved for them
+    with open(path, 'r', encoding='utf-8') as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    return [{'query': record['query'], 'relevant': [str(doc_id) for doc_id in record.get('relevant', [])]}
+            for record in records]
+
+
+def percentiles(samples_ms: List[float]) -> Dict[str, float]:
+    # p50 / p95 / p99 / mean of latency samples in milliseconds
+    samples = np.asarray(samples_ms, dtype=np.float64)
+    return {
+        'p50_ms': float(np.percentile(samples, 50)),
+        'p95_ms': float(np.percentile(samples, 95)),
+        'p99_ms': float(np.percentile(samples, 99)),
+        'mean_ms': float(samples.mean()),
+    }
+
+
+def recall_at_k(relevant: List[str], found: List[str], k: int) -> Optional[float]:
+    # Fraction of the relevant ids found in the top k; None for unlabeled queries
+    if not relevant:
+        return None
+    return len(set(relevant) & set(found[:k])) / len(relevant)
+
+
+def peak_rss_mb() -> float:
+    # Peak resident set size of this process (ru_maxrss is KiB on Linux, bytes on macOS)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024.0 * 1024.0) if sys.platform == 'darwin' else peak / 1024.0
+
+
+def run_benchmark(queries_path: str = DEFAULT_QUERIES, csv_path: str = DEFAULT_CSV, top_k: int = 3,
+                  repeat: int = 5, mode: str = 'vector', rerank: bool = False) -> Dict[str, Any]:
+    # Ingest into a scratch workspace, then replay the labeled queries
+    workdir = tempfile.mkdtemp(prefix='caliper-benchmark-')
+
+    # Point every on-disk index at the scratch workspace before the pipeline modules read their config
+    os.environ.setdefault('EMBEDDING_CACHE', '0')
+    os.environ.setdefault('QUERY_CACHE_SIZE', '0')
+    os.environ['CHROMA_PERSIST_DIRECTORY'] = os.path.join(workdir, 'chroma_db')
+    os.environ['KEYWORD_INDEX_DIR'] = os.path.join(workdir, 'keyword_index')
+    os.environ['NUMPY_INDEX_DIR'] = os.path.join(workdir, 'numpy_index')
+
+    try:
+        from local_embeddings import warm_up
+        from ingest_pipeline import stream_ingest
+        from vector_store import get_store
+        import numpy_search
+        import query_system
+        from reranker import get_reranker
+
+        labeled = load_labeled_queries(queries_path)
+        queries = [record['query'] for record in labeled]
+        results: Dict[str, Any] = {'config': {
+            'queries': len(queries), 'repeat': repeat, 'top_k': top_k, 'mode': mode, 'rerank': rerank,
+            'engine': query_system.SEARCH_ENGINE, 'csv': csv_path,
+            'projection_dims': int(os.getenv('PROJECTION_DIMS', '0')),
+        }}
+
+        # Model load is reported separately so it does not skew ingest throughput
+        model_load_s = warm_up()
+        if model_load_s is None:
+            raise RuntimeError("Embedding model failed to load")
+        results['model_load_s'] = model_load_s
+        if rerank and not get_reranker().warm_up():
+            raise RuntimeError("Cross-encoder failed to load")
+
+        # Ingest: read -> chunk -> embed -> write, from a cold store
+        store = get_store()
+        start = time.perf_counter()
+        totals = stream_ingest(csv_path, store, incremental=False)
+        if totals is None:
+            raise RuntimeError("Ingest failed")
+        if query_system.SEARCH_ENGINE == 'numpy':
+            numpy_search.build_from_store(numpy_search.DEFAULT_INDEX_DIR, store)
+        ingest_s = time.perf_counter() - start
+        results['ingest'] = {
+            'rows': totals['read'], 'indexed': totals['written'], 'seconds': ingest_s,
+            'rows_per_sec': totals['read'] / ingest_s if ingest_s else 0.0,
+            'write_batches': totals['batches'], 'write_retries': totals['retries'],
+        }
+
+        # Sequential replay, timing each stage of each query
+        depth = query_system.rerank_depth(top_k, rerank)
+        fetch_k = depth * query_system.CHUNK_OVERFETCH
+        stages: Dict[str, List[float]] = {'embed': [], 'search': []}
+        if rerank:
+            stages['rerank'] = []
+        stages['total'] = []
+        recalls: List[float] = []
+        for round_index in range(repeat):
+            for record in labeled:
+                t0 = time.perf_counter()
+                embedding = query_system.generate_query_embeddings([record['query']], store)
+                t1 = time.perf_counter()
+                if mode == 'hybrid':
+                    hits = query_system.hybrid_rank(record['query'], embedding[0], fetch_k, store)
+                else:
+                    hits = query_system.vector_search(embedding, fetch_k, store)[0]
+                found = query_system.collapse_to_parents(hits, depth)
+                t2 = time.perf_counter()
+                if rerank:
+                    found = get_reranker().rerank(record['query'], found, top_k, started=t0)
+                    stages['rerank'].append((time.perf_counter() - t2) * 1000.0)
+                t3 = time.perf_counter()
+
+                stages['embed'].append((t1 - t0) * 1000.0)
+                stages['search'].append((t2 - t1) * 1000.0)
+                stages['total'].append((t3 - t0) * 1000.0)
+                if round_index == 0:
+                    recall = recall_at_k(record['relevant'], [hit['id'] for hit in found], top_k)
+                    if recall is not None:
+                        recalls.append(recall)
+
+        results['latency'] = {stage: percentiles(samples) for stage, samples in stages.items()}
+        results['sequential_qps'] = len(stages['total']) / (sum(stages['total']) / 1000.0)
+
+        # Batched replay through search_many, the bulk / server path
+        start = time.perf_counter()
+        for _ in range(repeat):
+            query_system.search_many(queries, top_k, store, mode=mode, rerank=rerank)
+        results['batch_qps'] = len(queries) * repeat / (time.perf_counter() - start)
+
+        results[f'recall@{top_k}'] = float(np.mean(recalls)) if recalls else None
+        results['peak_rss_mb'] = peak_rss_mb()
+        if metrics.enabled():
+            snapshot = metrics.snapshot()
+            results['metrics'] = {key: snapshot[key] for key in ('counters', 'histograms', 'gauges')}
+        return results
+
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def find_regressions(current: Dict[str, Any], baseline: Dict[str, Any]) -> List[str]:
+    # Human-readable list of metrics that got worse than the baseline allows
+    regressions = []
+
+    def relative(new: float, old: float) -> float:
+        return (new - old) / old if old else 0.0
+
+    for stage, stats in current.get('latency', {}).items():
+        old = baseline.get('latency', {}).get(stage, {}).get('p95_ms')
+        if old and relative(stats['p95_ms'], old) > LATENCY_THRESHOLD:
+            regressions.append(f"{stage} p95 {stats['p95_ms']:.1f} ms vs {old:.1f} ms "
+                               f"(+{relative(stats['p95_ms'], old):.0%})")
+
+    for name, new, old in (
+        ('sequential QPS', current.get('sequential_qps'), baseline.get('sequential_qps')),
+        ('batch QPS', current.get('batch_qps'), baseline.get('batch_qps')),
+        ('ingest rows/sec', current.get('ingest', {}).get('rows_per_sec'),
+         baseline.get('ingest', {}).get('rows_per_sec')),
+    ):
+        if new is not None and old and -relative(new, old) > THROUGHPUT_THRESHOLD:
+            regressions.append(f"{name} {new:.1f} vs {old:.1f} ({relative(new, old):.0%})")
+
+    new_rss, old_rss = current.get('peak_rss_mb'), baseline.get('peak_rss_mb')
+    if new_rss is not None and old_rss and relative(new_rss, old_rss) > RSS_THRESHOLD:
+        regressions.append(f"peak RSS {new_rss:.0f} MB vs {old_rss:.0f} MB (+{relative(new_rss, old_rss):.0%})")
+
+    for key in current:
+        if key.startswith('recall@') and current[key] is not None and baseline.get(key) is not None:
+            if baseline[key] - current[key] > RECALL_THRESHOLD:
+                regressions.append(f"{key} {current[key]:.3f} vs {baseline[key]:.3f}")
+
+    return regressions
+
+
+def print_report(results: Dict[str, Any]) -> None:
+    # Print a small report
+    config = results['config']
+    print(f"📊 Caliper-AI retrieval benchmark ({config['queries']} queries x {config['repeat']}, "
+          f"top {config['top_k']}, {config['mode']}{' + rerank' if config['rerank'] else ''} / {config['engine']})")
+    print("=" * 60)
+    ingest = results['ingest']
+    print(f"  model load        {results['model_load_s'] * 1000:9.1f} ms")
+    print(f"  ingest            {ingest['rows']} rows ({ingest['indexed']} indexed) in {ingest['seconds']:.2f}s, "
+          f"{ingest['rows_per_sec']:.1f} rows/sec")
+    print(f"  {'stage':<10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for stage, stats in results['latency'].items():
+        print(f"  {stage:<10} {stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} {stats['p99_ms']:>9.2f}")
+    print(f"  sequential QPS    {results['sequential_qps']:9.1f}")
+    print(f"  batch QPS         {results['batch_qps']:9.1f}")
+    recall_key = f"recall@{config['top_k']}"
+    if results.get(recall_key) is not None:
+        print(f"  {recall_key:<17} {results[recall_key]:9.3f}")
+    print(f"  peak RSS          {results['peak_rss_mb']:9.1f} MB")
+
+
+def main() -> bool:
+    # Run the benchmark, optionally saving results and checking them against a baseline
+    args = sys.argv[1:]
+
+    def option(name: str, default: Optional[str] = None) -> Optional[str]:
+        return args[args.index(name) + 1] if name in args else default
+
+    if '--metrics' in args:
+        metrics.enable()
+    if '--projection-dims' in args:
+        # Read by projection.py on import, before the scratch collection is first written
+        os.environ['PROJECTION_DIMS'] = option('--projection-dims')
+
+    mode = option('--mode', 'vector')
+    if mode not in ('vector', 'hybrid'):
+        print(f"Unknown mode '{mode}', expected vector or hybrid")
+        return False
+
+    try:
+        results = run_benchmark(option('--queries', DEFAULT_QUERIES), option('--csv', DEFAULT_CSV),
+                                int(option('--top-k', '3')), int(option('--repeat', '5')), mode,
+                                '--rerank' in args)
+    except Exception as e:
+        logger.error(f"Benchmark failed: {e}")
+        return False
+
+    print_report(results)
+
+    out_path = option('--json')
+    if out_path:
+        with open(out_path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nSaved to {out_path}")
+
+    baseline_path = option('--baseline')
+    if baseline_path:
+        with open(baseline_path, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = find_regressions(results, baseline)
+        for regression in regressions:
+            print(f"❌ Regression: {regression}")
+        if regressions:
+            return False
+        print("✅ No regressions against baseline")
+
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
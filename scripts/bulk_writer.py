@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Bulk Write Path for Caliper-AI
+Splits writes into batches no larger than the store accepts and hands them
+to background writer threads through a bounded queue, so the caller can
+embed batch N+1 while batch N is being written. Failed batches are retried;
+upserts are keyed by id, so a retried batch never duplicates rows.
+
+    with BulkWriter(store) as writer:
+        for columns in embedded_chunks:
+            writer.submit(columns)
+    print(writer.stats())
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+import metrics
+
+# Configure logging based on environment variable
+log_level = logging.DEBUG if os.getenv('DEBUG') else logging.WARNING
+logging.basicConfig(level=log_level, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 0 means "the largest batch the store accepts" (client.get_max_batch_size())
+WRITE_BATCH_SIZE = int(os.getenv('WRITE_BATCH_SIZE', '0'))
+# Writer threads; ChromaDB's embedded SQLite store serializes writes, so more only help client/server stores
+WRITE_WORKERS = int(os.getenv('WRITE_WORKERS', '1'))
+# Batches waiting to be written; bounds memory when embedding outpaces the store
+WRITE_QUEUE_DEPTH = int(os.getenv('WRITE_QUEUE_DEPTH', '2'))
+WRITE_RETRIES = int(os.getenv('WRITE_RETRIES', '3'))
+RETRY_BACKOFF_S = 0.5
+
+# Used when the client cannot report its limit (older ChromaDB releases)
+FALLBACK_MAX_BATCH_SIZE = 5000
+
+_STOP = object()
+
+
+def max_batch_size(client, configured: int = WRITE_BATCH_SIZE) -> int:
+    # Largest batch the client accepts, capped by WRITE_BATCH_SIZE when set
+    try:
+        limit = int(client.get_max_batch_size())
+    except Exception:
+        limit = FALLBACK_MAX_BATCH_SIZE
+    return min(limit, configured) if configured > 0 else limit
+
+
+def split_batches(columns: Dict[str, List[Any]], batch_size: int) -> Iterator[Dict[str, List[Any]]]:
+    # Slice parallel columns ({'ids', 'documents', 'metadatas', 'embeddings'}) into batches
+    total = len(columns['ids'])
+    if total <= batch_size:
+        yield columns
+        return
+    for start in range(0, total, batch_size):
+        yield {key: values[start:start + batch_size] for key, values in columns.items()}
+
+
+def upsert_with_retry(collection, batch: Dict[str, List[Any]], retries: int = WRITE_RETRIES,
+                      backoff: float = RETRY_BACKOFF_S) -> int:
+    # Upsert one batch, retrying with exponential backoff; returns the number of retries used
+    for attempt in range(retries + 1):
+        try:
+            with metrics.span('upsert', rows=len(batch['ids'])):
+                collection.upsert(**batch)
+            return attempt
+        except Exception as e:
+            if attempt == retries:
+                raise
+            metrics.inc('write_retries_total')
+            logger.warning(f"Upsert of {len(batch['ids'])} rows failed (attempt {attempt + 1}), retrying: {e}")
+            time.sleep(backoff * 2 ** attempt)
+    return retries
+
+
+def bulk_upsert(store, columns: Dict[str, List[Any]], collection=None,
+                batch_size: Optional[int] = None, retries: int = WRITE_RETRIES) -> int:
+    # Write columns in store-sized batches on the calling thread; returns the number of rows written
+    collection = collection if collection is not None else store.collection()
+    batch_size = batch_size or max_batch_size(store.client)
+    written = 0
+    for batch in split_batches(columns, batch_size):
+        upsert_with_retry(collection, batch, retries)
+        store.mark_changed()
+        written += len(batch['ids'])
+        metrics.inc('write_batches_total')
+        metrics.inc('documents_stored_total', len(batch['ids']))
+    return written
+
+
+class BulkWriter:
+    # Writer threads draining a bounded queue of store-sized batches
+
+    def __init__(self, store, collection=None, batch_size: Optional[int] = None,
+                 workers: int = WRITE_WORKERS, queue_depth: int = WRITE_QUEUE_DEPTH,
+                 retries: int = WRITE_RETRIES):
+        self.store = store
+        self.collection = collection if collection is not None else store.collection()
+        self.batch_size = batch_size or max_batch_size(store.client)
+        self.retries = retries
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max(1, queue_depth))
+        self._lock = threading.Lock()
+        self._error: Optional[BaseException] = None
+        self._totals = {'rows': 0, 'batches': 0, 'retries': 0, 'write_seconds': 0.0}
+        self._started = time.perf_counter()
+        self._finished: Optional[float] = None
+        self._closed = False
+        self._threads = [threading.Thread(target=self._run, name=f"bulk-writer-{i}", daemon=True)
+                         for i in range(max(1, workers))]
+        for thread in self._threads:
+            thread.start()
+        logger.info(f"Bulk writer: {len(self._threads)} threads, batches of up to {self.batch_size} rows")
+
+    def _run(self) -> None:
+        while True:
+            batch = self._queue.get()
+            if batch is _STOP:
+                return
+            if self._error is not None:
+                # Keep draining so a blocked submit() can see the failure
+                continue
+            try:
+                start = time.perf_counter()
+                retries = upsert_with_retry(self.collection, batch, self.retries)
+                elapsed = time.perf_counter() - start
+                with self._lock:
+                    self.store.mark_changed()
+                    self._totals['rows'] += len(batch['ids'])
+                    self._totals['batches'] += 1
+                    self._totals['retries'] += retries
+                    self._totals['write_seconds'] += elapsed
+                metrics.inc('write_batches_total')
+                metrics.inc('documents_stored_total', len(batch['ids']))
+            except Exception as e:
+                logger.error(f"Giving up on batch of {len(batch['ids'])} rows: {e}")
+                with self._lock:
+                    if self._error is None:
+                        self._error = e
+
+    def _raise_if_failed(self) -> None:
+        if self._error is not None:
+            raise RuntimeError(f"Bulk write failed: {self._error}") from self._error
+
+    def submit(self, columns: Dict[str, List[Any]]) -> None:
+        # Queue columns for writing; blocks while the queue is full
+        if self._closed:
+            raise RuntimeError("Bulk writer is closed")
+        for batch in split_batches(columns, self.batch_size):
+            self._raise_if_failed()
+            self._queue.put(batch)
+
+    def _shutdown(self) -> None:
+        if not self._closed:
+            self._closed = True
+            for _ in self._threads:
+                self._queue.put(_STOP)
+            for thread in self._threads:
+                thread.join()
+            self._finished = time.perf_counter()
+
+    def close(self) -> Dict[str, float]:
+        # Wait for queued batches to be written; raises if any batch could not be written
+        self._shutdown()
+        self._raise_if_failed()
+        return self.stats()
+
+    def stats(self) -> Dict[str, float]:
+        # Rows, batches and retries so far, with throughput over the writer's lifetime
+        with self._lock:
+            stats = dict(self._totals)
+        stats['seconds'] = (self._finished or time.perf_counter()) - self._started
+        stats['rows_per_sec'] = stats['rows'] / stats['seconds'] if stats['seconds'] else 0.0
+        return stats
+
+    def __enter__(self) -> "BulkWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        if exc_type is not None:
+            # The producer failed: stop writing but let the original exception propagate
+            with self._lock:
+                if self._error is None:
+                    self._error = exc
+            self._shutdown()
+            return False
+        self.close()
+        return False
@@ -8,7 +8,6 @@ Complete end-to-end demo of the RAG system for DIY project assistance.
 import os
 import sys
 import logging
-import time
 from typing import List, Dict, Any
 
 # Configure logging based on environment variable
@@ -23,9 +22,8 @@ def run_demo():
     print("=" * 50)
     print("This demo shows the complete RAG pipeline:")
     print("1. Load DIY data from CSV")
-    print("2. Setup ChromaDB collection")
-    print("3. Generate embeddings for semantic search")
-    print("4. Query the system for relevant DIY guidance")
+    print("2. Embed each snippet once and store it in ChromaDB")
+    print("3. Query the system for relevant DIY guidance")
     print("=" * 50)
     
     # Step 1: Load data
@@ -43,49 +41,29 @@ def run_demo():
         print(f"❌ Error loading data: {e}")
         return False
     
-    # Step 2: Setup ChromaDB
-    print("\n🗄️ Step 2: Setting up ChromaDB...")
+    # Step 2: Single-pass ingest
+    print("\n🧠 Step 2: Embedding and storing snippets...")
     try:
-        from setup_chroma import setup_chroma_collection, store_documents, verify_collection
-        client, collection = setup_chroma_collection()
-        if collection:
-            print("✅ ChromaDB collection ready")
-            if store_documents(collection, documents):
-                print("✅ Documents stored in ChromaDB")
-                verify_collection(collection)
-            else:
-                print("❌ Failed to store documents")
-                return False
+        from vector_store import get_store
+        from ingest_pipeline import stream_ingest
+        from setup_chroma import verify_collection
+        store = get_store()
+        # Each snippet is embedded once with the local encoder and written once
+        totals = stream_ingest("data/diy_snippets.csv", store)
+        if totals is not None:
+            print(f"✅ Ingested {totals['read']} snippets ({totals['written']} new or changed rows embedded)")
+            verify_collection(store.collection())
         else:
-            print("❌ Failed to setup ChromaDB")
+            print("❌ Failed to ingest snippets")
             return False
     except Exception as e:
-        print(f"❌ Error setting up ChromaDB: {e}")
+        print(f"❌ Error ingesting snippets: {e}")
         return False
     
-    # Step 3: Generate embeddings
-    print("\n🧠 Step 3: Generating embeddings...")
+    # Step 3: Demo queries
+    print("\n🔍 Step 3: Testing semantic search...")
     try:
-        from generate_embeddings import generate_embeddings_for_documents, store_embeddings_in_chroma
-        documents_with_embeddings = generate_embeddings_for_documents(documents)
-        if documents_with_embeddings:
-            print("✅ Embeddings generated")
-            if store_embeddings_in_chroma(documents_with_embeddings):
-                print("✅ Embeddings stored in ChromaDB")
-            else:
-                print("❌ Failed to store embeddings")
-                return False
-        else:
-            print("❌ Failed to generate embeddings")
-            return False
-    except Exception as e:
-        print(f"❌ Error generating embeddings: {e}")
-        return False
-    
-    # Step 4: Demo queries
-    print("\n🔍 Step 4: Testing semantic search...")
-    try:
-        from query_system import search_chroma, display_results
+        from query_system import search_many
         
         # Sample queries to demonstrate the system
         demo_queries = [
@@ -95,17 +73,17 @@ def run_demo():
             "safety equipment for sanding"
         ]
         
-        for query in demo_queries:
+        # Embed and search all demo queries in one batch
+        all_results = search_many(demo_queries, top_k=2, store=store)
+        
+        for query, results in zip(demo_queries, all_results):
             print(f"\n🔍 Query: '{query}'")
-            results = search_chroma(query, top_k=2)
             if results:
                 print(f"✅ Found {len(results)} relevant snippets")
                 for i, result in enumerate(results, 1):
                     print(f"   {i}. {result['metadata']['category']} - {result['text'][:100]}...")
             else:
                 print("❌ No results found")
-            
-            time.sleep(1)  # Pause for demo effect
         
     except Exception as e:
         print(f"❌ Error testing queries: {e}")
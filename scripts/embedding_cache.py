@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Embedding Cache for Caliper-AI
+Content-addressed on-disk cache of sentence-transformer embeddings.
+
+Vectors live in a memory-mapped float32 matrix, one row per cached text,
+and a small JSON index maps (model name, text hash) keys to matrix rows.
+The index is saved as soon as entries are evicted, before their rows are
+reused, so after a crash no key ever points at another text's vector.
+"""
+
+import hashlib
+import json
+import logging
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Configure logging based on environment variable
+log_level = logging.DEBUG if os.getenv('DEBUG') else logging.WARNING
+logging.basicConfig(level=log_level, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.getenv('EMBEDDING_CACHE_DIR', './embedding_cache')
+DEFAULT_MAX_ENTRIES = int(os.getenv('EMBEDDING_CACHE_MAX_ENTRIES', '200000'))
+
+_INDEX_FILE = "index.json"
+_VECTORS_FILE = "vectors.f32"
+_INITIAL_CAPACITY = 1024
+
+
+def text_hash(text: str) -> str:
+    # Stable content hash used as the per-text cache key
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    # Persistent (model name, text hash) -> float32 vector cache with LRU eviction
+
+    def __init__(self, model_name: str, dim: int,
+                 cache_dir: str = DEFAULT_CACHE_DIR,
+                 max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.model_name = model_name
+        self.dim = dim
+        self.max_entries = max_entries
+        self.directory = os.path.join(cache_dir, model_name.replace('/', '__'))
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # key -> [row, last_used_tick]
+        self._entries: Dict[str, List[int]] = {}
+        self._free_rows: List[int] = []
+        self._tick = 0
+        self._capacity = 0
+        self._vectors: Optional[np.memmap] = None
+        self._dirty = False
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._load()
+
+    @property
+    def _index_path(self) -> str:
+        return os.path.join(self.directory, _INDEX_FILE)
+
+    @property
+    def _vectors_path(self) -> str:
+        return os.path.join(self.directory, _VECTORS_FILE)
+
+    def _load(self):
+        # Load the index and map the vector file, discarding incompatible caches
+        if os.path.exists(self._index_path) and os.path.exists(self._vectors_path):
+            try:
+                with open(self._index_path, 'r', encoding='utf-8') as f:
+                    index = json.load(f)
+                if index.get('model_name') == self.model_name and index.get('dim') == self.dim:
+                    self._entries = index['entries']
+                    self._free_rows = index.get('free_rows', [])
+                    self._tick = index.get('tick', 0)
+                    self._capacity = index['capacity']
+                    self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode='r+',
+                                              shape=(self._capacity, self.dim))
+                    logger.info(f"Loaded embedding cache with {len(self._entries)} entries from {self.directory}")
+                    return
+                logger.warning("Embedding cache was built for a different model or dimension, resetting")
+            except Exception as e:
+                logger.warning(f"Could not read embedding cache, resetting: {e}")
+
+        self._entries = {}
+        self._free_rows = []
+        self._tick = 0
+        self._resize(self._initial_capacity())
+        self._dirty = True
+
+    def _initial_capacity(self) -> int:
+        # Small bounds are enforced from the start rather than after the first growth
+        return max(1, min(_INITIAL_CAPACITY, self.max_entries))
+
+    def _resize(self, capacity: int):
+        # Grow the backing file and re-map it with the new row count
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._vectors = None
+        mode = 'r+b' if os.path.exists(self._vectors_path) else 'w+b'
+        with open(self._vectors_path, mode) as f:
+            f.truncate(capacity * self.dim * np.dtype(np.float32).itemsize)
+        self._free_rows.extend(range(capacity - 1, self._capacity - 1, -1))
+        self._capacity = capacity
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode='r+',
+                                  shape=(capacity, self.dim))
+
+    def _allocate_row(self) -> int:
+        # Take a free row, evicting the least recently used entries at the bound or growing the file
+        if len(self._entries) >= self.max_entries:
+            # A cache written with a larger bound is brought back under the current one
+            self._evict(len(self._entries) - self.max_entries + max(1, self.max_entries // 20))
+        if not self._free_rows:
+            self._resize(max(1, min(self._capacity * 2, self.max_entries)))
+        return self._free_rows.pop()
+
+    def _evict(self, count: int):
+        # Drop the `count` least recently used entries
+        oldest = sorted(self._entries.items(), key=lambda item: item[1][1])[:count]
+        for key, (row, _) in oldest:
+            del self._entries[key]
+            self._free_rows.append(row)
+        self.evictions += len(oldest)
+        logger.debug(f"Evicted {len(oldest)} entries from embedding cache")
+        # Persist the index without the evicted keys before their rows are overwritten
+        self._dirty = True
+        self.save()
+
+    def lookup(self, texts: List[str]) -> Tuple[List[int], np.ndarray, List[int]]:
+        # Return hit positions, their vectors as one matrix, and the positions that missed
+        hit_positions: List[int] = []
+        hit_rows: List[int] = []
+        missing: List[int] = []
+        for i, text in enumerate(texts):
+            entry = self._entries.get(text_hash(text))
+            if entry is None:
+                missing.append(i)
+                continue
+            self._tick += 1
+            entry[1] = self._tick
+            hit_positions.append(i)
+            hit_rows.append(entry[0])
+        self.hits += len(hit_positions)
+        self.misses += len(missing)
+        if hit_positions:
+            self._dirty = True
+        # Fancy indexing copies the hit rows out of the memmap in one go
+        return hit_positions, self._vectors[hit_rows], missing
+
+    def put_many(self, texts: List[str], vectors) -> None:
+        # Store vectors for the given texts, overwriting existing entries
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if len(texts) != len(vectors):
+            raise ValueError(f"Mismatch: {len(texts)} texts, {len(vectors)} vectors")
+
+        for text, vector in zip(texts, vectors):
+            key = text_hash(text)
+            self._tick += 1
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = [self._allocate_row(), self._tick]
+                self._entries[key] = entry
+            else:
+                entry[1] = self._tick
+            self._vectors[entry[0]] = vector
+        self._dirty = True
+
+    def save(self) -> None:
+        # Flush vectors and atomically rewrite the index
+        if not self._dirty:
+            return
+        self._vectors.flush()
+        index = {
+            'model_name': self.model_name,
+            'dim': self.dim,
+            'capacity': self._capacity,
+            'tick': self._tick,
+            'free_rows': self._free_rows,
+            'entries': self._entries,
+        }
+        tmp_path = self._index_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self._index_path)
+        self._dirty = False
+
+    def clear(self) -> None:
+        # Remove every entry and shrink the backing file
+        self._entries = {}
+        self._free_rows = []
+        self._capacity = 0
+        self._vectors = None
+        if os.path.exists(self._vectors_path):
+            os.remove(self._vectors_path)
+        self._resize(self._initial_capacity())
+        self._dirty = True
+        self.save()
+
+    def stats(self) -> dict:
+        # Hit/miss counters and size information
+        lookups = self.hits + self.misses
+        return {
+            'model_name': self.model_name,
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'size_bytes': self._capacity * self.dim * np.dtype(np.float32).itemsize,
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Multi-Process Embedding Pool for Caliper-AI
+Shards texts across worker processes that each hold their own
+sentence-transformer instance, for bulk re-indexing on many-core hosts.
+"""
+
+import atexit
+import itertools
+import logging
+import multiprocessing
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Sequence
+
+# Configure logging based on environment variable
+log_level = logging.DEBUG if os.getenv('DEBUG') else logging.WARNING
+logging.basicConfig(level=log_level, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', '64'))
+
+# Per-worker model, set by _init_worker in each child process
+_worker_model = None
+
+
+def _init_worker(model_source: str, threads: int, devices) -> None:
+    # Load one model per worker from a local snapshot path or hub name, pinned to a device when several are given
+    global _worker_model
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    # Avoid oversubscribing cores: each worker only gets its share of threads
+    torch.set_num_threads(threads)
+    device = devices.get() if devices is not None else None
+    _worker_model = SentenceTransformer(model_source, device=device)
+
+
+def _encode_shard(texts: List[str], batch_size: int):
+    # Encode one shard inside a worker process
+    return _worker_model.encode(texts, batch_size=batch_size, convert_to_tensor=False,
+                                show_progress_bar=False)
+
+
+class EmbeddingPool:
+    # Pool of worker processes, each holding a model instance loaded from model_name (a hub name or local path)
+
+    def __init__(self, model_name: str, workers: Optional[int] = None,
+                 batch_size: int = DEFAULT_BATCH_SIZE,
+                 devices: Optional[Sequence[str]] = None):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        if devices:
+            workers = workers or len(devices)
+        self.workers = workers or os.cpu_count() or 1
+        threads = max(1, (os.cpu_count() or 1) // self.workers)
+
+        # Spawn, not fork: torch is not fork-safe once its thread pools exist
+        context = multiprocessing.get_context('spawn')
+        device_queue = None
+        if devices:
+            device_queue = context.Queue()
+            for i in range(self.workers):
+                device_queue.put(devices[i % len(devices)])
+
+        logger.info(f"Starting embedding pool: {self.workers} workers, {threads} threads each, "
+                    f"batch size {batch_size}")
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(model_name, threads, device_queue)
+        )
+
+    def _shards(self, texts: List[str]) -> List[List[str]]:
+        # Split into a few shards per worker so slow shards do not stall the pool
+        shard_size = max(self.batch_size, -(-len(texts) // (self.workers * 4)))
+        return [texts[i:i + shard_size] for i in range(0, len(texts), shard_size)]
+
+    def encode(self, texts: List[str]):
+        # Encode texts across the pool, returning rows in input order
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+
+        # Executor.map yields results in submission order
+        parts = self._executor.map(_encode_shard, self._shards(texts),
+                                   itertools.repeat(self.batch_size))
+        return np.vstack(list(parts)).astype(np.float32, copy=False)
+
+    def close(self) -> None:
+        # Wait for in-flight shards and stop the workers
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+            logger.info("Embedding pool stopped")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+# Global pool, started on demand when EMBEDDING_WORKERS > 1
+_pool = None
+
+
+def get_embedding_pool(model_name: str) -> Optional[EmbeddingPool]:
+    # Return the process-wide pool if multi-process embedding is configured; pass the resolved model
+    # source (local_embeddings.model_source) so workers load the saved snapshot
+    global _pool
+
+    workers = int(os.getenv('EMBEDDING_WORKERS', '1'))
+    if workers <= 1:
+        return None
+
+    if _pool is None:
+        devices = [d for d in os.getenv('EMBEDDING_DEVICES', '').split(',') if d] or None
+        _pool = EmbeddingPool(model_name, workers=workers, devices=devices)
+        atexit.register(shutdown_embedding_pool)
+
+    return _pool
+
+
+def shutdown_embedding_pool() -> None:
+    # Stop the global pool if it was started
+    global _pool
+
+    if _pool is not None:
+        _pool.close()
+        _pool = None
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Encoder Backends for Caliper-AI
+ONNX Runtime encoders (fp32 and dynamically quantized int8) that stand in for
+SentenceTransformer.encode on CPU-only hosts. The transformer is exported once
+to ONNX; tokenization, mean pooling and normalization are done here.
+"""
+
+import json
+import logging
+import os
+from typing import List, Optional, Union
+
+import numpy as np
+
+# Configure logging based on environment variable
+log_level = logging.DEBUG if os.getenv('DEBUG') else logging.WARNING
+logging.basicConfig(level=log_level, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+BACKENDS = ('torch', 'onnx-fp32', 'onnx-int8')
+DEFAULT_BACKEND = os.getenv('EMBEDDING_BACKEND', 'torch')
+
+_FP32_FILE = "model.onnx"
+_INT8_FILE = "model.int8.onnx"
+_CONFIG_FILE = "encoder_config.json"
+
+
+def export_onnx(model_source: str, out_dir: str) -> str:
+    # Export the sentence-transformer's transformer to ONNX and write an int8 copy next to it
+    import torch
+    from sentence_transformers import SentenceTransformer, models
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    logger.info(f"Exporting {model_source} to ONNX in {out_dir}")
+    st_model = SentenceTransformer(model_source, device='cpu')
+    transformer = st_model[0]
+    tokenizer = transformer.tokenizer
+    hf_model = transformer.auto_model.eval()
+
+    pooling = next((module for module in st_model if isinstance(module, models.Pooling)), None)
+    if pooling is not None and not pooling.pooling_mode_mean_tokens:
+        raise ValueError("Only mean-pooling sentence-transformers can be exported")
+
+    os.makedirs(out_dir, exist_ok=True)
+    tokenizer.save_pretrained(out_dir)
+
+    sample = tokenizer(["how to fix a leaky faucet"], return_tensors='pt')
+    input_names = [name for name in ('input_ids', 'attention_mask', 'token_type_ids') if name in sample]
+    dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names}
+    dynamic_axes['last_hidden_state'] = {0: 'batch', 1: 'sequence'}
+
+    fp32_path = os.path.join(out_dir, _FP32_FILE)
+    with torch.no_grad():
+        torch.onnx.export(
+            hf_model,
+            tuple(sample[name] for name in input_names),
+            fp32_path,
+            input_names=input_names,
+            output_names=['last_hidden_state'],
+            dynamic_axes=dynamic_axes,
+            opset_version=14
+        )
+
+    # Dynamic quantization: int8 weights, activations quantized on the fly
+    quantize_dynamic(fp32_path, os.path.join(out_dir, _INT8_FILE), weight_type=QuantType.QInt8)
+
+    config = {
+        'model_source': model_source,
+        'embedding_dimension': st_model.get_sentence_embedding_dimension(),
+        'max_seq_length': st_model.max_seq_length,
+        'normalize': any(isinstance(module, models.Normalize) for module in st_model),
+        'input_names': input_names,
+    }
+    with open(os.path.join(out_dir, _CONFIG_FILE), 'w', encoding='utf-8') as f:
+        json.dump(config, f, indent=2)
+
+    logger.info(f"ONNX export complete: {out_dir}")
+    return out_dir
+
+
+class OnnxEncoder:
+    # ONNX Runtime encoder with the same encode() surface as SentenceTransformer
+
+    def __init__(self, onnx_dir: str, quantized: bool = False):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        with open(os.path.join(onnx_dir, _CONFIG_FILE), 'r', encoding='utf-8') as f:
+            self.config = json.load(f)
+
+        self.quantized = quantized
+        self.max_seq_length = self.config['max_seq_length']
+        self.tokenizer = AutoTokenizer.from_pretrained(onnx_dir)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        model_path = os.path.join(onnx_dir, _INT8_FILE if quantized else _FP32_FILE)
+        self.session = ort.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+        self._input_names = [node.name for node in self.session.get_inputs()]
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.config['embedding_dimension']
+
+    def encode(self, sentences: Union[str, List[str]], batch_size: int = 32,
+               convert_to_numpy: bool = True, show_progress_bar: bool = False, **kwargs) -> np.ndarray:
+        # Tokenize, run the transformer, then mean-pool and normalize like the torch pipeline
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        embeddings = np.empty((len(texts), self.get_sentence_embedding_dimension()), dtype=np.float32)
+
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start:start + batch_size]
+            encoded = self.tokenizer(batch, padding=True, truncation=True,
+                                     max_length=self.max_seq_length, return_tensors='np')
+            feeds = {name: encoded[name].astype(np.int64) for name in self._input_names}
+            hidden = self.session.run(['last_hidden_state'], feeds)[0]
+
+            mask = encoded['attention_mask'][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            if self.config['normalize']:
+                pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            embeddings[start:start + len(batch)] = pooled
+
+        return embeddings[0] if single else embeddings
+
+
+def load_onnx_encoder(model_source: str, onnx_dir: str, quantized: bool) -> Optional[OnnxEncoder]:
+    # Load an ONNX encoder, exporting the model on first use
+    try:
+        if not os.path.exists(os.path.join(onnx_dir, _CONFIG_FILE)):
+            export_onnx(model_source, onnx_dir)
+        return OnnxEncoder(onnx_dir, quantized=quantized)
+    except Exception as e:
+        logger.error(f"Failed to load ONNX encoder from {onnx_dir}: {e}")
+        return None
@@ -7,9 +7,16 @@ Generates vector embeddings for DIY snippets using local sentence-transformers.
 import os
 import sys
 import logging
+import numpy as np
 from typing import List, Dict, Any, Optional
+import metrics
+from bulk_writer import bulk_upsert
 from ingest_data import load_diy_data
-from local_embeddings import generate_batch_embeddings
+from keyword_index import build_from_store as build_keyword_index
+from text_chunking import chunk_documents
+from local_embeddings import generate_batch_embeddings, get_embedding_cache
+from projection import project_for_store
+from vector_store import VectorStore, get_store, to_store_embeddings
 
 # Configure logging based on environment variable
 log_level = logging.DEBUG if os.getenv('DEBUG') else logging.WARNING
@@ -17,13 +24,13 @@ logging.basicConfig(level=log_level, format='%(asctime)s - %(levelname)s - %(mes
 logger = logging.getLogger(__name__)
 
 
-def generate_embeddings(texts: List[str]) -> List[List[float]]:
+def generate_embeddings(texts: List[str]) -> np.ndarray:
     # Generate semantic embeddings using local sentence-transformers
     return generate_batch_embeddings(texts)
 
 
-def generate_embeddings_for_documents(documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    # Generate embeddings for all documents
+def generate_embeddings_for_documents(documents: List[Dict[str, Any]]) -> Optional[np.ndarray]:
+    # Generate an (N, 384) float32 embedding matrix aligned with documents
     logger.info(f"Generating embeddings for {len(documents)} documents")
     
     try:
@@ -32,49 +39,43 @@ def generate_embeddings_for_documents(documents: List[Dict[str, Any]]) -> List[D
         
         # Generate semantic embeddings
         embeddings = generate_embeddings(texts)
-        
-        # Add embeddings to documents
-        for i, doc in enumerate(documents):
-            doc['embedding'] = embeddings[i]
+        if len(embeddings) != len(documents):
+            logger.error(f"Mismatch: {len(documents)} documents, {len(embeddings)} embeddings")
+            return None
         
         logger.info(f"Successfully generated {len(documents)} embeddings")
-        return documents
+        return embeddings
         
     except Exception as e:
         logger.error(f"Error generating embeddings: {e}")
-        return []
+        return None
 
 
-def store_embeddings_in_chroma(documents_with_embeddings: List[Dict[str, Any]]) -> bool:
-    # Store documents with embeddings in ChromaDB
+@metrics.timed()
+def store_embeddings_in_chroma(documents: List[Dict[str, Any]], embeddings: np.ndarray,
+                               store: Optional[VectorStore] = None) -> bool:
+    # Store documents with their embedding matrix in ChromaDB
     logger.info("Storing embeddings in ChromaDB")
     
     try:
-        import chromadb
-        
-        # Use EphemeralClient instead of PersistentClient
-        client = chromadb.EphemeralClient()
-        
-        # Get or create collection
-        collection_name = "diy_snippets"
-        collection = client.get_or_create_collection(name=collection_name)
-        logger.info(f"Using collection: {collection_name}")
+        # Get or create collection on the shared persistent store
+        store = store or get_store()
+        collection = store.collection()
         
         # Extract data
-        ids = [doc['id'] for doc in documents_with_embeddings]
-        texts = [doc['text'] for doc in documents_with_embeddings]
-        metadatas = [doc['metadata'] for doc in documents_with_embeddings]
-        embeddings = [doc['embedding'] for doc in documents_with_embeddings]
+        ids = [doc['id'] for doc in documents]
+        texts = [doc['text'] for doc in documents]
+        metadatas = [doc['metadata'] for doc in documents]
         
-        # Add documents with embeddings to collection
-        collection.add(
-            ids=ids,
-            documents=texts,
-            metadatas=metadatas,
-            embeddings=embeddings
-        )
+        # Upsert in store-sized batches so re-runs replace existing rows instead of failing on duplicate IDs
+        bulk_upsert(store, {
+            'ids': ids,
+            'documents': texts,
+            'metadatas': metadatas,
+            'embeddings': to_store_embeddings(project_for_store(store, embeddings, collection=collection))
+        }, collection)
         
-        logger.info(f"Successfully stored {len(documents_with_embeddings)} embeddings")
+        logger.info(f"Successfully stored {len(documents)} embeddings")
         return True
         
     except Exception as e:
@@ -88,23 +89,32 @@ def main() -> bool:
     
     logger.info("Starting embedding generation")
     
-    # Load documents
+    # Load documents, splitting long snippets into token-bounded chunks
     documents = load_diy_data(csv_path)
     if not documents:
         logger.error("Failed to load documents")
         return False
+    documents = chunk_documents(documents)
     
     # Generate embeddings
-    documents_with_embeddings = generate_embeddings_for_documents(documents)
-    if not documents_with_embeddings:
+    embeddings = generate_embeddings_for_documents(documents)
+    if embeddings is None:
         logger.error("Failed to generate embeddings")
         return False
     
     # Store embeddings
-    if not store_embeddings_in_chroma(documents_with_embeddings):
+    if not store_embeddings_in_chroma(documents, embeddings):
         logger.error("Failed to store embeddings")
         return False
     
+    # Keyword index for hybrid search, built over the whole collection
+    if build_keyword_index() is None:
+        logger.warning("Keyword index was not built; hybrid search will use vectors only")
+    
+    cache = get_embedding_cache()
+    if cache is not None:
+        logger.info(f"Embedding cache stats: {cache.stats()}")
+    
     logger.info("Embedding generation completed successfully")
     return True
 
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Index Snapshots for Caliper-AI
+Exports a fully built index so a new query node can come up without loading
+the CSV, re-embedding or writing to ChromaDB. A snapshot holds:
+- the vectors as a raw .npy file, memory-mapped on load;
+- ids, texts and metadata as a columnar Parquet table (JSON when pyarrow is
+  not installed);
+- the projection, if the collection uses one;
+- a manifest naming the encoder model and version.
+
+    python scripts/index_snapshot.py export [snapshot_dir] [fp32|fp16|int8|pq]
+    python scripts/index_snapshot.py load [snapshot_dir]
+    python scripts/index_snapshot.py restore [snapshot_dir]
+
+A snapshot directory is a numpy_search index, so a node serves it directly
+with SEARCH_ENGINE=numpy NUMPY_INDEX_DIR=<snapshot_dir>. 'restore' writes it
+into ChromaDB instead, for nodes on the chroma engine. A snapshot built with
+a different encoder model is rejected.
+"""
+
+import logging
+import os
+import shutil
+import sys
+import time
+from typing import Optional
+
+import metrics
+from bulk_writer import bulk_upsert, max_batch_size
+from numpy_search import NumpySearchIndex, build_from_store, check_encoder, DEFAULT_STORAGE, STORAGE_TYPES
+from projection import PROJECTIONS_SUBDIR, DIMS_KEY, VERSION_KEY, collection_projection, projections_dir
+from vector_store import VectorStore, get_store, to_store_embeddings
+
+# Configure logging based on environment variable
+log_level = logging.DEBUG if os.getenv('DEBUG') else logging.WARNING
+logging.basicConfig(level=log_level, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_SNAPSHOT_DIR = os.getenv('SNAPSHOT_DIR', './index_snapshot')
+SNAPSHOT_RECORDS = os.getenv('SNAPSHOT_RECORDS', 'parquet')
+
+# Bumped when the snapshot layout changes incompatibly
+SNAPSHOT_FORMAT = 1
+
+
+def records_format() -> str:
+    # Parquet when pyarrow is available, otherwise the JSON records numpy_search always reads
+    if SNAPSHOT_RECORDS == 'parquet':
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            logger.warning("pyarrow is not installed, writing snapshot records as JSON")
+            return 'json'
+    return SNAPSHOT_RECORDS
+
+
+def export_snapshot(snapshot_dir: str = DEFAULT_SNAPSHOT_DIR, store: Optional[VectorStore] = None,
+                    storage: str = DEFAULT_STORAGE) -> Optional[NumpySearchIndex]:
+    # Snapshot the collection; written beside the target and swapped in, so readers never see a partial one
+    store = store or get_store()
+    staging = snapshot_dir.rstrip(os.sep) + '.tmp'
+    shutil.rmtree(staging, ignore_errors=True)
+
+    with metrics.span('export_snapshot'):
+        index = build_from_store(staging, store, storage, records_format(), manifest={
+            'snapshot_format': SNAPSHOT_FORMAT,
+            'collection': store.collection_name,
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        })
+    if index is None:
+        shutil.rmtree(staging, ignore_errors=True)
+        return None
+
+    previous = snapshot_dir.rstrip(os.sep) + '.old'
+    shutil.rmtree(previous, ignore_errors=True)
+    if os.path.exists(snapshot_dir):
+        os.rename(snapshot_dir, previous)
+    os.rename(staging, snapshot_dir)
+    shutil.rmtree(previous, ignore_errors=True)
+    logger.info(f"Exported snapshot of {len(index)} rows to {snapshot_dir}")
+    return NumpySearchIndex.load(snapshot_dir)
+
+
+def load_snapshot(snapshot_dir: str = DEFAULT_SNAPSHOT_DIR) -> Optional[NumpySearchIndex]:
+    # Open a snapshot for querying (vectors memory-mapped); None if missing or built with another encoder
+    try:
+        with metrics.span('load_snapshot'):
+            index = NumpySearchIndex.load(snapshot_dir)
+    except FileNotFoundError:
+        logger.error(f"No snapshot in {snapshot_dir}. Run 'python scripts/index_snapshot.py export' first.")
+        return None
+    except ImportError as e:
+        logger.error(f"Cannot read snapshot records in {snapshot_dir}: {e}")
+        return None
+
+    manifest = index.manifest
+    if 'snapshot_format' not in manifest or 'model_name' not in manifest:
+        logger.error(f"{snapshot_dir} is not a snapshot (no snapshot format or encoder in its manifest)")
+        return None
+    if manifest['snapshot_format'] > SNAPSHOT_FORMAT:
+        logger.error(f"Snapshot format {manifest['snapshot_format']} is newer than supported ({SNAPSHOT_FORMAT})")
+        return None
+    problem = check_encoder(manifest)
+    if problem:
+        logger.error(f"Refusing snapshot {snapshot_dir}: {problem}")
+        return None
+    return index
+
+
+def restore_snapshot(snapshot_dir: str = DEFAULT_SNAPSHOT_DIR, store: Optional[VectorStore] = None) -> Optional[int]:
+    # Write a snapshot into the ChromaDB collection without re-embedding; returns rows written
+    index = load_snapshot(snapshot_dir)
+    if index is None:
+        return None
+    store = store or get_store()
+    collection = store.collection()
+
+    # The collection must end up in the snapshot's vector space, projection included
+    current = collection_projection(store, collection)
+    version = index.manifest.get('projection')
+    if (current.version if current is not None else None) != version:
+        if collection.count() > 0:
+            logger.error(f"Collection holds vectors for projection {current.version if current else 'none'}, "
+                         f"snapshot uses {version or 'none'}; reset the collection first")
+            return None
+        if version:
+            os.makedirs(projections_dir(store), exist_ok=True)
+            for suffix in ('.npz', '.json'):
+                shutil.copy2(os.path.join(snapshot_dir, PROJECTIONS_SUBDIR, version + suffix),
+                             os.path.join(projections_dir(store), version + suffix))
+            metadata = {key: value for key, value in (collection.metadata or {}).items()
+                        if not key.startswith('hnsw:')}
+            metadata.update({VERSION_KEY: version, DIMS_KEY: int(index.manifest['dim'])})
+            collection.modify(metadata=metadata)
+
+    # Converted to lists one store batch at a time; the memory-mapped matrix is never fully copied
+    written = 0
+    batch_size = max_batch_size(store.client)
+    with metrics.span('restore_snapshot', rows=len(index)):
+        for start in range(0, len(index), batch_size):
+            end = start + batch_size
+            written += bulk_upsert(store, {
+                'ids': index.ids[start:end],
+                'documents': index.documents[start:end],
+                'metadatas': index.metadatas[start:end],
+                'embeddings': to_store_embeddings(index.vectors[start:end])
+            }, collection, batch_size)
+    logger.info(f"Restored {written} rows from {snapshot_dir}")
+    return written
+
+
+def main() -> bool:
+    # Export, load (timed) or restore a snapshot
+    commands = ('export', 'load', 'restore')
+    if len(sys.argv) < 2 or sys.argv[1] not in commands:
+        print("Usage: python scripts/index_snapshot.py export [snapshot_dir] [fp32|fp16|int8|pq]")
+        print("       python scripts/index_snapshot.py load|restore [snapshot_dir]")
+        return False
+
+    command = sys.argv[1]
+    snapshot_dir = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_SNAPSHOT_DIR
+
+    if command == 'export':
+        storage = sys.argv[3] if len(sys.argv) > 3 else DEFAULT_STORAGE
+        if storage not in STORAGE_TYPES:
+            print(f"Unknown vector storage '{storage}', expected one of {STORAGE_TYPES}")
+            return False
+        index = export_snapshot(snapshot_dir, storage=storage)
+        if index is None:
+            return False
+        print(f"Exported {len(index)} rows to {snapshot_dir} (encoder {index.manifest['encoder']}, "
+              f"storage={index.manifest['storage']}, records={index.manifest['records_format']})")
+        return True
+
+    if command == 'load':
+        start = time.perf_counter()
+        index = load_snapshot(snapshot_dir)
+        if index is None:
+            return False
+        print(f"Loaded {len(index)} rows from {snapshot_dir} in {(time.perf_counter() - start) * 1000:.1f} ms "
+              f"(encoder {index.manifest['encoder']}, created {index.manifest.get('created_at')})")
+        return True
+
+    written = restore_snapshot(snapshot_dir)
+    if written is None:
+        return False
+    print(f"Restored {written} rows from {snapshot_dir} into ChromaDB")
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -5,17 +5,81 @@ Simple script to load DIY snippets from CSV and prepare for ChromaDB.
 """
 
 import pandas as pd
+import hashlib
 import os
 import sys
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterator, Optional
 import logging
+import metrics
 
 # Configure logging based on environment variable
 log_level = logging.DEBUG if os.getenv('DEBUG') else logging.WARNING
 logging.basicConfig(level=log_level, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+REQUIRED_COLUMNS = ['id', 'category', 'snippet_text', 'tools_required', 'ppe_required']
+DEFAULT_CHUNK_SIZE = 1000
 
+# Parse straight into string/categorical columns instead of generic object cells
+CSV_DTYPES = {
+    'id': 'string',
+    'category': 'category',
+    'snippet_text': 'string',
+    'tools_required': 'string',
+    'ppe_required': 'string',
+}
+
+
+def content_hash(text: str, category: str, tools_required: str, ppe_required: str) -> str:
+    # Hash of everything that is embedded or stored for a row, used for change detection
+    payload = "\x1f".join(str(value) for value in (text, category, tools_required, ppe_required))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def validate_columns(df: pd.DataFrame):
+    # Basic validation - check required columns
+    missing_cols = [col for col in REQUIRED_COLUMNS if col not in df.columns]
+    
+    if missing_cols:
+        raise ValueError(f"Missing required columns: {missing_cols}")
+
+
+def document_columns(df: pd.DataFrame) -> Dict[str, List[Any]]:
+    # Build ids, texts and metadatas as parallel lists straight from the DataFrame columns
+    ids = df['id'].astype('string').tolist()  # Convert ID to string for ChromaDB
+    texts = df['snippet_text'].astype('string').fillna('').tolist()
+    categories = df['category'].astype('string').fillna('').tolist()
+    tools = df['tools_required'].astype('string').fillna('').tolist()
+    ppe = df['ppe_required'].astype('string').fillna('').tolist()
+    
+    metadatas = [
+        {
+            'category': category,
+            'tools_required': tools_required,
+            'ppe_required': ppe_required,
+            'content_hash': content_hash(text, category, tools_required, ppe_required)
+        }
+        for text, category, tools_required, ppe_required in zip(texts, categories, tools, ppe)
+    ]
+    
+    # Keys match the collection.add / collection.upsert keyword arguments
+    return {'ids': ids, 'documents': texts, 'metadatas': metadatas}
+
+
+def documents_from_columns(columns: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    # Convert parallel columns into the per-document dicts used by the demo scripts
+    return [
+        {'id': doc_id, 'text': text, 'metadata': metadata}
+        for doc_id, text, metadata in zip(columns['ids'], columns['documents'], columns['metadatas'])
+    ]
+
+
+def documents_from_frame(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    # Prepare documents for ChromaDB
+    return documents_from_columns(document_columns(df))
+
+
+@metrics.timed()
 def load_diy_data(csv_path: str = "data/diy_snippets.csv") -> Optional[List[Dict[str, Any]]]:
     # Load and validate DIY snippets from CSV file
     logger.info(f"Loading DIY data from: {csv_path}")
@@ -27,30 +91,13 @@ def load_diy_data(csv_path: str = "data/diy_snippets.csv") -> Optional[List[Dict
     
     try:
         # Load CSV
-        df = pd.read_csv(csv_path)
+        df = pd.read_csv(csv_path, dtype=CSV_DTYPES)
         logger.info(f"Loaded {len(df)} DIY snippets")
         
-        # Basic validation - check required columns
-        required_cols = ['id', 'category', 'snippet_text', 'tools_required', 'ppe_required']
-        missing_cols = [col for col in required_cols if col not in df.columns]
-        
-        if missing_cols:
-            raise ValueError(f"Missing required columns: {missing_cols}")
-        
-        # Prepare documents for ChromaDB
-        documents = []
-        for _, row in df.iterrows():
-            doc = {
-                'id': str(row['id']),  # Convert ID to string for ChromaDB
-                'text': row['snippet_text'],
-                'metadata': {
-                    'category': row['category'],
-                    'tools_required': row['tools_required'],
-                    'ppe_required': row['ppe_required']
-                }
-            }
-            documents.append(doc)
+        validate_columns(df)
+        documents = documents_from_frame(df)
         
+        metrics.inc('documents_loaded_total', len(documents))
         logger.info(f"Prepared {len(documents)} documents for ChromaDB")
         logger.info(f"Categories: {df['category'].unique().tolist()}")
         
@@ -61,6 +108,37 @@ def load_diy_data(csv_path: str = "data/diy_snippets.csv") -> Optional[List[Dict
         return None
 
 
+def iter_document_columns(csv_path: str = "data/diy_snippets.csv",
+                          chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Dict[str, List[Any]]]:
+    # Stream validated document columns from the CSV, holding at most one chunk in memory
+    logger.info(f"Streaming DIY data from: {csv_path} (chunk size {chunk_size})")
+    
+    if not os.path.exists(csv_path):
+        raise FileNotFoundError(f"CSV file not found: {csv_path}")
+    
+    with pd.read_csv(csv_path, chunksize=chunk_size, dtype=CSV_DTYPES) as reader:
+        for chunk_number, df in enumerate(reader):
+            if chunk_number == 0:
+                validate_columns(df)
+            
+            # Drop rows that cannot be embedded rather than failing the whole stream
+            invalid = df['id'].isna() | df['snippet_text'].isna()
+            if invalid.any():
+                logger.warning(f"Skipping {int(invalid.sum())} rows without id or snippet_text in chunk {chunk_number}")
+                df = df[~invalid]
+            
+            columns = document_columns(df)
+            logger.debug(f"Chunk {chunk_number}: {len(columns['ids'])} documents")
+            yield columns
+
+
+def iter_diy_chunks(csv_path: str = "data/diy_snippets.csv",
+                    chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[List[Dict[str, Any]]]:
+    # Stream validated documents from the CSV as per-document dicts
+    for columns in iter_document_columns(csv_path, chunk_size):
+        yield documents_from_columns(columns)
+
+
 def main() -> bool:
     # Main function to run CSV ingestion
     csv_path = sys.argv[1] if len(sys.argv) > 1 else "data/diy_snippets.csv"
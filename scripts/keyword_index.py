@@ -0,0 +1,665 @@
+#!/usr/bin/env python3
+"""
+Keyword Index for Caliper-AI
+Array-backed BM25 inverted index over snippet text and required tools, stored
+on disk as flat .npy posting arrays (memory-mapped on load). Used for hybrid
+retrieval: keyword and vector rankings are merged with reciprocal rank fusion.
+
+Full builds spill each chunk's postings to disk and counting-sort them into
+the posting arrays, so memory is bounded by the chunk size and vocabulary.
+Each row's category, tools and PPE strings are stored beside its id, so the
+query side can keep its metadata filter index in step with the store by
+reading only the rows added since it last looked.
+
+Incremental updates (sync) mark the old rows of changed or removed ids as
+deleted and append the new rows as a small delta segment. Main rows are found
+through a sorted id-hash map, and only the delta files, the deleted row list
+and the manifest are rewritten, so an update costs the size of the change
+rather than the corpus. Once the delta or the deleted rows exceed
+KEYWORD_COMPACT_FRACTION of the main rows, both segments are merged back into
+one.
+
+    python scripts/keyword_index.py build [index_dir]
+    python scripts/keyword_index.py search "random orbital sander"
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import sys
+import tempfile
+import uuid
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+# Configure logging based on environment variable
+log_level = logging.DEBUG if os.getenv('DEBUG') else logging.WARNING
+logging.basicConfig(level=log_level, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_DIR = os.getenv('KEYWORD_INDEX_DIR', './keyword_index')
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60
+# Merge the delta segment into the main postings once it, or the deleted rows, pass this fraction of the main rows
+COMPACT_FRACTION = float(os.getenv('KEYWORD_COMPACT_FRACTION', '0.2'))
+COMPACT_BLOCK_POSTINGS = 1 << 22
+
+_VOCAB_FILE = "vocab.json"
+_IDS_FILE = "ids.json"
+_MANIFEST_FILE = "manifest.json"
+_OFFSETS_FILE = "term_offsets.npy"
+_DOCS_FILE = "postings_docs.npy"
+_TF_FILE = "postings_tf.npy"
+_LENGTHS_FILE = "doc_lengths.npy"
+_DELTA = "delta_"
+_DELETED_FILE = "deleted_rows.npy"
+_ID_HASHES_FILE = "id_hashes.npy"
+_ID_ROWS_FILE = "id_hash_rows.npy"
+_FILTERS_FILE = "filter_fields.json"
+# Metadata kept per row for filtering, as [category, tools_required, ppe_required]
+FILTER_FIELDS = ('category', 'tools_required', 'ppe_required')
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it my of on or should the "
+    "to what when where which with you your q".split()
+)
+
+Postings = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+def tokenize(text: Any) -> List[str]:
+    # Lowercase alphanumeric terms without stopwords
+    if not isinstance(text, str):
+        return []
+    return [token for token in _TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def index_terms(document: str, metadata: Optional[Dict[str, Any]]) -> List[str]:
+    # Terms indexed for one snippet: its text plus its required tools
+    return tokenize(document) + tokenize((metadata or {}).get('tools_required'))
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = RRF_K) -> List[Tuple[str, float]]:
+    # Merge ranked id lists; each list contributes 1 / (k + rank) per id
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def document_postings(documents: List[str], metadatas: List[Dict[str, Any]], vocab: Dict[str, int],
+                      first_row: int = 0) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    # (term, row, tf) triples plus token counts for consecutive rows; unseen terms are added to vocab
+    terms, rows, tfs, lengths = [], [], [], []
+    for row, (document, metadata) in enumerate(zip(documents, metadatas), first_row):
+        tokens = index_terms(document, metadata)
+        for term, count in Counter(tokens).items():
+            terms.append(vocab.setdefault(term, len(vocab)))
+            rows.append(row)
+            tfs.append(min(count, np.iinfo(np.uint16).max))
+        lengths.append(len(tokens))
+    return (np.asarray(terms, dtype=np.int64), np.asarray(rows, dtype=np.int32),
+            np.asarray(tfs, dtype=np.uint16), np.asarray(lengths, dtype=np.float32))
+
+
+def _save_array(path: str, array: np.ndarray) -> None:
+    # Written beside the target and swapped in; a reader with the old file mapped keeps a valid copy
+    with open(path + '.tmp', 'wb') as f:
+        np.save(f, array)
+    os.replace(path + '.tmp', path)
+
+
+def _save_json(path: str, value: Any, indent: Optional[int] = None) -> None:
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(value, f, indent=indent)
+    os.replace(path + '.tmp', path)
+
+
+def _load_json(path: str) -> Any:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def filter_fields(metadatas: List[Dict[str, Any]]) -> List[List[Any]]:
+    # The stored filter metadata of each row, in FILTER_FIELDS order
+    return [[(metadata or {}).get(field) for field in FILTER_FIELDS] for metadata in metadatas]
+
+
+def _join_lines(src_path: str, dst_path: str) -> None:
+    # Stream a file of JSON lines into one JSON array without holding it in memory
+    with open(src_path, 'r', encoding='utf-8') as src, open(dst_path + '.tmp', 'w', encoding='utf-8') as dst:
+        dst.write('[')
+        for i, line in enumerate(src):
+            dst.write((',' if i else '') + line.rstrip('\n'))
+        dst.write(']')
+    os.replace(dst_path + '.tmp', dst_path)
+
+
+def id_hashes(ids: List[str]) -> np.ndarray:
+    # 64-bit hash of each id, the key of the persisted id -> row map
+    return np.fromiter((int.from_bytes(hashlib.blake2b(doc_id.encode('utf-8'), digest_size=8).digest(), 'little')
+                        for doc_id in ids), dtype=np.uint64, count=len(ids))
+
+
+def _save_id_map(index_dir: str, hashes: np.ndarray) -> None:
+    # Main rows sorted by id hash, so updates find an id's row without reading ids.json
+    order = np.argsort(hashes, kind='stable')
+    _save_array(os.path.join(index_dir, _ID_HASHES_FILE), hashes[order])
+    _save_array(os.path.join(index_dir, _ID_ROWS_FILE), order.astype(np.int64))
+
+
+def main_rows_for_ids(index_dir: str, ids: List[str]) -> np.ndarray:
+    # Main-segment rows of the given ids (unknown ids are skipped), by binary search of the memory-mapped map
+    hashes = np.load(os.path.join(index_dir, _ID_HASHES_FILE), mmap_mode='r')
+    rows = np.load(os.path.join(index_dir, _ID_ROWS_FILE), mmap_mode='r')
+    keys = id_hashes(ids)
+    positions = np.searchsorted(hashes, keys)
+    found = np.zeros(len(keys), dtype=bool)
+    inside = positions < len(hashes)
+    found[inside] = np.asarray(hashes[positions[inside]]) == keys[inside]
+    return np.sort(np.asarray(rows[positions[found]], dtype=np.int64))
+
+
+def _deleted_rows(index_dir: str, manifest: Dict[str, Any]) -> np.ndarray:
+    # Sorted row numbers marked deleted since the last compaction
+    if not manifest.get('deleted'):
+        return np.empty(0, dtype=np.int64)
+    deleted = np.load(os.path.join(index_dir, _DELETED_FILE))
+    return np.flatnonzero(deleted) if deleted.dtype == bool else deleted.astype(np.int64)
+
+
+def _remove(index_dir: str, *names: str) -> None:
+    for name in names:
+        try:
+            os.remove(os.path.join(index_dir, name))
+        except FileNotFoundError:
+            pass
+
+
+def write_postings(index_dir: str, n_terms: int, chunks: Callable[[], Iterator[Postings]],
+                   prefix: str = '') -> int:
+    # Counting sort of (term, row, tf) chunks into CSR files written straight to disk; returns the posting count
+    # chunks() is iterated twice (count, then place) and must yield rows in increasing order,
+    # so each posting list comes out sorted by row without all postings ever being in memory
+    counts = np.zeros(n_terms, dtype=np.int64)
+    for terms, _, _ in chunks():
+        counts += np.bincount(terms, minlength=n_terms)
+    offsets = np.zeros(n_terms + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    total = int(offsets[-1])
+
+    docs_path = os.path.join(index_dir, prefix + _DOCS_FILE)
+    tf_path = os.path.join(index_dir, prefix + _TF_FILE)
+    if total == 0:
+        _save_array(docs_path, np.empty(0, dtype=np.int32))
+        _save_array(tf_path, np.empty(0, dtype=np.uint16))
+    else:
+        docs = np.lib.format.open_memmap(docs_path + '.tmp', mode='w+', dtype=np.int32, shape=(total,))
+        tfs = np.lib.format.open_memmap(tf_path + '.tmp', mode='w+', dtype=np.uint16, shape=(total,))
+        cursor = offsets[:-1].copy()
+        for terms, rows, tf in chunks():
+            if not len(terms):
+                continue
+            order = np.argsort(terms, kind='stable')
+            terms, rows, tf = terms[order], rows[order], tf[order]
+            # Position of each posting within its term's run in this chunk
+            rank = np.arange(len(terms)) - np.searchsorted(terms, terms, side='left')
+            positions = cursor[terms] + rank
+            docs[positions] = rows
+            tfs[positions] = tf
+            unique, unique_counts = np.unique(terms, return_counts=True)
+            cursor[unique] += unique_counts
+        docs.flush()
+        tfs.flush()
+        del docs, tfs
+        os.replace(docs_path + '.tmp', docs_path)
+        os.replace(tf_path + '.tmp', tf_path)
+    _save_array(os.path.join(index_dir, prefix + _OFFSETS_FILE), offsets)
+    return total
+
+
+def _write_manifest(index_dir: str, manifest: Dict[str, Any]) -> None:
+    # Written last: get_keyword_index reloads when the manifest changes
+    _save_json(os.path.join(index_dir, _MANIFEST_FILE), manifest, indent=2)
+
+
+class KeywordIndexBuilder:
+    # Tokenizes chunk by chunk and spills each chunk's postings to disk, so memory stays bounded
+    # by the chunk size and the vocabulary rather than the corpus
+
+    def __init__(self, spill_dir: Optional[str] = None):
+        self.vocab: Dict[str, int] = {}
+        self.rows = 0
+        self._length_sum = 0.0
+        self._spill_dir = spill_dir or tempfile.mkdtemp(prefix='caliper-keywords-')
+        os.makedirs(self._spill_dir, exist_ok=True)
+        self._spills: List[str] = []
+        self._hashes: List[np.ndarray] = []
+        self._ids = open(os.path.join(self._spill_dir, 'ids.jsonl'), 'w', encoding='utf-8')
+        self._filters = open(os.path.join(self._spill_dir, 'filters.jsonl'), 'w', encoding='utf-8')
+
+    def close(self) -> None:
+        # Release the spill files and directory; save() does this, and so does leaving a with block
+        for spill in (self._ids, self._filters):
+            if not spill.closed:
+                spill.close()
+        shutil.rmtree(self._spill_dir, ignore_errors=True)
+
+    def __enter__(self) -> "KeywordIndexBuilder":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.close()
+        return False
+
+    def add(self, ids: List[str], documents: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        # Tokenize one chunk of documents and spill its postings
+        terms, rows, tfs, lengths = document_postings(documents, metadatas, self.vocab, self.rows)
+        path = os.path.join(self._spill_dir, f"chunk{len(self._spills):06d}.npz")
+        np.savez(path, terms=terms, rows=rows, tfs=tfs, lengths=lengths)
+        self._spills.append(path)
+        for doc_id, fields in zip(ids, filter_fields(metadatas)):
+            self._ids.write(json.dumps(doc_id) + '\n')
+            self._filters.write(json.dumps(fields) + '\n')
+        self._hashes.append(id_hashes(ids))
+        self.rows += len(ids)
+        self._length_sum += float(lengths.sum())
+
+    def _chunks(self) -> Iterator[Postings]:
+        for path in self._spills:
+            with np.load(path) as spill:
+                yield spill['terms'], spill['rows'], spill['tfs']
+
+    def save(self, index_dir: str = DEFAULT_INDEX_DIR,
+             manifest: Optional[Dict[str, Any]] = None) -> "KeywordIndex":
+        # Group the spilled postings by term and write a single-segment index
+        os.makedirs(index_dir, exist_ok=True)
+        self._ids.close()
+        self._filters.close()
+        try:
+            postings = write_postings(index_dir, len(self.vocab), self._chunks)
+
+            lengths = np.lib.format.open_memmap(os.path.join(index_dir, _LENGTHS_FILE + '.tmp'), mode='w+',
+                                                dtype=np.float32, shape=(self.rows,))
+            row = 0
+            for path in self._spills:
+                with np.load(path) as spill:
+                    chunk_lengths = spill['lengths']
+                lengths[row:row + len(chunk_lengths)] = chunk_lengths
+                row += len(chunk_lengths)
+            lengths.flush()
+            del lengths
+            os.replace(os.path.join(index_dir, _LENGTHS_FILE + '.tmp'), os.path.join(index_dir, _LENGTHS_FILE))
+
+            # ids.json and the filter fields are streamed from the spill files rather than built as lists
+            _join_lines(os.path.join(self._spill_dir, 'ids.jsonl'), os.path.join(index_dir, _IDS_FILE))
+            _join_lines(os.path.join(self._spill_dir, 'filters.jsonl'), os.path.join(index_dir, _FILTERS_FILE))
+            _save_id_map(index_dir, np.concatenate(self._hashes) if self._hashes else np.empty(0, dtype=np.uint64))
+
+            vocab = sorted(self.vocab, key=self.vocab.get)
+            _save_json(os.path.join(index_dir, _VOCAB_FILE), vocab)
+            _remove(index_dir, _DELTA + _OFFSETS_FILE, _DELTA + _DOCS_FILE, _DELTA + _TF_FILE,
+                    _DELTA + _LENGTHS_FILE, _DELTA + _IDS_FILE, _DELTA + _VOCAB_FILE, _DELTA + _FILTERS_FILE,
+                    _DELETED_FILE)
+            _write_manifest(index_dir, dict(
+                manifest or {}, rows=self.rows, main_rows=self.rows, delta_rows=0, deleted=0,
+                main_build=uuid.uuid4().hex,
+                terms=len(vocab), main_terms=len(vocab), postings=postings, length_sum=self._length_sum,
+                avg_length=self._length_sum / self.rows if self.rows else 0.0, k1=BM25_K1, b=BM25_B))
+        finally:
+            self.close()
+        logger.info(f"Built keyword index with {self.rows} rows and {len(self.vocab)} terms in {index_dir}")
+        return KeywordIndex.load(index_dir)
+
+
+class KeywordIndex:
+    # BM25 scoring over memory-mapped posting arrays: a main segment plus an optional delta segment
+
+    def __init__(self, vocab: List[str], ids: List[str], offsets: np.ndarray, docs: np.ndarray,
+                 tfs: np.ndarray, lengths: np.ndarray, manifest: Dict[str, Any],
+                 delta: Optional[Postings] = None, deleted: Optional[np.ndarray] = None):
+        self.vocab = vocab
+        self.term_ids = {term: i for i, term in enumerate(vocab)}
+        self.ids = ids
+        self.offsets = offsets
+        self.docs = docs
+        self.tfs = tfs
+        self.lengths = lengths
+        self.manifest = manifest
+        # Delta postings use global row numbers (after the main rows); deleted masks every row
+        self.delta = delta
+        self.deleted = deleted
+        self.k1 = manifest.get('k1', BM25_K1)
+        self.b = manifest.get('b', BM25_B)
+        self.avg_length = max(manifest.get('avg_length', 0.0), 1e-9)
+
+    def __len__(self) -> int:
+        # Live rows; deleted rows still occupy row numbers until the next compaction
+        return len(self.ids) - (int(self.deleted.sum()) if self.deleted is not None else 0)
+
+    @property
+    def main_rows(self) -> int:
+        # Rows in the main segment; delta rows are numbered after them
+        return self.manifest.get('main_rows', len(self.ids))
+
+    @classmethod
+    def load(cls, index_dir: str = DEFAULT_INDEX_DIR) -> "KeywordIndex":
+        # Open an index; posting arrays are memory-mapped
+        manifest = _load_json(os.path.join(index_dir, _MANIFEST_FILE))
+        vocab = _load_json(os.path.join(index_dir, _VOCAB_FILE))
+        ids = _load_json(os.path.join(index_dir, _IDS_FILE))
+        lengths = np.load(os.path.join(index_dir, _LENGTHS_FILE))
+
+        delta = deleted = None
+        if manifest.get('delta_rows'):
+            ids = ids + _load_json(os.path.join(index_dir, _DELTA + _IDS_FILE))
+            lengths = np.concatenate([lengths, np.load(os.path.join(index_dir, _DELTA + _LENGTHS_FILE))])
+            delta = (np.load(os.path.join(index_dir, _DELTA + _OFFSETS_FILE)),
+                     np.load(os.path.join(index_dir, _DELTA + _DOCS_FILE)),
+                     np.load(os.path.join(index_dir, _DELTA + _TF_FILE)))
+        # Terms first seen by an update are kept beside the main vocabulary until compaction
+        if os.path.exists(os.path.join(index_dir, _DELTA + _VOCAB_FILE)):
+            vocab = vocab[:manifest.get('main_terms', len(vocab))] + \
+                _load_json(os.path.join(index_dir, _DELTA + _VOCAB_FILE))
+        if manifest.get('deleted'):
+            deleted = np.zeros(len(ids), dtype=bool)
+            deleted[_deleted_rows(index_dir, manifest)] = True
+        return cls(vocab, ids,
+                   np.load(os.path.join(index_dir, _OFFSETS_FILE)),
+                   np.load(os.path.join(index_dir, _DOCS_FILE), mmap_mode='r'),
+                   np.load(os.path.join(index_dir, _TF_FILE), mmap_mode='r'),
+                   lengths, manifest, delta, deleted)
+
+    def postings(self, term_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        # (rows, tfs) of one term across both segments
+        rows, tfs = [], []
+        if term_id < len(self.offsets) - 1:
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            rows.append(np.asarray(self.docs[start:end]))
+            tfs.append(np.asarray(self.tfs[start:end]))
+        if self.delta is not None and term_id < len(self.delta[0]) - 1:
+            offsets, docs, delta_tfs = self.delta
+            rows.append(docs[offsets[term_id]:offsets[term_id + 1]])
+            tfs.append(delta_tfs[offsets[term_id]:offsets[term_id + 1]])
+        if not rows:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.uint16)
+        return (rows[0], tfs[0]) if len(rows) == 1 else (np.concatenate(rows), np.concatenate(tfs))
+
+    def search_rows(self, query: str, top_k: int = 10) -> Tuple[np.ndarray, np.ndarray]:
+        # (rows, BM25 scores) of the best keyword matches, best first
+        # Deleted rows still count towards N and document frequency until compaction, as in Lucene
+        n = len(self.ids)
+        scores = np.zeros(n, dtype=np.float32)
+        for term in set(tokenize(query)):
+            term_id = self.term_ids.get(term)
+            if term_id is None:
+                continue
+            rows, tf = self.postings(term_id)
+            tf = tf.astype(np.float32)
+            idf = np.log1p((n - len(rows) + 0.5) / (len(rows) + 0.5))
+            norm = self.k1 * (1.0 - self.b + self.b * self.lengths[rows] / self.avg_length)
+            # Rows are unique within one posting list, so fancy-index accumulation is safe
+            scores[rows] += idf * tf * (self.k1 + 1.0) / (tf + norm)
+        if self.deleted is not None:
+            scores[self.deleted] = 0.0
+
+        matched = np.flatnonzero(scores)
+        if len(matched) == 0:
+            return matched.astype(np.int64), scores[:0]
+        k = min(top_k, len(matched))
+        best = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        best = best[np.argsort(-scores[best], kind='stable')]
+        return best.astype(np.int64), scores[best]
+
+    def search(self, query: str, top_k: int = 10) -> List[Tuple[str, float]]:
+        # (id, BM25 score) of the best keyword matches, best first
+        rows, scores = self.search_rows(query, top_k)
+        return [(self.ids[row], float(score)) for row, score in zip(rows.tolist(), scores.tolist())]
+
+
+def _segment_chunks(offsets: np.ndarray, docs: np.ndarray, tfs: np.ndarray, keep_rows: np.ndarray,
+                    row_map: np.ndarray) -> Iterator[Postings]:
+    # Postings of one segment in blocks, dropping deleted rows and renumbering the rest
+    for start in range(0, len(docs), COMPACT_BLOCK_POSTINGS):
+        positions = np.arange(start, min(start + COMPACT_BLOCK_POSTINGS, len(docs)))
+        terms = np.searchsorted(offsets, positions, side='right') - 1
+        rows = np.asarray(docs[start:start + len(positions)])
+        keep = keep_rows[rows]
+        yield terms[keep], row_map[rows[keep]].astype(np.int32), np.asarray(tfs[start:start + len(positions)])[keep]
+
+
+def compact(index_dir: str, index: "KeywordIndex", manifest: Optional[Dict[str, Any]] = None) -> "KeywordIndex":
+    # Merge the delta segment into the main postings and drop deleted rows
+    live = ~index.deleted if index.deleted is not None else np.ones(len(index.ids), dtype=bool)
+    row_map = np.cumsum(live) - 1
+    main_rows = index.main_rows
+
+    def chunks() -> Iterator[Postings]:
+        # Main rows keep their order and delta rows follow them, so rows stay increasing
+        yield from _segment_chunks(index.offsets, index.docs, index.tfs, live, row_map)
+        if index.delta is not None:
+            yield from _segment_chunks(*index.delta, live, row_map)
+
+    postings = write_postings(index_dir, len(index.vocab), chunks)
+    lengths = np.asarray(index.lengths)[live]
+    ids = [doc_id for doc_id, alive in zip(index.ids, live.tolist()) if alive]
+    _save_array(os.path.join(index_dir, _LENGTHS_FILE), lengths)
+    _save_json(os.path.join(index_dir, _IDS_FILE), ids)
+    _save_id_map(index_dir, id_hashes(ids))
+    filters_path = os.path.join(index_dir, _FILTERS_FILE)
+    if os.path.exists(filters_path):
+        fields = _load_json(filters_path)[:main_rows]
+        if index.delta is not None:
+            fields += _load_json(os.path.join(index_dir, _DELTA + _FILTERS_FILE))
+        _save_json(filters_path, [values for values, alive in zip(fields, live.tolist()) if alive])
+    _save_json(os.path.join(index_dir, _VOCAB_FILE), index.vocab)
+    _remove(index_dir, _DELTA + _OFFSETS_FILE, _DELTA + _DOCS_FILE, _DELTA + _TF_FILE,
+            _DELTA + _LENGTHS_FILE, _DELTA + _IDS_FILE, _DELTA + _VOCAB_FILE, _DELTA + _FILTERS_FILE,
+            _DELETED_FILE)
+    rows = int(live.sum())
+    # A new main_build tells readers of the filter fields that row numbers have changed
+    _write_manifest(index_dir, dict(
+        index.manifest, **(manifest or {}), rows=rows, main_rows=rows, delta_rows=0, deleted=0,
+        main_build=uuid.uuid4().hex,
+        terms=len(index.vocab), main_terms=len(index.vocab), postings=postings, length_sum=float(lengths.sum()),
+        avg_length=float(lengths.mean()) if rows else 0.0))
+    logger.info(f"Compacted keyword index: {main_rows} main + {len(index.ids) - main_rows} delta rows "
+                f"-> {rows} rows")
+    return KeywordIndex.load(index_dir)
+
+
+def update_index(columns: Dict[str, List[Any]], removed: List[str], index_dir: str = DEFAULT_INDEX_DIR,
+                 manifest: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    # Apply upserted rows (ids, documents, metadatas) and removed ids without rebuilding from the store;
+    # returns the new manifest, or None when there is no index to update
+    # Only the changed rows are tokenized, and only the delta segment, the deleted rows and the
+    # manifest are written; the main ids and postings are not read or rewritten until compaction
+    try:
+        current = _load_json(os.path.join(index_dir, _MANIFEST_FILE))
+    except FileNotFoundError:
+        return None
+
+    main_rows = current.get('main_rows', current['rows'])
+    main_terms = current.get('main_terms', current['terms'])
+    delta_path = os.path.join(index_dir, _DELTA)
+    has_delta = bool(current.get('delta_rows'))
+    delta_ids = _load_json(delta_path + _IDS_FILE) if has_delta else []
+    delta_lengths = np.load(delta_path + _LENGTHS_FILE) if has_delta else np.empty(0, dtype=np.float32)
+    delta_vocab = _load_json(delta_path + _VOCAB_FILE) if os.path.exists(delta_path + _VOCAB_FILE) else []
+    vocab_list = _load_json(os.path.join(index_dir, _VOCAB_FILE))[:main_terms] + delta_vocab
+    vocab = {term: i for i, term in enumerate(vocab_list)}
+
+    # Old versions of upserted ids and removed ids become deleted rows
+    stale = set(removed) | set(columns['ids'])
+    stale_rows = np.union1d(main_rows_for_ids(index_dir, list(stale)),
+                            [main_rows + i for i, doc_id in enumerate(delta_ids) if doc_id in stale])
+    deleted = _deleted_rows(index_dir, current)
+    newly_deleted = np.setdiff1d(stale_rows, deleted).astype(np.int64)
+    deleted = np.union1d(deleted, newly_deleted).astype(np.int64)
+    main_lengths = np.load(os.path.join(index_dir, _LENGTHS_FILE), mmap_mode='r')
+    in_main = newly_deleted < main_rows
+    removed_length = float(np.sum(main_lengths[newly_deleted[in_main]])) + \
+        float(np.sum(delta_lengths[newly_deleted[~in_main] - main_rows]))
+
+    first_row = main_rows + len(delta_ids)
+    terms, rows, tfs, lengths = document_postings(columns['documents'], columns['metadatas'], vocab, first_row)
+    vocab_list = sorted(vocab, key=vocab.get)
+    delta_ids = delta_ids + list(columns['ids'])
+    delta_lengths = np.concatenate([delta_lengths, lengths])
+
+    # Existing delta postings plus the new rows form the next delta segment
+    delta_chunks: List[Postings] = []
+    if has_delta:
+        offsets = np.load(delta_path + _OFFSETS_FILE)
+        delta_chunks.append((np.repeat(np.arange(len(offsets) - 1), np.diff(offsets)),
+                             np.load(delta_path + _DOCS_FILE), np.load(delta_path + _TF_FILE)))
+    delta_chunks.append((terms, rows, tfs))
+    merged_rows = np.concatenate([chunk[1] for chunk in delta_chunks])
+    order = np.argsort(merged_rows, kind='stable')
+    merged = (np.concatenate([chunk[0] for chunk in delta_chunks])[order], merged_rows[order],
+              np.concatenate([chunk[2] for chunk in delta_chunks])[order])
+
+    write_postings(index_dir, len(vocab_list), lambda: iter([merged]), prefix=_DELTA)
+    _save_array(delta_path + _LENGTHS_FILE, delta_lengths)
+    _save_json(delta_path + _IDS_FILE, delta_ids)
+    _save_json(delta_path + _VOCAB_FILE, vocab_list[main_terms:])
+    if os.path.exists(os.path.join(index_dir, _FILTERS_FILE)):
+        delta_fields = _load_json(delta_path + _FILTERS_FILE) if has_delta else []
+        _save_json(delta_path + _FILTERS_FILE, delta_fields + filter_fields(columns['metadatas']))
+    _save_array(os.path.join(index_dir, _DELETED_FILE), deleted)
+    live_rows = main_rows + len(delta_ids) - len(deleted)
+    length_sum = current.get('length_sum', current.get('avg_length', 0.0) * current['rows'])
+    length_sum = max(length_sum - removed_length + float(lengths.sum()), 0.0)
+    updated = dict(current, **(manifest or {}), rows=live_rows, main_rows=main_rows, delta_rows=len(delta_ids),
+                   deleted=len(deleted), terms=len(vocab_list), main_terms=main_terms, length_sum=length_sum,
+                   avg_length=length_sum / live_rows if live_rows else 0.0)
+    _write_manifest(index_dir, updated)
+    logger.info(f"Updated keyword index: {len(columns['ids'])} upserted, {len(removed)} removed "
+                f"({len(delta_ids)} delta rows, {len(deleted)} deleted)")
+
+    if len(delta_ids) > COMPACT_FRACTION * main_rows or len(deleted) > COMPACT_FRACTION * main_rows:
+        return compact(index_dir, KeywordIndex.load(index_dir)).manifest
+    return updated
+
+
+def read_filter_rows(index_dir: str = DEFAULT_INDEX_DIR, main_build: Optional[str] = None,
+                     start: int = 0) -> Optional[Tuple[Dict[str, Any], int, List[str], List[Dict[str, Any]], np.ndarray]]:
+    # (manifest, first row, ids, filter metadatas, deleted rows) of the rows from start on while main_build
+    # still names the main segment, otherwise of every row; None if the index stores no filter fields
+    try:
+        manifest = _load_json(os.path.join(index_dir, _MANIFEST_FILE))
+        if manifest.get('main_build') != main_build:
+            start = 0
+        main_rows = manifest.get('main_rows', manifest['rows'])
+        ids: List[str] = []
+        fields: List[List[Any]] = []
+        if start < main_rows:
+            ids = _load_json(os.path.join(index_dir, _IDS_FILE))[start:]
+            fields = _load_json(os.path.join(index_dir, _FILTERS_FILE))[start:]
+        if manifest.get('delta_rows'):
+            skip = max(start - main_rows, 0)
+            ids += _load_json(os.path.join(index_dir, _DELTA + _IDS_FILE))[skip:]
+            fields += _load_json(os.path.join(index_dir, _DELTA + _FILTERS_FILE))[skip:]
+        deleted = _deleted_rows(index_dir, manifest)
+    except FileNotFoundError:
+        return None
+    if len(ids) != len(fields) or start + len(ids) != main_rows + manifest.get('delta_rows', 0):
+        # Files from two different writes; the caller reads the store instead
+        return None
+    metadatas = [{field: value for field, value in zip(FILTER_FIELDS, values) if value is not None}
+                 for values in fields]
+    return manifest, start, ids, metadatas, deleted
+
+
+def build_from_columns(chunks: Iterable[Dict[str, List[Any]]], index_dir: str = DEFAULT_INDEX_DIR,
+                       manifest: Optional[Dict[str, Any]] = None) -> KeywordIndex:
+    # Build the index from chunks of {'ids', 'documents', 'metadatas'} columns
+    with KeywordIndexBuilder() as builder:
+        for columns in chunks:
+            builder.add(columns['ids'], columns['documents'], columns['metadatas'])
+        return builder.save(index_dir, manifest)
+
+
+def build_from_store(index_dir: str = DEFAULT_INDEX_DIR, store=None,
+                     page_size: int = 5000) -> Optional[KeywordIndex]:
+    # Build the index from the documents already stored in ChromaDB
+    from vector_store import get_store
+
+    try:
+        store = store or get_store()
+        collection = store.collection()
+
+        def pages():
+            offset = 0
+            while True:
+                page = collection.get(include=['documents', 'metadatas'], limit=page_size, offset=offset)
+                if not page['ids']:
+                    break
+                yield {'ids': page['ids'], 'documents': page['documents'], 'metadatas': page['metadatas']}
+                offset += len(page['ids'])
+                if len(page['ids']) < page_size:
+                    break
+
+        return build_from_columns(pages(), index_dir, manifest={'generation': store.generation()})
+    except Exception as e:
+        logger.error(f"Error building keyword index: {e}")
+        return None
+
+
+# Global index instance, reloaded when the index on disk is rebuilt
+_index = None
+_index_mtime = None
+
+
+def get_keyword_index(index_dir: str = DEFAULT_INDEX_DIR) -> Optional[KeywordIndex]:
+    # Return the process-wide keyword index, or None if it has not been built
+    global _index, _index_mtime
+
+    manifest_path = os.path.join(index_dir, _MANIFEST_FILE)
+    try:
+        mtime = os.stat(manifest_path).st_mtime_ns
+    except FileNotFoundError:
+        logger.error(f"No keyword index in {index_dir}. Run 'python scripts/keyword_index.py build' first.")
+        return None
+
+    if _index is None or mtime != _index_mtime:
+        _index = KeywordIndex.load(index_dir)
+        _index_mtime = mtime
+        logger.info(f"Loaded keyword index with {len(_index)} rows from {index_dir}")
+
+    return _index
+
+
+def main() -> bool:
+    # Build the keyword index from ChromaDB, or run a keyword search against it
+    if len(sys.argv) >= 2 and sys.argv[1] == 'build':
+        index_dir = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_INDEX_DIR
+        index = build_from_store(index_dir)
+        if index is None:
+            return False
+        print(f"Built keyword index with {len(index)} rows and {index.manifest['terms']} terms in {index_dir}")
+        return True
+
+    if len(sys.argv) >= 3 and sys.argv[1] == 'search':
+        index = get_keyword_index()
+        if index is None:
+            return False
+        for doc_id, score in index.search(" ".join(sys.argv[2:])):
+            print(f"  {doc_id:<10} {score:.3f}")
+        return True
+
+    print("Usage: python scripts/keyword_index.py build [index_dir] | search QUERY")
+    return False
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -7,8 +7,18 @@ Provides sentence-transformer based embeddings without API calls.
 import logging
 import numpy as np
 import os
-from typing import List, Optional
-from sentence_transformers import SentenceTransformer
+import sys
+import time
+from typing import List, Optional, TYPE_CHECKING
+import metrics
+from embedding_cache import EmbeddingCache
+from embedding_pool import get_embedding_pool
+from encoder_backends import BACKENDS, DEFAULT_BACKEND, load_onnx_encoder
+from text_chunking import count_tokens, length_buckets
+
+# sentence_transformers pulls in torch; it is imported lazily in load_model
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
 
 # Configure logging based on environment variable
 log_level = logging.DEBUG if os.getenv('DEBUG') else logging.WARNING
@@ -18,19 +28,66 @@ logger = logging.getLogger(__name__)
 # Global model instance for caching
 _model = None
 _model_name = "all-MiniLM-L6-v2"  # 384-dim, fast, good quality
+EMBEDDING_DIM = 384
+
+# Locally serialized copy of the model, loaded without resolving anything from the hub
+MODEL_SNAPSHOT_DIR = os.getenv('MODEL_SNAPSHOT_DIR', './model_snapshot')
+
+# Padded tokens per forward pass; batches of short texts grow up to MAX_BUCKET_SIZE texts
+EMBEDDING_BATCH_TOKENS = int(os.getenv('EMBEDDING_BATCH_TOKENS', '16384'))
+MAX_BUCKET_SIZE = 256
+
+# Global embedding cache, disabled with EMBEDDING_CACHE=0
+_cache = None
+_cache_enabled = os.getenv('EMBEDDING_CACHE', '1') != '0'
+
+
+def snapshot_path(model_name: str = _model_name) -> str:
+    # Directory holding the ready-to-load snapshot for a model
+    return os.path.join(MODEL_SNAPSHOT_DIR, model_name.replace('/', '__'))
+
+
+def model_source(model_name: str = _model_name) -> str:
+    # Where to load a model from: the local snapshot when one was saved, else the hub name
+    source = snapshot_path(model_name)
+    return source if os.path.isdir(source) else model_name
+
+
+def encoder_id(model_name: str = _model_name, backend: str = DEFAULT_BACKEND) -> str:
+    # Identifies which model and backend produced a vector (backends differ slightly numerically)
+    return model_name if backend == 'torch' else f"{model_name}-{backend}"
+
 
+def create_encoder(backend: str = DEFAULT_BACKEND, model_name: str = _model_name):
+    # Build a new encoder for the given backend: torch, onnx-fp32 or onnx-int8
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend}', expected one of {BACKENDS}")
+    
+    source = model_source(model_name)
+    
+    if backend == 'torch':
+        from sentence_transformers import SentenceTransformer
+        logger.info(f"Loading sentence-transformer model: {source}")
+        return SentenceTransformer(source)
+    
+    logger.info(f"Loading {backend} encoder for: {model_name}")
+    return load_onnx_encoder(source, snapshot_path(model_name) + '-onnx', quantized=backend == 'onnx-int8')
 
-def load_model(model_name: str = _model_name) -> Optional[SentenceTransformer]:
-    # Load sentence-transformer model with caching
+
+def load_model(model_name: str = _model_name) -> Optional["SentenceTransformer"]:
+    # Load the configured encoder (EMBEDDING_BACKEND) with caching, preferring the local snapshot
     global _model
     
     if _model is not None:
         return _model
     
     try:
-        logger.info(f"Loading sentence-transformer model: {model_name}")
-        _model = SentenceTransformer(model_name)
-        logger.info(f"Model loaded successfully. Embedding dimension: {_model.get_sentence_embedding_dimension()}")
+        with metrics.span('load_model', backend=DEFAULT_BACKEND):
+            _model = create_encoder(DEFAULT_BACKEND, model_name)
+        if _model is None:
+            return None
+        logger.info(f"Model loaded successfully ({DEFAULT_BACKEND}). "
+                    f"Embedding dimension: {_model.get_sentence_embedding_dimension()}")
         return _model
         
     except Exception as e:
@@ -38,84 +95,174 @@ def load_model(model_name: str = _model_name) -> Optional[SentenceTransformer]:
         return None
 
 
-def generate_text_embedding(text: str) -> Optional[List[float]]:
-    # Generate embedding for a single text using sentence-transformers
+def save_model_snapshot(model_name: str = _model_name) -> Optional[str]:
+    # Serialize the torch model to MODEL_SNAPSHOT_DIR so later starts load it straight from disk
+    path = snapshot_path(model_name)
+    try:
+        model = create_encoder('torch', model_name)
+        model.save(path)
+        logger.info(f"Saved model snapshot to {path}")
+        return path
+    except Exception as e:
+        logger.error(f"Failed to save model snapshot: {e}")
+        return None
+
+
+def warm_up() -> Optional[float]:
+    # Load the model and run one forward pass so the first real query is not cold; returns seconds taken
+    start = time.perf_counter()
+    model = load_model()
+    if model is None:
+        return None
+    model.encode(["warm up"], convert_to_numpy=True, show_progress_bar=False)
+    elapsed = time.perf_counter() - start
+    logger.info(f"Embedding model warmed up in {elapsed:.2f}s")
+    return elapsed
+
+
+def generate_text_embedding(text: str) -> Optional[np.ndarray]:
+    # Generate a (384,) float32 embedding for a single text using sentence-transformers
     model = load_model()
     if model is None:
         logger.error("Model not available for embedding generation")
         return None
     
     try:
-        # Generate embedding
-        embedding = model.encode(text, convert_to_tensor=False)
-        
-        # Convert to list and ensure it's the right type
-        embedding_list = embedding.tolist()
+        # Generate embedding as a float32 array
+        embedding = model.encode(text, convert_to_numpy=True)
         
         # Validate dimensions
-        if len(embedding_list) != 384:
-            logger.warning(f"Expected 384 dimensions, got {len(embedding_list)}")
+        if embedding.shape[-1] != EMBEDDING_DIM:
+            logger.warning(f"Expected {EMBEDDING_DIM} dimensions, got {embedding.shape[-1]}")
         
-        return embedding_list
+        return embedding.astype(np.float32, copy=False)
         
     except Exception as e:
         logger.error(f"Error generating embedding for text: {e}")
         return None
 
 
-def generate_batch_embeddings(texts: List[str]) -> List[List[float]]:
-    # Generate embeddings for multiple texts efficiently
+def empty_embeddings() -> np.ndarray:
+    # Zero-row embedding matrix returned when nothing could be embedded
+    return np.empty((0, EMBEDDING_DIM), dtype=np.float32)
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    # Open the on-disk embedding cache for the current model once per process
+    global _cache
+
+    if not _cache_enabled:
+        return None
+
+    if _cache is None:
+        try:
+            _cache = EmbeddingCache(encoder_id(), EMBEDDING_DIM)
+            metrics.register_collector('embedding_cache', _cache.stats)
+        except Exception as e:
+            logger.warning(f"Embedding cache unavailable, continuing without it: {e}")
+            return None
+
+    return _cache
+
+
+@metrics.timed('encode')
+def _encode_batch(texts: List[str]) -> np.ndarray:
+    # Run the model over texts that are not cached
+    # The process pool runs torch workers only
+    # Workers load the same source as load_model, so a saved snapshot is not re-resolved from the hub
+    pool = get_embedding_pool(model_source(_model_name)) if DEFAULT_BACKEND == 'torch' else None
+    if pool is not None and len(texts) >= pool.workers * pool.batch_size:
+        logger.info(f"Encoding {len(texts)} texts on {pool.workers} worker processes")
+        # Sorted by length so each worker's shards pad to similar lengths
+        order = np.argsort([-len(text) for text in texts], kind='stable')
+        encoded = pool.encode([texts[i] for i in order])
+        embeddings = np.empty_like(encoded)
+        embeddings[order] = encoded
+        return embeddings
+    
     model = load_model()
     if model is None:
         logger.error("Model not available for batch embedding generation")
-        return []
-    
+        return empty_embeddings()
+
+    # Length-bucketed forward passes: similar lengths pad little, short texts share bigger batches
+    lengths = count_tokens(texts, getattr(model, 'tokenizer', None), model.max_seq_length)
+    embeddings = np.empty((len(texts), EMBEDDING_DIM), dtype=np.float32)
+    for bucket in length_buckets(lengths, EMBEDDING_BATCH_TOKENS, MAX_BUCKET_SIZE):
+        embeddings[bucket] = model.encode([texts[i] for i in bucket], batch_size=len(bucket),
+                                          convert_to_numpy=True, show_progress_bar=False)
+    return embeddings
+
+
+@metrics.timed()
+def generate_batch_embeddings(texts: List[str], use_cache: bool = True) -> np.ndarray:
+    # Generate an (N, 384) float32 embedding matrix, encoding only cache misses
     if not texts:
         logger.warning("No texts provided for embedding")
-        return []
+        return empty_embeddings()
     
     try:
         logger.info(f"Generating embeddings for {len(texts)} texts")
         
-        # Generate batch embeddings
-        embeddings = model.encode(texts, convert_to_tensor=False, show_progress_bar=False)
+        cache = get_embedding_cache() if use_cache else None
+        if cache is not None:
+            hit_positions, hit_vectors, missing = cache.lookup(texts)
+            metrics.inc('embedding_cache_hits_total', len(hit_positions))
+            metrics.inc('embedding_cache_misses_total', len(missing))
+            logger.info(f"Embedding cache: {len(hit_positions)} hits, {len(missing)} misses")
+        else:
+            hit_positions, hit_vectors, missing = [], None, list(range(len(texts)))
         
-        # Convert to list of lists
-        embeddings_list = [embedding.tolist() for embedding in embeddings]
+        # Fill one preallocated matrix from the cache and the model
+        embeddings = np.empty((len(texts), EMBEDDING_DIM), dtype=np.float32)
+        if hit_positions:
+            embeddings[hit_positions] = hit_vectors
         
-        # Validate batch
-        if len(embeddings_list) != len(texts):
-            logger.error(f"Mismatch: {len(texts)} texts, {len(embeddings_list)} embeddings")
-            return []
+        # Generate batch embeddings for new or changed texts only
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            encoded = _encode_batch(missing_texts)
+            if encoded.shape != (len(missing_texts), EMBEDDING_DIM):
+                logger.error(f"Mismatch: {len(missing_texts)} texts, embeddings of shape {encoded.shape}")
+                return empty_embeddings()
+            embeddings[missing] = encoded
+            metrics.inc('embeddings_generated_total', len(missing))
+            if cache is not None:
+                cache.put_many(missing_texts, encoded)
         
-        # Validate dimensions
-        if embeddings_list and len(embeddings_list[0]) != 384:
-            logger.warning(f"Expected 384 dimensions, got {len(embeddings_list[0])}")
+        if cache is not None:
+            cache.save()
         
-        logger.info(f"Successfully generated {len(embeddings_list)} embeddings")
-        return embeddings_list
+        logger.info(f"Successfully generated {len(embeddings)} embeddings")
+        return embeddings
         
     except Exception as e:
         logger.error(f"Error generating batch embeddings: {e}")
-        return []
+        return empty_embeddings()
 
 
 def get_model_info() -> dict:
     # Get information about the loaded model
     model = load_model()
     if model is None:
-        return {"status": "not_loaded", "model_name": _model_name}
+        return {"status": "not_loaded", "model_name": _model_name, "backend": DEFAULT_BACKEND}
     
     return {
         "status": "loaded",
         "model_name": _model_name,
+        "backend": DEFAULT_BACKEND,
         "embedding_dimension": model.get_sentence_embedding_dimension(),
         "max_seq_length": model.max_seq_length
     }
 
 
 def main():
-    # Test the local embedding service
+    # Test the local embedding service, or save a model snapshot with --snapshot
+    if '--snapshot' in sys.argv[1:]:
+        path = save_model_snapshot()
+        print(f"Model snapshot saved to {path}" if path else "Failed to save model snapshot")
+        return
+    
     logger.info("Testing local embedding service")
     
     # Test model loading
@@ -126,8 +273,8 @@ def main():
         # Test single embedding
         test_text = "How to install floating shelves safely?"
         embedding = generate_text_embedding(test_text)
-        if embedding:
-            logger.info(f"Single embedding test: {len(embedding)} dimensions")
+        if embedding is not None:
+            logger.info(f"Single embedding test: {embedding.shape[0]} dimensions")
         else:
             logger.error("Single embedding test failed")
         
@@ -138,10 +285,14 @@ def main():
             "Safety equipment for woodworking"
         ]
         batch_embeddings = generate_batch_embeddings(test_texts)
-        if batch_embeddings:
-            logger.info(f"Batch embedding test: {len(batch_embeddings)} embeddings generated")
+        if len(batch_embeddings):
+            logger.info(f"Batch embedding test: {batch_embeddings.shape} {batch_embeddings.dtype} matrix generated")
         else:
             logger.error("Batch embedding test failed")
+        
+        cache = get_embedding_cache()
+        if cache is not None:
+            logger.info(f"Embedding cache stats: {cache.stats()}")
     else:
         logger.error("Model failed to load")
 
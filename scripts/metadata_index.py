@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Metadata Index for Caliper-AI
+Inverted indexes over snippet category, tools and PPE, used to narrow the
+candidate rows before any similarity scoring.
+
+Filter format (all keys optional, combined with AND):
+    {
+        'category': 'Plumbing' or ['Plumbing', 'Painting'],   # any of
+        'tools_required': ['stud finder'],                     # all of
+        'exclude_tools': ['power'],                            # none of
+        'ppe_required': ['safety glasses'],                    # all of
+        'exclude_ppe': ['respirator'],                         # none of
+    }
+
+Tool and PPE terms match an indexed name when they are equal to it or appear
+in it as whole words, so 'power' matches 'Power Drill'. Filters push down to
+ChromaDB as a where clause over the exact stored tool/PPE strings that match.
+An index can be extended with new rows and deleted rows without rebuilding it.
+"""
+
+import copy
+import logging
+import os
+import re
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+
+# Configure logging based on environment variable
+log_level = logging.DEBUG if os.getenv('DEBUG') else logging.WARNING
+logging.basicConfig(level=log_level, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+LIST_FIELDS = ('tools_required', 'ppe_required')
+FILTER_KEYS = ('category', 'tools_required', 'exclude_tools', 'ppe_required', 'exclude_ppe')
+
+# Largest $in/$nin list pushed down to the store; terms matching more stored strings are scored in-process
+WHERE_MAX_VALUES = 2000
+
+
+def parse_list(value: Any) -> List[str]:
+    # Split a comma-separated metadata value into normalized names
+    if not isinstance(value, str):
+        return []
+    return [item.strip().lower() for item in value.split(',') if item.strip()]
+
+
+def _as_list(value: Union[str, List[str], None]) -> List[str]:
+    if value is None:
+        return []
+    return [value] if isinstance(value, str) else list(value)
+
+
+def validate_filters(filters: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    # Reject unknown keys early; empty filters mean no filtering
+    if not filters:
+        return None
+    unknown = set(filters) - set(FILTER_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown filter keys: {sorted(unknown)}, expected {FILTER_KEYS}")
+    return filters
+
+
+class MetadataIndex:
+    # Posting lists (sorted row arrays) per category, tool and PPE name
+
+    def __init__(self, metadatas: List[Dict[str, Any]]):
+        self.size = 0
+        # Normalized category -> every spelling stored for it, for pushing filters down to the store
+        self.category_names: Dict[str, List[str]] = {}
+        # Stored tool/PPE string -> the names it lists, so matches can be expressed as exact store values
+        self.stored_values: Dict[str, Dict[str, List[str]]] = {field: {} for field in LIST_FIELDS}
+        self.postings: Dict[str, Dict[str, np.ndarray]] = {'category': {}, 'tools_required': {}, 'ppe_required': {}}
+        # Rows replaced or removed since they were indexed; they keep their row numbers but never match
+        self.deleted = np.zeros(0, dtype=bool)
+        self.deleted_count = 0
+        self._add(metadatas)
+
+    def _add(self, metadatas: List[Dict[str, Any]]) -> None:
+        # Index metadatas as the rows after the existing ones; only the posting lists they touch are rebuilt
+        postings: Dict[str, Dict[str, List[int]]] = {field: {} for field in self.postings}
+        for row, metadata in enumerate(metadatas, self.size):
+            metadata = metadata or {}
+            category = str(metadata.get('category', '')).strip().lower()
+            spellings = self.category_names.setdefault(category, [])
+            if str(metadata.get('category', '')) not in spellings:
+                spellings.append(str(metadata.get('category', '')))
+            postings['category'].setdefault(category, []).append(row)
+            for field in LIST_FIELDS:
+                names = parse_list(metadata.get(field))
+                if isinstance(metadata.get(field), str):
+                    self.stored_values[field].setdefault(metadata[field], names)
+                for name in set(names):
+                    postings[field].setdefault(name, []).append(row)
+
+        for field, values in postings.items():
+            for name, rows in values.items():
+                added = np.asarray(rows, dtype=np.int64)
+                existing = self.postings[field].get(name)
+                self.postings[field][name] = added if existing is None else np.concatenate([existing, added])
+        self.size += len(metadatas)
+        self.deleted = np.concatenate([self.deleted, np.zeros(len(metadatas), dtype=bool)])
+
+    def extended(self, metadatas: List[Dict[str, Any]], deleted_rows: Any = ()) -> "MetadataIndex":
+        # A copy with metadatas indexed as the following rows and deleted_rows masked. Posting lists the
+        # new rows do not touch are shared, so the cost follows the change, and readers of this index
+        # never see a half-applied update
+        index = copy.copy(self)
+        index.category_names = {name: list(spellings) for name, spellings in self.category_names.items()}
+        index.stored_values = {field: dict(values) for field, values in self.stored_values.items()}
+        index.postings = {field: dict(values) for field, values in self.postings.items()}
+        index._add(metadatas)
+        index.deleted[np.asarray(deleted_rows, dtype=np.int64)] = True
+        index.deleted_count = int(index.deleted.sum())
+        return index
+
+    def _term_names(self, field: str, term: str) -> List[str]:
+        # Indexed names equal to, or containing the words of, term
+        term = term.strip().lower()
+        pattern = re.compile(r'\b' + re.escape(term) + r'\b')
+        return [name for name in self.postings[field] if name == term or pattern.search(name)]
+
+    def _term_rows(self, field: str, term: str) -> np.ndarray:
+        # Rows whose field contains a name matching term
+        matches = [self.postings[field][name] for name in self._term_names(field, term)]
+        if not matches:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(matches))
+
+    def _term_values(self, field: str, term: str) -> List[str]:
+        # Stored strings of field that list a name matching term
+        names = set(self._term_names(field, term))
+        return [value for value, listed in self.stored_values[field].items() if names.intersection(listed)]
+
+    def candidates(self, filters: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        # Sorted rows matching every filter, or None when nothing is filtered
+        filters = validate_filters(filters)
+        if filters is None:
+            return None
+
+        rows: Optional[np.ndarray] = None
+
+        def narrow(selected: np.ndarray):
+            nonlocal rows
+            rows = selected if rows is None else np.intersect1d(rows, selected, assume_unique=True)
+
+        categories = [c.strip().lower() for c in _as_list(filters.get('category'))]
+        if categories:
+            narrow(np.unique(np.concatenate(
+                [self.postings['category'].get(c, np.empty(0, dtype=np.int64)) for c in categories])))
+
+        for field, key in (('tools_required', 'tools_required'), ('ppe_required', 'ppe_required')):
+            for term in _as_list(filters.get(key)):
+                narrow(self._term_rows(field, term))
+
+        if rows is None:
+            rows = np.arange(self.size, dtype=np.int64)
+
+        for field, key in (('tools_required', 'exclude_tools'), ('ppe_required', 'exclude_ppe')):
+            for term in _as_list(filters.get(key)):
+                rows = np.setdiff1d(rows, self._term_rows(field, term), assume_unique=True)
+
+        if self.deleted_count:
+            rows = rows[~self.deleted[rows]]
+        logger.debug(f"Filters {filters} selected {len(rows)} of {self.size} rows")
+        return rows
+
+    def category_where(self, filters: Dict[str, Any]) -> Dict[str, Any]:
+        # ChromaDB where clause for the category filter, using the stored spellings
+        names = [name for c in _as_list(filters.get('category'))
+                 for name in self.category_names.get(c.strip().lower(), [c])]
+        return {'category': {'$in': names}}
+
+    def where(self, filters: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        # ChromaDB where clause selecting exactly the rows candidates() returns, or None when a
+        # term matches too many stored strings to push down (callers then score candidates in-process)
+        filters = validate_filters(filters)
+        if filters is None:
+            return None
+
+        clauses = []
+        if _as_list(filters.get('category')):
+            clauses.append(self.category_where(filters))
+        for field, key, operator in (('tools_required', 'tools_required', '$in'), ('ppe_required', 'ppe_required', '$in'),
+                                     ('tools_required', 'exclude_tools', '$nin'), ('ppe_required', 'exclude_ppe', '$nin')):
+            for term in _as_list(filters.get(key)):
+                values = self._term_values(field, term)
+                if len(values) > WHERE_MAX_VALUES:
+                    return None
+                # Excluding a term nothing lists is a no-op; requiring one is handled by candidates() being empty
+                if values or operator == '$in':
+                    clauses.append({field: {operator: values}})
+
+        if not clauses:
+            return None
+        return clauses[0] if len(clauses) == 1 else {'$and': clauses}
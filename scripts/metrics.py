@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Metrics and Tracing for Caliper-AI
+Timed spans, counters and histograms for every pipeline stage, exported as
+Prometheus text or JSON. Off unless METRICS=1 (or enable() is called); when
+off, span() hands back a shared no-op context and timed() costs one flag check.
+
+    with span('vector_search'):
+        ...
+    inc('queries_served_total', len(queries))
+"""
+
+import bisect
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from functools import wraps
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+# Configure logging based on environment variable
+log_level = logging.DEBUG if os.getenv('DEBUG') else logging.WARNING
+logging.basicConfig(level=log_level, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+METRIC_PREFIX = "caliper_"
+# Stage latency buckets in seconds, from sub-millisecond searches to multi-minute ingests
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+# Finished spans kept for the JSON trace dump
+TRACE_BUFFER_SIZE = int(os.getenv('METRICS_TRACE_BUFFER', '1000'))
+
+_NOOP_SPAN = contextlib.nullcontext()
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    escaped = (name + '="' + value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+               for name, value in pairs)
+    return '{' + ','.join(escaped) + '}'
+
+
+class Histogram:
+    # Cumulative-bucket histogram, one series per label set
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.series: Dict[LabelKey, List[float]] = {}
+
+    def observe(self, value: float, key: LabelKey = ()) -> None:
+        # Layout per series: bucket counts..., +Inf count, sum
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = [0.0] * (len(self.buckets) + 2)
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def snapshot(self, key: LabelKey) -> Dict[str, Any]:
+        series = self.series[key]
+        counts = series[:-1]
+        cumulative, running = [], 0.0
+        for count in counts:
+            running += count
+            cumulative.append(running)
+        return {
+            'count': int(running),
+            'sum': series[-1],
+            'buckets': {str(bound): int(total) for bound, total in zip(self.buckets + (float('inf'),), cumulative)},
+        }
+
+
+class MetricsRegistry:
+    # Counters, histograms, collector gauges and a ring buffer of recent spans
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.counters: Dict[str, Dict[LabelKey, float]] = {}
+        self.histograms: Dict[str, Histogram] = {}
+        self.collectors: Dict[str, Callable[[], Dict[str, float]]] = {}
+        self.spans: Deque[Dict[str, Any]] = deque(maxlen=TRACE_BUFFER_SIZE)
+
+    def inc(self, name: str, value: float = 1.0, **labels: Any) -> None:
+        if not self.enabled:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(value, _label_key(labels))
+
+    def register_collector(self, name: str, collect: Callable[[], Dict[str, float]]) -> None:
+        # Gauges read at export time, e.g. cache sizes and hit rates
+        self.collectors[name] = collect
+
+    def span(self, name: str, **attributes: Any):
+        if not self.enabled:
+            return _NOOP_SPAN
+        return _Span(self, name, attributes)
+
+    def _stack(self) -> List[str]:
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _finish(self, name: str, parent: Optional[str], start: float, seconds: float,
+                attributes: Dict[str, Any], error: Optional[str]) -> None:
+        self.observe('stage_seconds', seconds, stage=name)
+        if error:
+            self.inc('stage_errors_total', stage=name)
+        record = {'name': name, 'parent': parent, 'start': start, 'seconds': seconds,
+                  'thread': threading.current_thread().name}
+        if attributes:
+            record['attributes'] = attributes
+        if error:
+            record['error'] = error
+        self.spans.append(record)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self.spans.clear()
+
+    def _gauges(self) -> Dict[str, float]:
+        gauges = {}
+        for collector_name, collect in list(self.collectors.items()):
+            try:
+                for name, value in collect().items():
+                    if isinstance(value, (int, float)) and not isinstance(value, bool):
+                        gauges[f"{collector_name}_{name}"] = float(value)
+            except Exception as e:
+                logger.warning(f"Metrics collector {collector_name} failed: {e}")
+        return gauges
+
+    def snapshot(self) -> Dict[str, Any]:
+        # Everything as plain JSON-serializable data
+        with self._lock:
+            counters = {name: [{'labels': dict(key), 'value': value} for key, value in series.items()]
+                        for name, series in self.counters.items()}
+            histograms = {name: [dict(histogram.snapshot(key), labels=dict(key)) for key in histogram.series]
+                          for name, histogram in self.histograms.items()}
+            spans = list(self.spans)
+        return {'enabled': self.enabled, 'timestamp': time.time(), 'counters': counters,
+                'histograms': histograms, 'gauges': self._gauges(), 'recent_spans': spans}
+
+    def render_prometheus(self) -> str:
+        # Prometheus text exposition format (version 0.0.4)
+        lines: List[str] = []
+        with self._lock:
+            for name, series in sorted(self.counters.items()):
+                metric = METRIC_PREFIX + name
+                lines.append(f"# TYPE {metric} counter")
+                for key, value in series.items():
+                    lines.append(f"{metric}{_format_labels(key)} {value:g}")
+            for name, histogram in sorted(self.histograms.items()):
+                metric = METRIC_PREFIX + name
+                lines.append(f"# TYPE {metric} histogram")
+                for key in histogram.series:
+                    data = histogram.snapshot(key)
+                    for bound, total in data['buckets'].items():
+                        le = '+Inf' if bound == 'inf' else bound
+                        lines.append(f"{metric}_bucket{_format_labels(key, ('le', le))} {total}")
+                    lines.append(f"{metric}_sum{_format_labels(key)} {data['sum']:g}")
+                    lines.append(f"{metric}_count{_format_labels(key)} {data['count']}")
+        for name, value in sorted(self._gauges().items()):
+            metric = METRIC_PREFIX + name
+            lines.append(f"# TYPE {metric} gauge")
+            lines.append(f"{metric} {value:g}")
+        return '\n'.join(lines) + '\n'
+
+
+class _Span:
+    # Times one stage; nested spans record their parent stage
+
+    __slots__ = ('registry', 'name', 'attributes', 'parent', 'start', 'wall_start')
+
+    def __init__(self, registry: MetricsRegistry, name: str, attributes: Dict[str, Any]):
+        self.registry = registry
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self) -> "_Span":
+        stack = self.registry._stack()
+        self.parent = stack[-1] if stack else None
+        stack.append(self.name)
+        self.wall_start = time.time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        seconds = time.perf_counter() - self.start
+        self.registry._stack().pop()
+        self.registry._finish(self.name, self.parent, self.wall_start, seconds, self.attributes,
+                              exc_type.__name__ if exc_type else None)
+        return False
+
+
+# Process-wide registry
+registry = MetricsRegistry(enabled=os.getenv('METRICS', '0') not in ('', '0', 'false', 'False'))
+
+
+def enable() -> None:
+    registry.enabled = True
+
+
+def disable() -> None:
+    registry.enabled = False
+
+
+def enabled() -> bool:
+    return registry.enabled
+
+
+def span(name: str, **attributes: Any):
+    # Context manager timing one stage into stage_seconds{stage=name}
+    if not registry.enabled:
+        return _NOOP_SPAN
+    return _Span(registry, name, attributes)
+
+
+def timed(name: Optional[str] = None):
+    # Decorator form of span(); a disabled registry costs one attribute check per call
+    def decorate(function):
+        stage = name or function.__name__
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not registry.enabled:
+                return function(*args, **kwargs)
+            with _Span(registry, stage, {}):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def inc(name: str, value: float = 1.0, **labels: Any) -> None:
+    registry.inc(name, value, **labels)
+
+
+def observe(name: str, value: float, **labels: Any) -> None:
+    registry.observe(name, value, **labels)
+
+
+def register_collector(name: str, collect: Callable[[], Dict[str, float]]) -> None:
+    registry.register_collector(name, collect)
+
+
+def render_prometheus() -> str:
+    return registry.render_prometheus()
+
+
+def snapshot() -> Dict[str, Any]:
+    return registry.snapshot()
+
+
+def dump_json(path: str) -> bool:
+    # Write the current snapshot to a JSON file
+    try:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(snapshot(), f, indent=2, default=str)
+        return True
+    except OSError as e:
+        logger.error(f"Failed to write metrics to {path}: {e}")
+        return False
@@ -0,0 +1,501 @@
+#!/usr/bin/env python3
+"""
+In-Process Vector Search for Caliper-AI
+Holds normalized float32 embeddings in a memory-mapped matrix and answers
+queries with exact blocked top-k search, or with an IVF (inverted file)
+approximate index for large corpora. With VECTOR_STORAGE=fp16|int8|pq the
+scoring pass runs over compressed codes and the best candidates are
+re-ranked with the exact vectors. Results use the same format as
+query_system.search_chroma.
+
+    python scripts/numpy_search.py build [index_dir] [fp32|fp16|int8|pq]
+"""
+
+import json
+import logging
+import os
+import sys
+from collections.abc import Sequence
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from metadata_index import MetadataIndex
+from vector_codecs import VectorCodec, DEFAULT_STORAGE, STORAGE_TYPES
+
+# Configure logging based on environment variable
+log_level = logging.DEBUG if os.getenv('DEBUG') else logging.WARNING
+logging.basicConfig(level=log_level, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_DIR = os.getenv('NUMPY_INDEX_DIR', './numpy_index')
+BLOCK_ROWS = 65536          # rows scored per matrix multiply
+IVF_MIN_ROWS = 50000        # below this, exact search is already fast enough
+DEFAULT_NPROBE = int(os.getenv('IVF_NPROBE', '16'))
+# Compressed indexes re-rank top_k * RERANK_FACTOR candidates with the exact vectors
+RERANK_FACTOR = int(os.getenv('RERANK_FACTOR', '8'))
+
+_VECTORS_FILE = "vectors.npy"
+_RECORDS_FILE = "records.json"
+_RECORDS_PARQUET_FILE = "records.parquet"
+_MANIFEST_FILE = "manifest.json"
+_CENTROIDS_FILE = "ivf_centroids.npy"
+_LIST_OFFSETS_FILE = "ivf_offsets.npy"
+_LIST_ROWS_FILE = "ivf_rows.npy"
+
+# json needs nothing extra; parquet (columnar, memory-mapped on load) needs pyarrow
+RECORDS_FORMATS = ('json', 'parquet')
+_METADATA_PREFIX = "meta."
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    # L2-normalize rows so inner product equals cosine similarity
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.clip(norms, 1e-12, None)
+
+
+def merge_top_k(scores: np.ndarray, rows: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+    # Keep the top_k highest scores per query row, sorted best first
+    k = min(top_k, scores.shape[1])
+    if k == 0:
+        return scores[:, :0], rows[:, :0]
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    part_scores = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-part_scores, axis=1, kind='stable')
+    return np.take_along_axis(part_scores, order, axis=1), np.take_along_axis(
+        np.take_along_axis(rows, part, axis=1), order, axis=1)
+
+
+def write_records(index_dir: str, ids: List[str], documents: List[str],
+                  metadatas: List[Dict[str, Any]], records_format: str = 'json') -> None:
+    # Write ids, texts and metadata; parquet stores one column per metadata key
+    if records_format == 'parquet':
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        keys = sorted({key for metadata in metadatas for key in (metadata or {})})
+        columns = {'id': ids, 'document': documents}
+        for key in keys:
+            columns[_METADATA_PREFIX + key] = [(metadata or {}).get(key) for metadata in metadatas]
+        pq.write_table(pa.table(columns), os.path.join(index_dir, _RECORDS_PARQUET_FILE))
+        return
+    with open(os.path.join(index_dir, _RECORDS_FILE), 'w', encoding='utf-8') as f:
+        json.dump({'ids': ids, 'documents': documents, 'metadatas': metadatas}, f)
+
+
+class ArrowColumn(Sequence):
+    # Read-only list view of a Parquet column; values become Python objects only when a row is read
+
+    def __init__(self, column):
+        self._column = column
+
+    def __len__(self) -> int:
+        return len(self._column)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            values = self._column.slice(start, max(0, stop - start)).to_pylist()
+            return values[::step] if step != 1 else values
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("row index out of range")
+        return self._column[index].as_py()
+
+    def __iter__(self):
+        # Converted a block at a time, for callers that do walk every row (e.g. building id lookups)
+        for start in range(0, len(self), BLOCK_ROWS):
+            yield from self[start:start + BLOCK_ROWS]
+
+
+class ArrowMetadatas(Sequence):
+    # Metadata dicts rebuilt per row from the meta.* columns; missing keys come back absent, not None
+
+    def __init__(self, table, names: List[str]):
+        self._keys = [name[len(_METADATA_PREFIX):] for name in names]
+        self._columns = [ArrowColumn(table.column(name)) for name in names]
+        self._rows = table.num_rows
+
+    def __len__(self) -> int:
+        return self._rows
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            rows = range(*index.indices(self._rows))
+            columns = [column[index] for column in self._columns]
+        else:
+            if index < 0:
+                index += self._rows
+            if not 0 <= index < self._rows:
+                raise IndexError("row index out of range")
+            rows = range(1)
+            columns = [[column[index]] for column in self._columns]
+        metadatas = [{key: value for key, value in zip(self._keys, values) if value is not None}
+                     for values in zip(*columns)] if columns else [{} for _ in rows]
+        return metadatas if isinstance(index, slice) else metadatas[0]
+
+    def __iter__(self):
+        for start in range(0, self._rows, BLOCK_ROWS):
+            yield from self[start:start + BLOCK_ROWS]
+
+
+def read_records(index_dir: str, records_format: str = 'json') -> Dict[str, Sequence]:
+    # Read back what write_records wrote; missing metadata keys come back absent, not None
+    if records_format == 'parquet':
+        import pyarrow.parquet as pq
+
+        # The Arrow columns are kept as they are and only rows that are returned become Python objects,
+        # so load time does not grow with a per-row conversion
+        table = pq.read_table(os.path.join(index_dir, _RECORDS_PARQUET_FILE), memory_map=True)
+        names = [name for name in table.column_names if name.startswith(_METADATA_PREFIX)]
+        return {'ids': ArrowColumn(table.column('id')), 'documents': ArrowColumn(table.column('document')),
+                'metadatas': ArrowMetadatas(table, names)}
+    with open(os.path.join(index_dir, _RECORDS_FILE), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def encoder_manifest() -> Dict[str, Any]:
+    # Describes the encoder whose vectors an index holds, so it is never queried with another one
+    from local_embeddings import EMBEDDING_DIM, DEFAULT_BACKEND, _model_name, encoder_id
+
+    return {'encoder': encoder_id(), 'model_name': _model_name, 'backend': DEFAULT_BACKEND,
+            'embedding_dim': EMBEDDING_DIM}
+
+
+def check_encoder(manifest: Dict[str, Any]) -> Optional[str]:
+    # Reason an index cannot be queried with the configured encoder, or None if it can
+    if 'model_name' not in manifest:
+        return None
+    current = encoder_manifest()
+    if manifest['model_name'] != current['model_name'] or manifest['embedding_dim'] != current['embedding_dim']:
+        return (f"index was built with {manifest['model_name']} ({manifest['embedding_dim']} dims), "
+                f"but the configured encoder is {current['model_name']} ({current['embedding_dim']} dims)")
+    if manifest.get('backend') != current['backend']:
+        # Backends run the same weights; their vectors differ only by rounding
+        logger.warning(f"Index was built with the {manifest.get('backend')} backend, "
+                       f"querying with {current['backend']}")
+    return None
+
+
+def train_ivf(vectors: np.ndarray, n_lists: int, iterations: int = 10,
+              sample_size: int = 100000, seed: int = 0) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Spherical k-means over a sample, then bucket every row under its nearest centroid
+    rng = np.random.default_rng(seed)
+    n = len(vectors)
+    sample = vectors[np.sort(rng.choice(n, size=min(sample_size, n), replace=False))]
+    centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+
+    for _ in range(iterations):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        for c in range(n_lists):
+            members = sample[assignment == c]
+            if len(members):
+                centroids[c] = members.mean(axis=0)
+        centroids = normalize_rows(centroids)
+
+    # Assign the full corpus block by block
+    assignment = np.empty(n, dtype=np.int32)
+    for start in range(0, n, BLOCK_ROWS):
+        block = np.asarray(vectors[start:start + BLOCK_ROWS])
+        assignment[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+
+    list_rows = np.argsort(assignment, kind='stable').astype(np.int64)
+    offsets = np.zeros(n_lists + 1, dtype=np.int64)
+    np.cumsum(np.bincount(assignment, minlength=n_lists), out=offsets[1:])
+    return centroids, offsets, list_rows
+
+
+class NumpySearchIndex:
+    # Memory-mapped exact / IVF vector index with ChromaDB-style results
+
+    def __init__(self, vectors: np.ndarray, ids: List[str], documents: List[str],
+                 metadatas: List[Dict[str, Any]], manifest: Optional[Dict[str, Any]] = None,
+                 ivf: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None,
+                 codec: Optional[VectorCodec] = None, index_dir: Optional[str] = None):
+        self.vectors = vectors
+        self.ids = ids
+        self.documents = documents
+        self.metadatas = metadatas
+        self.manifest = manifest or {}
+        self.ivf = ivf
+        # Compressed codes scored in place of vectors; None scores the float32 vectors directly
+        self.codec = codec
+        self.index_dir = index_dir
+        self._metadata_index: Optional[MetadataIndex] = None
+        self._row_of: Optional[Dict[str, int]] = None
+
+    @property
+    def metadata_index(self) -> MetadataIndex:
+        # Inverted indexes over category, tools and PPE, built on first filtered search
+        if self._metadata_index is None:
+            self._metadata_index = MetadataIndex(self.metadatas)
+        return self._metadata_index
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def rows_for_ids(self, ids: List[str]) -> np.ndarray:
+        # Sorted rows holding the given ids; unknown ids are skipped
+        if self._row_of is None:
+            self._row_of = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        rows = [self._row_of[doc_id] for doc_id in ids if doc_id in self._row_of]
+        return np.unique(np.asarray(rows, dtype=np.int64))
+
+    @classmethod
+    def build(cls, index_dir: str, ids: List[str], documents: List[str],
+              metadatas: List[Dict[str, Any]], embeddings: np.ndarray,
+              use_ivf: Optional[bool] = None, manifest: Optional[Dict[str, Any]] = None,
+              storage: str = DEFAULT_STORAGE, records_format: str = 'json') -> "NumpySearchIndex":
+        # Normalize and write the index to disk, training IVF lists for large corpora
+        if storage not in STORAGE_TYPES:
+            raise ValueError(f"Unknown vector storage '{storage}', expected one of {STORAGE_TYPES}")
+        if records_format not in RECORDS_FORMATS:
+            raise ValueError(f"Unknown records format '{records_format}', expected one of {RECORDS_FORMATS}")
+        os.makedirs(index_dir, exist_ok=True)
+        vectors = normalize_rows(embeddings)
+        np.save(os.path.join(index_dir, _VECTORS_FILE), vectors)
+        write_records(index_dir, ids, documents, metadatas, records_format)
+
+        if use_ivf is None:
+            use_ivf = len(ids) >= IVF_MIN_ROWS
+        manifest = dict(manifest or {}, rows=len(ids), dim=int(vectors.shape[1]), ivf=bool(use_ivf),
+                        storage='fp32', records_format=records_format)
+        if storage != 'fp32':
+            # The float32 vectors stay on disk for re-ranking; only the codes are scanned
+            manifest.update(VectorCodec.encode(vectors, storage).save(index_dir))
+        if use_ivf:
+            n_lists = max(1, int(np.sqrt(len(ids))))
+            centroids, offsets, list_rows = train_ivf(vectors, n_lists)
+            np.save(os.path.join(index_dir, _CENTROIDS_FILE), centroids)
+            np.save(os.path.join(index_dir, _LIST_OFFSETS_FILE), offsets)
+            np.save(os.path.join(index_dir, _LIST_ROWS_FILE), list_rows)
+            manifest['n_lists'] = n_lists
+
+        with open(os.path.join(index_dir, _MANIFEST_FILE), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+        logger.info(f"Built numpy index with {len(ids)} rows in {index_dir} (ivf={use_ivf}, storage={storage})")
+        return cls.load(index_dir)
+
+    @classmethod
+    def load(cls, index_dir: str = DEFAULT_INDEX_DIR) -> "NumpySearchIndex":
+        # Open an index; vectors are memory-mapped, not read into RAM
+        with open(os.path.join(index_dir, _MANIFEST_FILE), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        records = read_records(index_dir, manifest.get('records_format', 'json'))
+        vectors = np.load(os.path.join(index_dir, _VECTORS_FILE), mmap_mode='r')
+        ivf = None
+        if manifest.get('ivf'):
+            ivf = (np.load(os.path.join(index_dir, _CENTROIDS_FILE)),
+                   np.load(os.path.join(index_dir, _LIST_OFFSETS_FILE)),
+                   np.load(os.path.join(index_dir, _LIST_ROWS_FILE), mmap_mode='r'))
+        return cls(vectors, records['ids'], records['documents'], records['metadatas'], manifest, ivf,
+                   VectorCodec.load(index_dir, manifest), index_dir)
+
+    def _score_rows(self, queries: np.ndarray, rows: Optional[np.ndarray], top_k: int,
+                    rerank: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+        # Top-k over all rows (rows=None) or a row subset, one block at a time
+        total = len(self) if rows is None else len(rows)
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        codec = self.codec
+        keep = top_k * RERANK_FACTOR if codec is not None and rerank else top_k
+        prepared = codec.prepare(queries) if codec is not None else None
+
+        for start in range(0, total, BLOCK_ROWS):
+            if rows is None:
+                block_rows = np.arange(start, min(start + BLOCK_ROWS, total), dtype=np.int64)
+                selection = slice(start, start + BLOCK_ROWS)
+            else:
+                block_rows = np.asarray(rows[start:start + BLOCK_ROWS], dtype=np.int64)
+                selection = block_rows
+            if codec is not None:
+                scores = codec.score(prepared, selection)
+            else:
+                scores = queries @ np.asarray(self.vectors[selection]).T
+            candidate_rows = np.broadcast_to(block_rows, scores.shape)
+            best_scores, best_rows = merge_top_k(np.hstack([best_scores, scores]),
+                                                 np.hstack([best_rows, candidate_rows]), keep)
+
+        if codec is not None and rerank:
+            return self._rerank(queries, best_rows, top_k)
+        return best_scores, best_rows
+
+    def _rerank(self, queries: np.ndarray, candidate_rows: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        # Exact cosine scores for the compressed-search candidates; reads only those rows of the float32 matrix
+        unique_rows, inverse = np.unique(candidate_rows, return_inverse=True)
+        exact = queries @ np.asarray(self.vectors[unique_rows]).T
+        scores = np.take_along_axis(exact, inverse.reshape(candidate_rows.shape), axis=1)
+        return merge_top_k(scores, candidate_rows, top_k)
+
+    def search_vectors(self, query_vectors: np.ndarray, top_k: int = 3,
+                       candidates: Optional[np.ndarray] = None,
+                       nprobe: int = DEFAULT_NPROBE, exact: bool = False,
+                       filters: Optional[Dict[str, Any]] = None,
+                       rerank: bool = True) -> List[Tuple[np.ndarray, np.ndarray]]:
+        # Return (rows, cosine scores) per query, best first; rerank=False keeps compressed-code scores
+        queries = normalize_rows(query_vectors)
+
+        # Metadata filters narrow the rows before any scoring; filtered sets are scored exactly
+        if filters:
+            rows = self.metadata_index.candidates(filters)
+            candidates = rows if candidates is None else np.intersect1d(candidates, rows)
+
+        if candidates is not None or self.ivf is None or exact:
+            scores, rows = self._score_rows(queries, candidates, top_k, rerank)
+            return [(rows[i], scores[i]) for i in range(len(queries))]
+
+        # IVF: score only the rows in the nprobe closest lists
+        centroids, offsets, list_rows = self.ivf
+        probe = np.argsort(-(queries @ centroids.T), axis=1)[:, :nprobe]
+        results = []
+        for i, lists in enumerate(probe):
+            rows = np.concatenate([list_rows[offsets[c]:offsets[c + 1]] for c in lists])
+            scores, best = self._score_rows(queries[i:i + 1], rows, top_k, rerank)
+            results.append((best[0], scores[0]))
+        return results
+
+    def format_hits(self, rows: np.ndarray, scores: np.ndarray) -> List[Dict[str, Any]]:
+        # Same shape as search_chroma results; distance is squared L2 between unit vectors
+        return [
+            {
+                'id': self.ids[row],
+                'text': self.documents[row],
+                'metadata': self.metadatas[row],
+                'distance': float(2.0 - 2.0 * score)
+            }
+            for row, score in zip(rows.tolist(), scores.tolist())
+        ]
+
+    def search(self, query_vectors: np.ndarray, top_k: int = 3, **kwargs) -> List[List[Dict[str, Any]]]:
+        # Search and format results for each query vector
+        return [self.format_hits(rows, scores)
+                for rows, scores in self.search_vectors(query_vectors, top_k, **kwargs)]
+
+
+def export_collection(collection, page_size: int = 5000) -> Dict[str, Any]:
+    # Read ids, documents, metadatas and embeddings out of a ChromaDB collection
+    ids, documents, metadatas, embeddings = [], [], [], []
+    offset = 0
+    while True:
+        page = collection.get(include=['documents', 'metadatas', 'embeddings'],
+                              limit=page_size, offset=offset)
+        if not page['ids']:
+            break
+        ids.extend(page['ids'])
+        documents.extend(page['documents'])
+        metadatas.extend(page['metadatas'])
+        embeddings.append(np.asarray(page['embeddings'], dtype=np.float32))
+        offset += len(page['ids'])
+        if len(page['ids']) < page_size:
+            break
+    matrix = np.vstack(embeddings) if embeddings else np.empty((0, 0), dtype=np.float32)
+    return {'ids': ids, 'documents': documents, 'metadatas': metadatas, 'embeddings': matrix}
+
+
+def build_from_store(index_dir: str = DEFAULT_INDEX_DIR, store=None,
+                     storage: str = DEFAULT_STORAGE, records_format: str = 'json',
+                     manifest: Optional[Dict[str, Any]] = None) -> Optional[NumpySearchIndex]:
+    # Build the in-process index from the vectors already stored in ChromaDB
+    from vector_store import get_store
+    from projection import PROJECTIONS_SUBDIR, collection_projection
+
+    try:
+        store = store or get_store()
+        collection = store.collection()
+        data = export_collection(collection)
+        if not data['ids']:
+            logger.error("The collection is empty, nothing to index")
+            return None
+        # The index carries its encoder and projection, so it can serve queries without the store
+        projection = collection_projection(store, collection)
+        if projection is not None:
+            projection.save(os.path.join(index_dir, PROJECTIONS_SUBDIR))
+        manifest = dict(manifest or {}, generation=store.generation(),
+                        projection=projection.version if projection is not None else None, **encoder_manifest())
+        return NumpySearchIndex.build(index_dir, data['ids'], data['documents'], data['metadatas'],
+                                      data['embeddings'], manifest=manifest, storage=storage,
+                                      records_format=records_format)
+    except Exception as e:
+        logger.error(f"Error building numpy index: {e}")
+        return None
+
+
+def store_is_ahead(manifest: Dict[str, Any]) -> Optional[str]:
+    # The store's generation if it was written after the index was built, otherwise None
+    # Snapshots are frozen exports of another node's store, and nodes without a local store
+    # have nothing to compare against
+    from vector_store import store_generation
+
+    if 'snapshot_format' in manifest or 'generation' not in manifest:
+        return None
+    current = store_generation()
+    if current is None or manifest['generation'] == current:
+        return None
+    return current
+
+
+# Global index instance, loaded once per process
+_index = None
+# Store generation a stale index was last reported for, so the warning is logged once per write
+_stale_generation = None
+
+
+def get_numpy_index(index_dir: str = DEFAULT_INDEX_DIR) -> Optional[NumpySearchIndex]:
+    # Return the process-wide in-process index, loading it on first use
+    # None while the index is older than the store, so callers search ChromaDB instead of serving stale rows
+    global _index, _stale_generation
+
+    if _index is not None and store_is_ahead(_index.manifest) is None:
+        return _index
+
+    # Not loaded yet, or the store has moved on: check the manifest on disk, which may have been rebuilt
+    try:
+        with open(os.path.join(index_dir, _MANIFEST_FILE), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        logger.error(f"No numpy index in {index_dir}. Run 'python scripts/numpy_search.py build' first.")
+        return None
+    current = store_is_ahead(manifest)
+    if current is not None:
+        if _stale_generation != current:
+            logger.warning(f"Numpy index in {index_dir} was built at store generation {manifest['generation']}, "
+                           f"the store is at {current}; searching ChromaDB until it is rebuilt with "
+                           f"'python scripts/numpy_search.py build'")
+            _stale_generation = current
+        _index = None
+        return None
+
+    index = NumpySearchIndex.load(index_dir)
+    problem = check_encoder(index.manifest)
+    if problem:
+        logger.error(f"Refusing numpy index in {index_dir}: {problem}")
+        return None
+    _index = index
+    logger.info(f"Loaded numpy index with {len(_index)} rows from {index_dir}")
+    return _index
+
+
+def main() -> bool:
+    # Build the in-process index from the ChromaDB collection
+    if len(sys.argv) < 2 or sys.argv[1] != 'build':
+        print("Usage: python scripts/numpy_search.py build [index_dir] [fp32|fp16|int8|pq]")
+        return False
+
+    index_dir = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_INDEX_DIR
+    storage = sys.argv[3] if len(sys.argv) > 3 else DEFAULT_STORAGE
+    if storage not in STORAGE_TYPES:
+        print(f"Unknown vector storage '{storage}', expected one of {STORAGE_TYPES}")
+        return False
+    index = build_from_store(index_dir, storage=storage)
+    if index is None:
+        return False
+
+    print(f"Built numpy index with {len(index)} rows in {index_dir} "
+          f"(ivf={index.ivf is not None}, storage={index.manifest['storage']})")
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Embedding Projection for Caliper-AI
+Optional PCA stage that reduces the encoder's 384-dim vectors to
+PROJECTION_DIMS (e.g. 128 or 64) before they are stored or searched.
+
+The projection is fitted before the first write to an empty collection. On
+streaming ingest it uses a uniform sample of rows drawn across the whole CSV
+(PROJECTION_SAMPLE_ROWS), so it is not fitted on whichever category happens
+to come first. It is saved content-addressed under the store's
+persist directory, and its version is recorded in the collection metadata.
+Documents and queries are therefore always projected with the same matrix,
+and a collection never silently mixes projections.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+# Configure logging based on environment variable
+log_level = logging.DEBUG if os.getenv('DEBUG') else logging.WARNING
+logging.basicConfig(level=log_level, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 0 disables the projection; only read when a new collection is first written
+PROJECTION_DIMS = int(os.getenv('PROJECTION_DIMS', '0'))
+# Rows sampled across the input to fit the projection on
+PROJECTION_SAMPLE_ROWS = int(os.getenv('PROJECTION_SAMPLE_ROWS', '5000'))
+
+PROJECTIONS_SUBDIR = "projections"
+VERSION_KEY = "projection"
+DIMS_KEY = "projection_dims"
+
+# Loaded projections by (directory, version)
+_projections: Dict[tuple, "Projection"] = {}
+_fit_lock = threading.Lock()
+
+
+class Projection:
+    # Centered linear map x -> normalize((x - mean) @ components.T)
+
+    def __init__(self, mean: np.ndarray, components: np.ndarray, info: Optional[Dict[str, Any]] = None):
+        self.mean = mean.astype(np.float32)
+        self.components = components.astype(np.float32)
+        self.info = info or {}
+
+    @property
+    def dims(self) -> int:
+        return int(self.components.shape[0])
+
+    @property
+    def version(self) -> str:
+        # Content hash, so two fits only share a version if they project identically
+        digest = hashlib.sha256(self.mean.tobytes() + self.components.tobytes())
+        return f"pca{self.dims}-{digest.hexdigest()[:12]}"
+
+    @classmethod
+    def fit(cls, vectors: np.ndarray, dims: int, encoder: str = '') -> "Projection":
+        # PCA via SVD of the centered sample; keeps the top `dims` principal directions
+        vectors = np.asarray(vectors, dtype=np.float64)
+        if dims >= vectors.shape[1]:
+            raise ValueError(f"Projection dims ({dims}) must be below the embedding dimension ({vectors.shape[1]})")
+        if len(vectors) < dims:
+            raise ValueError(f"Need at least {dims} vectors to fit a {dims}-dim projection, got {len(vectors)}")
+        mean = vectors.mean(axis=0)
+        _, singular_values, vt = np.linalg.svd(vectors - mean, full_matrices=False)
+        variance = singular_values ** 2
+        info = {
+            'source_dim': int(vectors.shape[1]),
+            'fitted_rows': int(len(vectors)),
+            'explained_variance': float(variance[:dims].sum() / variance.sum()) if variance.sum() else 1.0,
+            'encoder': encoder,
+        }
+        return cls(mean, vt[:dims], info)
+
+    def apply(self, vectors: np.ndarray) -> np.ndarray:
+        # Project and re-normalize, so cosine / L2 search keeps working in the reduced space
+        projected = (np.atleast_2d(np.asarray(vectors, dtype=np.float32)) - self.mean) @ self.components.T
+        norms = np.linalg.norm(projected, axis=1, keepdims=True)
+        return projected / np.clip(norms, 1e-12, None)
+
+    def save(self, directory: str) -> str:
+        # Write <version>.npz and <version>.json; returns the version
+        os.makedirs(directory, exist_ok=True)
+        version = self.version
+        np.savez(os.path.join(directory, f"{version}.npz"), mean=self.mean, components=self.components)
+        with open(os.path.join(directory, f"{version}.json"), 'w', encoding='utf-8') as f:
+            json.dump(dict(self.info, version=version, dims=self.dims), f, indent=2)
+        return version
+
+    @classmethod
+    def load(cls, directory: str, version: str) -> "Projection":
+        arrays = np.load(os.path.join(directory, f"{version}.npz"))
+        with open(os.path.join(directory, f"{version}.json"), 'r', encoding='utf-8') as f:
+            info = json.load(f)
+        return cls(arrays['mean'], arrays['components'], info)
+
+
+def projections_dir(store) -> str:
+    # Projections live with the collection data, so they move and get backed up together
+    return os.path.join(store.persist_directory, PROJECTIONS_SUBDIR)
+
+
+def collection_projection(store, collection=None) -> Optional[Projection]:
+    # The projection recorded in the collection metadata, or None for full-dimension collections
+    collection = collection if collection is not None else store.collection()
+    version = (collection.metadata or {}).get(VERSION_KEY)
+    if not version:
+        return None
+    try:
+        return load_projection(projections_dir(store), version)
+    except FileNotFoundError:
+        raise RuntimeError(f"Collection '{collection.name}' uses projection {version}, "
+                           f"but it is missing from {projections_dir(store)}")
+
+
+def load_projection(directory: str, version: str) -> Projection:
+    # Load a saved projection once per process
+    key = (directory, version)
+    projection = _projections.get(key)
+    if projection is None:
+        projection = _projections[key] = Projection.load(directory, version)
+    return projection
+
+
+def reservoir_sample(rows: Iterable[Any], size: int, seed: int = 0) -> List[Any]:
+    # Uniform sample of up to size rows from a stream of unknown length, holding only the sample
+    rng = random.Random(seed)
+    sample: List[Any] = []
+    for seen, row in enumerate(rows):
+        if seen < size:
+            sample.append(row)
+        else:
+            slot = rng.randint(0, seen)
+            if slot < size:
+                sample[slot] = row
+    return sample
+
+
+def needs_fit(store, collection=None) -> bool:
+    # True when PROJECTION_DIMS is set and the collection is still empty and unprojected
+    if PROJECTION_DIMS <= 0:
+        return False
+    collection = collection if collection is not None else store.collection()
+    return collection_projection(store, collection) is None and collection.count() == 0
+
+
+def fit_for_collection(store, sample: np.ndarray, dims: int = PROJECTION_DIMS,
+                       collection=None) -> Optional[Projection]:
+    # Fit on sample, save it and record its version on the (still empty) collection
+    from local_embeddings import encoder_id
+
+    collection = collection if collection is not None else store.collection()
+    projection = Projection.fit(sample, dims, encoder=encoder_id())
+    version = projection.save(projections_dir(store))
+    # ChromaDB rejects changes to hnsw:* settings after creation, so only our keys are sent
+    metadata = {key: value for key, value in (collection.metadata or {}).items() if not key.startswith('hnsw:')}
+    metadata.update({VERSION_KEY: version, DIMS_KEY: projection.dims})
+    collection.modify(metadata=metadata)
+    _projections[(projections_dir(store), version)] = projection
+    # Query processes re-read collection metadata when the generation moves
+    store.mark_changed()
+    logger.info(f"Fitted projection {version} on {len(sample)} vectors "
+                f"({projection.info['explained_variance']:.1%} of variance kept)")
+    return projection
+
+
+def project_for_store(store, embeddings: np.ndarray, fit: bool = True, collection=None) -> np.ndarray:
+    # Apply the collection's projection; the first write to an empty collection fits one if enabled
+    collection = collection if collection is not None else store.collection()
+    projection = collection_projection(store, collection)
+    if projection is None and fit and PROJECTION_DIMS > 0:
+        with _fit_lock:
+            projection = collection_projection(store, collection)
+            if projection is None:
+                if collection.count() > 0:
+                    logger.warning("PROJECTION_DIMS is set but the collection already holds full-dimension "
+                                   "vectors; reset it to fit a projection")
+                elif len(embeddings) < PROJECTION_DIMS:
+                    logger.warning(f"Only {len(embeddings)} vectors in the first batch, need {PROJECTION_DIMS} "
+                                   "to fit a projection; storing full-dimension vectors")
+                else:
+                    projection = fit_for_collection(store, embeddings, PROJECTION_DIMS, collection)
+    return projection.apply(embeddings) if projection is not None else embeddings
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Query Cache for Caliper-AI
+Two-level in-process cache for repeated questions:
+normalized query text -> embedding, and (embedding, top_k, filters, mode) -> results.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+import numpy as np
+import metrics
+
+# Configure logging based on environment variable
+log_level = logging.DEBUG if os.getenv('DEBUG') else logging.WARNING
+logging.basicConfig(level=log_level, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_SIZE = int(os.getenv('QUERY_CACHE_SIZE', '1024'))
+DEFAULT_TTL = float(os.getenv('QUERY_CACHE_TTL', '0')) or None  # seconds, 0 disables expiry
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_query(query: str) -> str:
+    # Collapse case, whitespace and trailing punctuation so trivial variants share an entry
+    return _WHITESPACE.sub(' ', query.strip().lower()).rstrip('?!. ')
+
+
+def embedding_key(embedding: np.ndarray) -> str:
+    # Compact, exact key for a query vector
+    return hashlib.blake2b(np.ascontiguousarray(embedding, dtype=np.float32).tobytes(),
+                           digest_size=16).hexdigest()
+
+
+def filters_key(filters: Optional[Dict[str, Any]]) -> str:
+    # Order-independent key for a filter dict
+    return json.dumps(filters, sort_keys=True, default=str) if filters else ''
+
+
+class LRUCache:
+    # Bounded LRU mapping with optional per-entry time-to-live
+
+    def __init__(self, max_size: int = DEFAULT_MAX_SIZE, ttl: Optional[float] = DEFAULT_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.saved_seconds = 0.0
+        # key -> (value, stored_at, cost_seconds)
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        # Return the cached value or None, refreshing its recency
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        value, stored_at, cost = entry
+        if self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+            del self._data[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        self.saved_seconds += cost
+        return value
+
+    def put(self, key: Hashable, value: Any, cost_seconds: float = 0.0) -> None:
+        # Insert or replace a value; cost_seconds is what a future hit saves
+        self._data[key] = (value, time.monotonic(), cost_seconds)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'saved_seconds': self.saved_seconds,
+        }
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class QueryCache:
+    # Query-embedding cache plus a result cache invalidated when the index changes
+
+    def __init__(self, max_size: int = DEFAULT_MAX_SIZE, ttl: Optional[float] = DEFAULT_TTL):
+        self.embeddings = LRUCache(max_size, ttl)
+        self.results = LRUCache(max_size, ttl)
+        self.invalidations = 0
+        self._generation: Optional[str] = None
+
+    def get_embedding(self, query: str) -> Optional[np.ndarray]:
+        return self.embeddings.get(normalize_query(query))
+
+    def put_embedding(self, query: str, embedding: np.ndarray, cost_seconds: float = 0.0) -> None:
+        self.embeddings.put(normalize_query(query), embedding, cost_seconds)
+
+    def check_generation(self, generation: Optional[str]) -> None:
+        # Drop cached results when the collection has been written to since they were stored
+        if generation != self._generation:
+            if self._generation is not None and len(self.results):
+                logger.info("Index changed, invalidating cached query results")
+                self.invalidations += 1
+            self.results.clear()
+            self._generation = generation
+
+    def get_results(self, embedding: np.ndarray, top_k: int,
+                    filters: Optional[Dict[str, Any]] = None,
+                    generation: Optional[str] = None, mode: str = 'vector'):
+        self.check_generation(generation)
+        results = self.results.get((embedding_key(embedding), top_k, filters_key(filters), mode))
+        return list(results) if results is not None else None
+
+    def put_results(self, embedding: np.ndarray, top_k: int, results,
+                    filters: Optional[Dict[str, Any]] = None,
+                    generation: Optional[str] = None,
+                    cost_seconds: float = 0.0, mode: str = 'vector') -> None:
+        self.check_generation(generation)
+        self.results.put((embedding_key(embedding), top_k, filters_key(filters), mode), list(results), cost_seconds)
+
+    def clear(self) -> None:
+        self.embeddings.clear()
+        self.results.clear()
+
+    def flat_stats(self) -> Dict[str, float]:
+        # stats() as one flat mapping, e.g. results_hit_rate, for metric exports
+        stats = self.stats()
+        flat = {'invalidations': stats['invalidations'], 'saved_seconds': stats['saved_seconds']}
+        for level in ('embeddings', 'results'):
+            flat.update({f"{level}_{name}": value for name, value in stats[level].items()})
+        return flat
+
+    def stats(self) -> Dict[str, Any]:
+        # Hit rates and latency saved for both levels
+        embedding_stats = self.embeddings.stats()
+        result_stats = self.results.stats()
+        return {
+            'embeddings': embedding_stats,
+            'results': result_stats,
+            'invalidations': self.invalidations,
+            'saved_seconds': embedding_stats['saved_seconds'] + result_stats['saved_seconds'],
+        }
+
+
+# Global query cache, disabled with QUERY_CACHE_SIZE=0
+_query_cache = None
+
+
+def get_query_cache() -> Optional[QueryCache]:
+    # Return the process-wide query cache
+    global _query_cache
+
+    if DEFAULT_MAX_SIZE <= 0:
+        return None
+
+    if _query_cache is None:
+        _query_cache = QueryCache()
+        metrics.register_collector('query_cache', _query_cache.flat_stats)
+
+    return _query_cache
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+Async Query Server for Caliper-AI
+Long-running HTTP query service. The model and collection are loaded once,
+and concurrent requests are gathered into micro-batches so each batch costs
+one encode call and one multi-vector search.
+
+    POST /search   {"query": "how to fix a leaky faucet", "top_k": 3,
+                    "filters": {"category": "Plumbing"}, "mode": "hybrid", "rerank": true}
+    GET  /health
+    GET  /metrics        Prometheus text (with METRICS=1)
+    GET  /metrics.json
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple, Union
+import metrics
+from local_embeddings import warm_up as warm_up_model
+from metadata_index import validate_filters
+from query_cache import filters_key
+from query_system import SEARCH_MODE, search_many, serving_index
+from reranker import RERANK_ENABLED, get_reranker
+from vector_store import VectorStore, get_store
+
+# Configure logging based on environment variable
+log_level = logging.DEBUG if os.getenv('DEBUG') else logging.WARNING
+logging.basicConfig(level=log_level, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = os.getenv('QUERY_SERVER_HOST', '127.0.0.1')
+DEFAULT_PORT = int(os.getenv('QUERY_SERVER_PORT', '8080'))
+DEFAULT_BATCH_WINDOW_MS = float(os.getenv('QUERY_BATCH_WINDOW_MS', '5'))
+DEFAULT_MAX_BATCH = int(os.getenv('QUERY_MAX_BATCH', '64'))
+MAX_TOP_K = 50
+MAX_BODY_BYTES = 64 * 1024
+
+
+class PayloadTooLarge(Exception):
+    # Request body above MAX_BODY_BYTES; answered with 413, while malformed requests get 400
+    pass
+
+
+# (query, top_k, filters, mode, rerank, enqueued_at, future)
+QueueItem = Tuple[str, int, Optional[Dict[str, Any]], str, bool, float, "asyncio.Future"]
+
+_STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+                413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+
+class MicroBatcher:
+    # Collects concurrent queries for a short window and searches them together
+
+    def __init__(self, store: Optional[VectorStore], window_ms: float = DEFAULT_BATCH_WINDOW_MS,
+                 max_batch: int = DEFAULT_MAX_BATCH):
+        self.store = store
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self.batches = 0
+        self.queries = 0
+        self._queue: "asyncio.Queue[QueueItem]" = asyncio.Queue()
+        # One search thread: batches run back to back while the event loop keeps accepting requests
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="caliper-search")
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        # Cancel the batching loop and wait for the in-flight batch
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._executor.shutdown(wait=True)
+
+    async def search(self, query: str, top_k: int, filters: Optional[Dict[str, Any]] = None,
+                     mode: str = SEARCH_MODE, rerank: bool = RERANK_ENABLED) -> List[Dict[str, Any]]:
+        # Enqueue one query and wait for its slice of the batch result
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((query, top_k, filters, mode, rerank, time.perf_counter(), future))
+        return await future
+
+    async def _collect(self) -> List[QueueItem]:
+        # Block for the first query, then gather more until the window closes or the batch is full
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    def _search_groups(self, batch: List[QueueItem]) -> List[List[Dict[str, Any]]]:
+        # Queries sharing the same filters, mode and re-rank flag are searched together, once with their largest top_k
+        groups: Dict[Tuple[str, str, bool], List[int]] = {}
+        for i, (_, _, filters, mode, rerank, _, _) in enumerate(batch):
+            groups.setdefault((filters_key(filters), mode, rerank), []).append(i)
+
+        results: List[List[Dict[str, Any]]] = [[] for _ in batch]
+        for members in groups.values():
+            top_k = max(batch[i][1] for i in members)
+            _, _, filters, mode, rerank, _, _ = batch[members[0]]
+            # The re-rank budget runs from when the oldest request in the group arrived,
+            # so time spent queued under load shrinks or skips the re-rank
+            started = min(batch[i][5] for i in members)
+            found = search_many([batch[i][0] for i in members], top_k, self.store, filters, mode,
+                                rerank=rerank, started=started)
+            for i, result in zip(members, found):
+                results[i] = result[:batch[i][1]]
+        return results
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            try:
+                results = await loop.run_in_executor(self._executor, self._search_groups, batch)
+                for (*_, future), result in zip(batch, results):
+                    if not future.done():
+                        future.set_result(result)
+            except Exception as e:
+                logger.error(f"Batch search failed: {e}")
+                for *_, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            self.batches += 1
+            self.queries += len(batch)
+            metrics.inc('server_batches_total')
+            metrics.inc('server_batched_queries_total', len(batch))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'batches': self.batches,
+            'queries': self.queries,
+            'mean_batch_size': self.queries / self.batches if self.batches else 0.0,
+            'pending': self._queue.qsize(),
+        }
+
+
+class QueryServer:
+    # Minimal HTTP/1.1 front end over the micro-batcher
+
+    def __init__(self, store: Optional[VectorStore], host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                 window_ms: float = DEFAULT_BATCH_WINDOW_MS, max_batch: int = DEFAULT_MAX_BATCH):
+        self.store = store
+        self.host = host
+        self.port = port
+        self.window_ms = window_ms
+        self.max_batch = max_batch
+        self.batcher: Optional[MicroBatcher] = None
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[Tuple[str, str, Dict[str, str], bytes]]:
+        # Parse the request line, headers and body; None when the client closed the connection
+        # Raises ValueError for a malformed request and PayloadTooLarge for an oversized body
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        parts = request_line.decode('latin-1').rstrip('\r\n').split(' ', 2)
+        if len(parts) != 3:
+            raise ValueError('malformed request line')
+        method, path, _ = parts
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        length_header = headers.get('content-length', '0')
+        if not length_header.isdigit():
+            raise ValueError('invalid Content-Length')
+        length = int(length_header)
+        if length > MAX_BODY_BYTES:
+            raise PayloadTooLarge()
+        body = await reader.readexactly(length) if length else b''
+        return method, path, headers, body
+
+    async def _respond(self, writer: asyncio.StreamWriter, status: int, payload: Union[Dict[str, Any], str],
+                       keep_alive: bool) -> None:
+        # Dicts are sent as JSON, strings as plain text (the Prometheus exposition format)
+        if isinstance(payload, str):
+            body, content_type = payload.encode('utf-8'), 'text/plain; version=0.0.4'
+        else:
+            body, content_type = json.dumps(payload).encode('utf-8'), 'application/json'
+        head = (f"HTTP/1.1 {status} {_STATUS_TEXT.get(status, '')}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode('latin-1') + body)
+        await writer.drain()
+
+    async def _route(self, method: str, path: str, body: bytes) -> Tuple[int, Union[Dict[str, Any], str]]:
+        if path == '/health':
+            if self.store is not None:
+                documents = self.store.count()
+            else:
+                index = serving_index()
+                documents = len(index) if index is not None else 0
+            return 200, {'status': 'ok', 'documents': documents, 'batching': self.batcher.stats()}
+        if path == '/metrics':
+            return 200, metrics.render_prometheus()
+        if path == '/metrics.json':
+            return 200, metrics.snapshot()
+
+        if path != '/search':
+            return 404, {'error': f'unknown path {path}'}
+        if method != 'POST':
+            return 405, {'error': 'use POST'}
+
+        try:
+            request = json.loads(body or b'{}')
+            query = str(request['query']).strip()
+            top_k = max(1, min(int(request.get('top_k', 3)), MAX_TOP_K))
+            filters = validate_filters(request.get('filters'))
+            mode = request.get('mode', SEARCH_MODE)
+            if mode not in ('vector', 'hybrid'):
+                raise ValueError(f"unknown mode {mode!r}")
+            rerank = request.get('rerank', RERANK_ENABLED)
+            if not isinstance(rerank, bool):
+                raise ValueError("rerank must be true or false")
+        except (ValueError, KeyError, TypeError) as e:
+            return 400, {'error': f'expected JSON body {{"query": str, "top_k": int, "filters": dict, '
+                                  f'"mode": "vector"|"hybrid", "rerank": bool}}: {e}'}
+        if not query:
+            return 400, {'error': 'query must not be empty'}
+
+        start = time.perf_counter()
+        results = await self.batcher.search(query, top_k, filters, mode, rerank)
+        return 200, {'query': query, 'results': results,
+                     'latency_ms': (time.perf_counter() - start) * 1000.0}
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        # Serve requests on one connection until the client closes it
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except PayloadTooLarge:
+                    await self._respond(writer, 413, {'error': 'payload too large'}, keep_alive=False)
+                    break
+                except ValueError as e:
+                    # Includes request lines or headers longer than the stream reader's limit
+                    await self._respond(writer, 400, {'error': f'bad request: {e}'}, keep_alive=False)
+                    break
+                if request is None:
+                    break
+                method, path, headers, body = request
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                route = path.split('?', 1)[0]
+                start = time.perf_counter()
+                try:
+                    status, payload = await self._route(method, route, body)
+                except Exception as e:
+                    logger.error(f"Error handling {method} {path}: {e}")
+                    status, payload = 500, {'error': 'internal error'}
+                if metrics.enabled():
+                    # Unknown paths share one label so arbitrary URLs cannot grow the series count
+                    label = route if status != 404 else 'other'
+                    metrics.inc('http_requests_total', path=label, status=status)
+                    metrics.observe('http_request_seconds', time.perf_counter() - start, path=label)
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self) -> None:
+        # Start batching and accept connections until cancelled
+        self.batcher = MicroBatcher(self.store, self.window_ms, self.max_batch)
+        self.batcher.start()
+        server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        print(f"🔧 Caliper query server listening on http://{self.host}:{self.port} "
+              f"(batch window {self.window_ms}ms, max batch {self.max_batch})")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await self.batcher.stop()
+
+
+def warm_up(store: Optional[VectorStore]) -> bool:
+    # Load the model and collection once, and run one search so the first request is not cold
+    if warm_up_model() is None:
+        logger.error("Model failed to load")
+        return False
+    if store is not None and store.count() == 0:
+        logger.error("The index is empty. Run 'python scripts/generate_embeddings.py' first.")
+        return False
+    search_many(["warm up"], top_k=1, store=store)
+    if RERANK_ENABLED and not get_reranker().warm_up():
+        logger.warning("Cross-encoder unavailable, serving first-stage results only")
+    return True
+
+
+def main() -> bool:
+    # Main function to run the query server
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_PORT
+
+    # A numpy index (e.g. a snapshot) serves on its own, without opening ChromaDB
+    store = None if serving_index() is not None else get_store()
+    if not warm_up(store):
+        return False
+
+    try:
+        asyncio.run(QueryServer(store, port=port).serve())
+    except KeyboardInterrupt:
+        print("👋 Server stopped")
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -7,54 +7,325 @@ Simple query system that finds relevant DIY snippets using semantic search.
 
 import os
 import sys
+import json
+import time
 import logging
-from typing import List, Dict, Any, Optional
-from local_embeddings import generate_text_embedding
+import numpy as np
+from typing import List, Dict, Any, Optional, Tuple
+import metrics
+from local_embeddings import generate_text_embedding, generate_batch_embeddings, EMBEDDING_DIM
+from vector_store import VectorStore, get_store, store_generation, to_store_embeddings
+from query_cache import get_query_cache
+from projection import PROJECTIONS_SUBDIR, load_projection, project_for_store
+from numpy_search import NumpySearchIndex, get_numpy_index, normalize_rows
+from metadata_index import MetadataIndex, validate_filters
+from keyword_index import DEFAULT_INDEX_DIR as KEYWORD_INDEX_DIR, get_keyword_index, read_filter_rows, \
+    reciprocal_rank_fusion
+from text_chunking import collapse_to_parents
+from reranker import RERANK_ENABLED, get_reranker
 
 # Configure logging based on environment variable
 log_level = logging.DEBUG if os.getenv('DEBUG') else logging.WARNING
 logging.basicConfig(level=log_level, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Vector search engine: "chroma" (default) or "numpy" for the in-process index
+SEARCH_ENGINE = os.getenv('SEARCH_ENGINE', 'chroma')
 
-def generate_query_embedding(query: str) -> Optional[List[float]]:
-    # Generate semantic embedding for user query using local sentence-transformers
-    return generate_text_embedding(query)
+# Default retrieval mode for the CLI and query server: "vector" or "hybrid" (BM25 + vector)
+SEARCH_MODE = os.getenv('SEARCH_MODE', 'vector')
 
+# Hybrid search: keyword/vector candidates per leg, and the corpus size above which the
+# vector leg scores only the keyword candidates instead of the whole collection
+HYBRID_CANDIDATES = int(os.getenv('HYBRID_CANDIDATES', '50'))
+HYBRID_RESTRICT_MIN_ROWS = int(os.getenv('HYBRID_RESTRICT_MIN_ROWS', '50000'))
 
-def search_chroma(query: str, top_k: int = 3) -> List[Dict[str, Any]]:
-    # Search ChromaDB for similar DIY snippets
+# Long snippets are indexed as several chunks, so searches fetch extra hits before
+# collapsing chunks back to one result per parent snippet
+CHUNK_OVERFETCH = 2
+
+# Metadata index over the ChromaDB collection, rebuilt when the store generation changes
+_store_metadata: Dict[str, Any] = {'generation': None, 'index': None, 'ids': None, 'main_build': None}
+
+
+def serving_index() -> Optional[NumpySearchIndex]:
+    # The numpy index answering queries, or None when they go to ChromaDB
+    return get_numpy_index() if SEARCH_ENGINE == 'numpy' else None
+
+
+def results_generation(index: Optional[NumpySearchIndex], store: Optional[VectorStore]) -> str:
+    # Result cache key for the index being searched; a numpy index keys on the build it was loaded from
+    if index is not None:
+        return f"numpy:{index.manifest.get('generation')}:{index.manifest.get('created_at', '')}"
+    return store.generation()
+
+
+def project_queries(embeddings: np.ndarray, store: Optional[VectorStore] = None) -> np.ndarray:
+    # Apply the collection's projection (if any) so queries live in the same space as the stored vectors
+    index = serving_index()
+    if index is not None and 'projection' in index.manifest:
+        # Indexes that record their projection (e.g. snapshots) serve without consulting the store
+        version = index.manifest['projection']
+        if not version:
+            return embeddings
+        return load_projection(os.path.join(index.index_dir, PROJECTIONS_SUBDIR), version).apply(embeddings)
+    return project_for_store(store or get_store(), embeddings, fit=False)
+
+
+def generate_query_embedding(query: str, store: Optional[VectorStore] = None) -> Optional[np.ndarray]:
+    # Generate semantic embedding for user query, reusing cached embeddings for repeated questions
+    # The cache holds encoder output; the projection is applied afterwards
+    cache = get_query_cache()
+    embedding = cache.get_embedding(query) if cache is not None else None
+    
+    if embedding is None:
+        start = time.perf_counter()
+        embedding = generate_text_embedding(query)
+        if embedding is None:
+            return None
+        if cache is not None:
+            cache.put_embedding(query, embedding, time.perf_counter() - start)
+    return project_queries(np.atleast_2d(embedding), store)[0]
+
+
+def generate_query_embeddings(queries: List[str], store: Optional[VectorStore] = None) -> np.ndarray:
+    # Embed many queries in one batched forward pass, skipping cached queries
+    cache = get_query_cache()
+    if cache is None:
+        # Queries bypass the on-disk document cache
+        embeddings = generate_batch_embeddings(queries, use_cache=False)
+        return project_queries(embeddings, store) if len(embeddings) == len(queries) else embeddings
+    
+    embeddings = np.empty((len(queries), EMBEDDING_DIM), dtype=np.float32)
+    missing = []
+    for i, query in enumerate(queries):
+        embedding = cache.get_embedding(query)
+        if embedding is None:
+            missing.append(i)
+        else:
+            embeddings[i] = embedding
+    
+    if missing:
+        start = time.perf_counter()
+        encoded = generate_batch_embeddings([queries[i] for i in missing], use_cache=False)
+        if len(encoded) != len(missing):
+            return encoded
+        cost = (time.perf_counter() - start) / len(missing)
+        for i, embedding in zip(missing, encoded):
+            embeddings[i] = embedding
+            cache.put_embedding(queries[i], embedding.copy(), cost)
+    
+    return project_queries(embeddings, store)
+
+
+def format_results(results: Dict[str, Any], query_index: int = 0) -> List[Dict[str, Any]]:
+    # Turn one query's slice of a ChromaDB query response into result dicts
+    formatted_results = []
+    for i in range(len(results['ids'][query_index])):
+        result = {
+            'id': results['ids'][query_index][i],
+            'text': results['documents'][query_index][i],
+            'metadata': results['metadatas'][query_index][i],
+            'distance': results['distances'][query_index][i]
+        }
+        formatted_results.append(result)
+    return formatted_results
+
+
+def metadata_from_keyword_index(generation: str) -> bool:
+    # Bring the cached metadata index up to date from the filter fields stored with the keyword index,
+    # when that index is at this generation; only rows added since the last call are read and indexed
+    main_build = _store_metadata['main_build']
+    loaded = read_filter_rows(KEYWORD_INDEX_DIR, main_build, len(_store_metadata['ids']) if main_build else 0)
+    if loaded is None or loaded[0].get('generation') != generation:
+        return False
+    manifest, first_row, ids, metadatas, deleted = loaded
+    if first_row == 0:
+        index = MetadataIndex(metadatas).extended([], deleted)
+    else:
+        index = _store_metadata['index'].extended(metadatas, deleted)
+        ids = _store_metadata['ids'] + ids
+    _store_metadata.update(generation=generation, index=index, ids=ids, main_build=manifest.get('main_build'))
+    return True
+
+
+def get_store_metadata_index(store: VectorStore):
+    # Inverted metadata index and row ids for the collection, cached per store generation
+    # A write only re-reads the collection when the keyword index cannot supply the changed rows
+    generation = store.generation()
+    if _store_metadata['generation'] != generation and not metadata_from_keyword_index(generation):
+        ids, metadatas = [], []
+        offset, page_size = 0, 5000
+        while True:
+            page = store.collection().get(include=['metadatas'], limit=page_size, offset=offset)
+            ids.extend(page['ids'])
+            metadatas.extend(page['metadatas'])
+            offset += len(page['ids'])
+            if len(page['ids']) < page_size:
+                break
+        _store_metadata.update(generation=generation, index=MetadataIndex(metadatas), ids=ids, main_build=None)
+    return _store_metadata['index'], _store_metadata['ids']
+
+
+def filtered_chroma_search(query_embeddings: np.ndarray, top_k: int, store: VectorStore,
+                           filters: Dict[str, Any]) -> List[List[Dict[str, Any]]]:
+    # Check the filters against the metadata index, then let ChromaDB search only the matching rows
+    metadata_index, ids = get_store_metadata_index(store)
+    
+    rows = metadata_index.candidates(filters)
+    if len(rows) == 0:
+        return [[] for _ in query_embeddings]
+    
+    # Category, tool and PPE filters push down as a where clause on the exact stored values
+    where = metadata_index.where(filters)
+    if where is not None:
+        results = store.collection().query(
+            query_embeddings=to_store_embeddings(query_embeddings),
+            n_results=min(top_k, len(rows)),
+            where=where
+        )
+        return [format_results(results, i) for i in range(len(query_embeddings))]
+    
+    return score_ids(query_embeddings, [ids[row] for row in rows.tolist()], top_k, store)
+
+
+def score_ids(query_embeddings: np.ndarray, ids: List[str], top_k: int, store: Optional[VectorStore],
+              filters: Optional[Dict[str, Any]] = None) -> List[List[Dict[str, Any]]]:
+    # Exact search over just the given ids, fetching only their vectors
+    query_embeddings = np.atleast_2d(query_embeddings)
+    if not ids:
+        return [[] for _ in query_embeddings]
+    
+    index = serving_index()
+    if index is not None:
+        return index.search(query_embeddings, top_k, candidates=index.rows_for_ids(ids),
+                            filters=filters)
+    
+    data = (store or get_store()).collection().get(ids=ids, include=['documents', 'metadatas', 'embeddings'])
+    if not data['ids']:
+        return [[] for _ in query_embeddings]
+    candidates = NumpySearchIndex(normalize_rows(np.asarray(data['embeddings'], dtype=np.float32)), data['ids'],
+                                  data['documents'], data['metadatas'])
+    return candidates.search(query_embeddings, top_k, exact=True, filters=filters)
+
+
+@metrics.timed()
+def hybrid_rank(query: str, query_embedding: np.ndarray, top_k: int, store: Optional[VectorStore],
+                filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    # Fuse the BM25 keyword ranking and the vector ranking with reciprocal rank fusion
+    keyword_index = get_keyword_index()
+    if keyword_index is None:
+        return vector_search(query_embedding, top_k, store, filters)[0]
+    generation = store.generation() if store is not None else store_generation()
+    if generation is not None and keyword_index.manifest.get('generation') != generation:
+        logger.warning("Keyword index is older than the collection; rebuild it after ingesting")
+    
+    depth = max(HYBRID_CANDIDATES, top_k)
+    with metrics.span('keyword_search'):
+        keyword_ids = [doc_id for doc_id, _ in keyword_index.search(query, depth)]
+    
+    # Large corpora: keyword matches are the candidate set, so only their vectors are scored
+    if len(keyword_index) >= HYBRID_RESTRICT_MIN_ROWS and len(keyword_ids) >= top_k:
+        vector_hits = score_ids(query_embedding, keyword_ids, depth, store, filters)[0]
+    else:
+        vector_hits = vector_search(query_embedding, depth, store, filters)[0]
+    
+    # Keyword-only hits are scored too, which also drops any the filters exclude
+    records = {hit['id']: hit for hit in vector_hits}
+    missing = [doc_id for doc_id in keyword_ids if doc_id not in records]
+    if missing:
+        for hit in score_ids(query_embedding, missing, len(missing), store, filters)[0]:
+            records[hit['id']] = hit
+    
+    fused = reciprocal_rank_fusion([[hit['id'] for hit in vector_hits],
+                                    [doc_id for doc_id in keyword_ids if doc_id in records]])
+    return collapse_to_parents([dict(records[doc_id], score=score) for doc_id, score in fused], top_k)
+
+
+@metrics.timed()
+def vector_search(query_embeddings: np.ndarray, top_k: int, store: Optional[VectorStore],
+                  filters: Optional[Dict[str, Any]] = None) -> List[List[Dict[str, Any]]]:
+    # Run one multi-vector search on the configured engine, returning results per query
+    # The store is only opened when the search goes to ChromaDB
+    query_embeddings = np.atleast_2d(query_embeddings)
+    filters = validate_filters(filters)
+    
+    if SEARCH_ENGINE == 'numpy':
+        index = get_numpy_index()
+        if index is not None:
+            return index.search(query_embeddings, top_k, filters=filters)
+        logger.warning("Numpy index unavailable, falling back to ChromaDB")
+    
+    store = store or get_store()
+    if filters:
+        return filtered_chroma_search(query_embeddings, top_k, store, filters)
+    
+    results = store.collection().query(
+        query_embeddings=to_store_embeddings(query_embeddings),
+        n_results=top_k
+    )
+    return [format_results(results, i) for i in range(len(query_embeddings))]
+
+
+def rerank_depth(top_k: int, rerank: bool) -> int:
+    # Parent snippets the first stage returns: the re-ranker's candidate pool, or just top_k
+    return max(top_k, get_reranker().max_candidates) if rerank else top_k
+
+
+@metrics.timed()
+def search_chroma(query: str, top_k: int = 3, store: Optional[VectorStore] = None,
+                  filters: Optional[Dict[str, Any]] = None, mode: str = 'vector',
+                  rerank: Optional[bool] = None) -> List[Dict[str, Any]]:
+    # Search ChromaDB for similar DIY snippets, optionally filtered by category, tools or PPE;
+    # mode='hybrid' fuses in BM25 keyword matches, rerank=True re-orders them with the cross-encoder
     logger.info(f"Searching for: '{query}'")
+    started = time.perf_counter()
+    rerank = RERANK_ENABLED if rerank is None else rerank
+    cache_mode = f"{mode}+rerank" if rerank else mode
     
     try:
-        import chromadb
+        # Shared store, opened once per process; a numpy index (e.g. a snapshot) serves without it
+        index = serving_index()
+        if index is None:
+            store = store or get_store()
         
-        # Get ChromaDB collection
-        client = chromadb.EphemeralClient()
-        collection = client.get_collection(name="diy_snippets")
+        metrics.inc('queries_served_total', mode=mode)
         
         # Generate query embedding
-        query_embedding = generate_query_embedding(query)
+        with metrics.span('query_embedding'):
+            query_embedding = generate_query_embedding(query, store)
         if query_embedding is None:
             logger.error("Failed to generate query embedding")
             return []
         
-        # Search for similar documents
-        results = collection.query(
-            query_embeddings=[query_embedding],
-            n_results=top_k
-        )
+        # Serve repeated searches from the result cache while the index is unchanged
+        cache = get_query_cache()
+        generation = results_generation(index, store)
+        if cache is not None:
+            cached = cache.get_results(query_embedding, top_k, filters=filters, generation=generation,
+                                       mode=cache_mode)
+            if cached is not None:
+                metrics.inc('result_cache_hits_total', mode=mode)
+                logger.info(f"Found {len(cached)} relevant snippets (cached)")
+                return cached
         
-        # Format results
-        formatted_results = []
-        for i in range(len(results['ids'][0])):
-            result = {
-                'id': results['ids'][0][i],
-                'text': results['documents'][0][i],
-                'metadata': results['metadatas'][0][i],
-                'distance': results['distances'][0][i]
-            }
-            formatted_results.append(result)
+        # Search for similar documents
+        start = time.perf_counter()
+        depth = rerank_depth(top_k, rerank)
+        fetch_k = depth * CHUNK_OVERFETCH
+        if mode == 'hybrid':
+            hits = hybrid_rank(query, query_embedding, fetch_k, store, filters)
+        else:
+            hits = vector_search(query_embedding, fetch_k, store, filters)[0]
+        formatted_results = collapse_to_parents(hits, depth)
+        complete = True
+        if rerank:
+            reranked, complete = get_reranker().rerank_many([query], [formatted_results], top_k, started=started)
+            formatted_results = reranked[0]
+        # Results cut short by the latency budget are not cached, so a quieter moment gets the full re-rank
+        if cache is not None and complete:
+            cache.put_results(query_embedding, top_k, formatted_results, filters=filters,
+                              generation=generation, cost_seconds=time.perf_counter() - start, mode=cache_mode)
         
         logger.info(f"Found {len(formatted_results)} relevant snippets")
         return formatted_results
@@ -64,6 +335,94 @@ def search_chroma(query: str, top_k: int = 3) -> List[Dict[str, Any]]:
         return []
 
 
+@metrics.timed()
+def search_many(queries: List[str], top_k: int = 3, store: Optional[VectorStore] = None,
+                filters: Optional[Dict[str, Any]] = None, mode: str = 'vector',
+                rerank: Optional[bool] = None, started: Optional[float] = None) -> List[List[Dict[str, Any]]]:
+    # Search for many queries with one batched embedding pass and one multi-vector query;
+    # started (a perf_counter time, e.g. when the oldest request arrived) starts the re-rank budget clock
+    logger.info(f"Searching for {len(queries)} queries")
+    
+    if not queries:
+        return []
+    
+    started = started if started is not None else time.perf_counter()
+    rerank = RERANK_ENABLED if rerank is None else rerank
+    cache_mode = f"{mode}+rerank" if rerank else mode
+    
+    try:
+        index = serving_index()
+        if index is None:
+            store = store or get_store()
+        
+        metrics.inc('queries_served_total', len(queries), mode=mode)
+        
+        # Generate all query embeddings at once
+        with metrics.span('query_embedding'):
+            query_embeddings = generate_query_embeddings(queries, store)
+        if len(query_embeddings) != len(queries):
+            logger.error("Failed to generate query embeddings")
+            return [[] for _ in queries]
+        
+        # Only search queries whose results are not cached
+        cache = get_query_cache()
+        generation = results_generation(index, store)
+        formatted: List[Optional[List[Dict[str, Any]]]] = [None] * len(queries)
+        if cache is not None:
+            for i, embedding in enumerate(query_embeddings):
+                formatted[i] = cache.get_results(embedding, top_k, filters=filters, generation=generation,
+                                                 mode=cache_mode)
+        pending = [i for i, results in enumerate(formatted) if results is None]
+        metrics.inc('result_cache_hits_total', len(queries) - len(pending), mode=mode)
+        
+        # One vectorized search for every remaining query
+        if pending:
+            start = time.perf_counter()
+            depth = rerank_depth(top_k, rerank)
+            fetch_k = depth * CHUNK_OVERFETCH
+            if mode == 'hybrid':
+                results = [hybrid_rank(queries[i], query_embeddings[i], fetch_k, store, filters) for i in pending]
+            else:
+                results = vector_search(query_embeddings[pending], fetch_k, store, filters)
+            results = [collapse_to_parents(hits, depth) for hits in results]
+            complete = True
+            if rerank:
+                # Every pending query's candidates go through the cross-encoder in one pass
+                results, complete = get_reranker().rerank_many([queries[i] for i in pending], results, top_k,
+                                                               started=started)
+            cost = (time.perf_counter() - start) / len(pending)
+            for j, i in enumerate(pending):
+                formatted[i] = results[j]
+                if cache is not None and complete:
+                    cache.put_results(query_embeddings[i], top_k, formatted[i], filters=filters,
+                                      generation=generation, cost_seconds=cost, mode=cache_mode)
+        
+        logger.info(f"Found results for {sum(1 for r in formatted if r)} of {len(queries)} queries")
+        return formatted
+        
+    except Exception as e:
+        logger.error(f"Error searching ChromaDB: {e}")
+        return [[] for _ in queries]
+
+
+def load_queries(path: str) -> List[str]:
+    # Read queries from a .jsonl log (query/question/text/title field) or a plain text file
+    queries = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if path.endswith('.jsonl'):
+                record = json.loads(line)
+                query = next((record[key] for key in ('query', 'question', 'text', 'title') if record.get(key)), None)
+                if query:
+                    queries.append(query)
+            else:
+                queries.append(line)
+    return queries
+
+
 def display_results(query: str, results: List[Dict[str, Any]]):
     # Display search results in a readable format
     print(f"\n🔍 Search Results for: '{query}'")
@@ -79,9 +438,12 @@ def display_results(query: str, results: List[Dict[str, Any]]):
         print(f"   PPE: {result['metadata']['ppe_required']}")
         print(f"   Content: {result['text'][:200]}...")
         print(f"   Relevance: {1 - result['distance']:.2f}")
+        if 'rerank_score' in result:
+            print(f"   Re-rank score: {result['rerank_score']:.3f}")
 
 
-def interactive_query():
+def interactive_query(store: Optional[VectorStore] = None, mode: str = SEARCH_MODE,
+                      rerank: Optional[bool] = None):
     # Interactive query interface
     print("🔧 Caliper DIY Assistant - Interactive Query")
     print("Type your DIY question (or 'quit' to exit)")
@@ -99,20 +461,59 @@ def interactive_query():
             continue
         
         # Search and display results
-        results = search_chroma(query)
+        results = search_chroma(query, store=store, mode=mode, rerank=rerank)
         display_results(query, results)
 
 
+def parse_filter_args(args: List[str]) -> Tuple[List[str], Optional[Dict[str, Any]]]:
+    # Pull --category/--tool/--exclude-tool/--ppe/--exclude-ppe VALUE pairs out of the arguments
+    flags = {'--category': 'category', '--tool': 'tools_required', '--exclude-tool': 'exclude_tools',
+             '--ppe': 'ppe_required', '--exclude-ppe': 'exclude_ppe'}
+    remaining: List[str] = []
+    filters: Dict[str, Any] = {}
+    i = 0
+    while i < len(args):
+        if args[i] in flags and i + 1 < len(args):
+            filters.setdefault(flags[args[i]], []).append(args[i + 1])
+            i += 2
+        else:
+            remaining.append(args[i])
+            i += 1
+    return remaining, filters or None
+
+
 def main():
     # Main function - can run interactively or with command line query
-    if len(sys.argv) > 1:
+    # A numpy index (e.g. a snapshot) serves on its own, without opening ChromaDB
+    store = None if serving_index() is not None else get_store()
+    if store is not None and store.count() == 0:
+        print("The index is empty. Run 'python scripts/generate_embeddings.py' first.")
+        return
+    
+    args, filters = parse_filter_args(sys.argv[1:])
+    mode = SEARCH_MODE
+    if args and args[0] == '--hybrid':
+        mode = 'hybrid'
+        args = args[1:]
+    rerank = None
+    if args and args[0] == '--rerank':
+        rerank = True
+        args = args[1:]
+    
+    if len(args) > 1 and args[0] == '--batch':
+        # Bulk queries from a file, searched in one batch
+        queries = load_queries(args[1])
+        for query, results in zip(queries, search_many(queries, store=store, filters=filters, mode=mode,
+                                                       rerank=rerank)):
+            display_results(query, results)
+    elif args:
         # Command line query
-        query = " ".join(sys.argv[1:])
-        results = search_chroma(query)
+        query = " ".join(args)
+        results = search_chroma(query, store=store, filters=filters, mode=mode, rerank=rerank)
         display_results(query, results)
     else:
         # Interactive mode
-        interactive_query()
+        interactive_query(store, mode, rerank)
 
 
 if __name__ == "__main__":
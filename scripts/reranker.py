@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Cross-Encoder Re-Ranker for Caliper-AI
+Second retrieval stage: the top-N first-stage candidates of each query are
+scored with a small cross-encoder in one batched pass and re-ordered.
+
+Each request has a latency budget (RERANK_BUDGET_MS). The re-ranker keeps a
+running estimate of the cost of one (query, doc) pair. It shrinks N so the
+uncached pairs fit in what is left of the budget, and skips re-ranking
+entirely when not even top_k candidates would fit. Each skip lowers the
+estimate a little, so a stale high estimate leads to a new measured pass
+rather than skipping forever. (query, doc) scores are cached, so repeated
+questions cost nothing.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import metrics
+from query_cache import LRUCache, normalize_query
+
+# Configure logging based on environment variable
+log_level = logging.DEBUG if os.getenv('DEBUG') else logging.WARNING
+logging.basicConfig(level=log_level, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+RERANK_MODEL = os.getenv('RERANK_MODEL', 'cross-encoder/ms-marco-MiniLM-L-6-v2')
+RERANK_ENABLED = os.getenv('RERANK', '0') not in ('', '0', 'false', 'False')
+RERANK_CANDIDATES = int(os.getenv('RERANK_CANDIDATES', '20'))
+RERANK_BUDGET_MS = float(os.getenv('RERANK_BUDGET_MS', '50'))
+RERANK_SCORE_CACHE_SIZE = int(os.getenv('RERANK_SCORE_CACHE_SIZE', '10000'))
+
+# Cost guess per pair until the first pass has been timed, and the weight of a faster measurement;
+# a skipped request also moves the estimate this fraction towards zero
+INITIAL_PAIR_MS = 2.0
+COST_SMOOTHING = 0.2
+
+
+def text_key(text: str) -> str:
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+
+class CrossEncoderReranker:
+    # Budgeted, cached cross-encoder scoring of first-stage candidates
+
+    def __init__(self, model_name: str = RERANK_MODEL, max_candidates: int = RERANK_CANDIDATES,
+                 budget_ms: float = RERANK_BUDGET_MS, cache_size: int = RERANK_SCORE_CACHE_SIZE):
+        self.model_name = model_name
+        self.max_candidates = max_candidates
+        self.budget_ms = budget_ms
+        self.scores = LRUCache(cache_size, ttl=None)
+        self.pair_seconds = INITIAL_PAIR_MS / 1000.0
+        self.passes = 0
+        self.skipped = 0
+        self.truncated = 0
+        self._model = None
+        self._load_failed = False
+        self._lock = threading.Lock()
+
+    def load(self):
+        # Load the cross-encoder once, preferring the local snapshot; None if it cannot be loaded
+        if self._model is None and not self._load_failed:
+            with self._lock:
+                if self._model is None and not self._load_failed:
+                    try:
+                        from sentence_transformers import CrossEncoder
+                        from local_embeddings import snapshot_path
+
+                        source = snapshot_path(self.model_name)
+                        if not os.path.isdir(source):
+                            source = self.model_name
+                        with metrics.span('load_reranker'):
+                            self._model = CrossEncoder(source)
+                        logger.info(f"Loaded cross-encoder: {source}")
+                    except Exception as e:
+                        logger.error(f"Failed to load cross-encoder {self.model_name}, re-ranking disabled: {e}")
+                        self._load_failed = True
+        return self._model
+
+    def warm_up(self) -> bool:
+        # Load the model and time a full candidate batch so the cost estimate is real from the first request
+        model = self.load()
+        if model is None:
+            return False
+        # The first call pays one-off setup, so it is not timed
+        model.predict([("warm up", "warm up")], show_progress_bar=False)
+        pairs = [("warm up query", f"warm up candidate {i}") for i in range(max(1, self.max_candidates))]
+        start = time.perf_counter()
+        model.predict(pairs, batch_size=len(pairs), show_progress_bar=False)
+        self.pair_seconds = (time.perf_counter() - start) / len(pairs)
+        return True
+
+    def _plan(self, missing: List[List[bool]], top_k: int, budget_seconds: float) -> int:
+        # Largest candidate depth whose uncached pairs fit in the budget; 0 if not even
+        # top_k (or the whole pool, when it is smaller) fits
+        depth = max(len(flags) for flags in missing)
+        shallowest = min(top_k, depth)
+        while depth >= shallowest:
+            pairs = sum(sum(flags[:depth]) for flags in missing)
+            if pairs * self.pair_seconds <= budget_seconds:
+                return depth
+            depth -= 1
+        return 0
+
+    def rerank_many(self, queries: List[str], candidates: List[List[Dict[str, Any]]], top_k: int,
+                    budget_ms: Optional[float] = None,
+                    started: Optional[float] = None) -> Tuple[List[List[Dict[str, Any]]], bool]:
+        # Re-order each query's candidates by cross-encoder score; returns (results, complete), where
+        # complete is False only when the budget cut re-ranking short and a later request could do better
+        # started (a perf_counter time) charges time already spent on the request against the budget
+        first_stage = [hits[:top_k] for hits in candidates]
+        model = self.load()
+        if model is None or not any(candidates):
+            # Nothing to re-rank, or re-ranking is disabled for this process: the results are final
+            return first_stage, True
+
+        budget = (self.budget_ms if budget_ms is None else budget_ms) / 1000.0
+        if started is not None:
+            budget -= time.perf_counter() - started
+
+        # Look up cached scores for the deepest candidate set we could score
+        normalized = [normalize_query(query) for query in queries]
+        pools = [hits[:self.max_candidates] for hits in candidates]
+        cached = [[self.scores.get((query, text_key(hit['text']))) for hit in pool]
+                  for query, pool in zip(normalized, pools)]
+        depth = self._plan([[score is None for score in scores] for scores in cached], top_k, budget)
+        if depth == 0:
+            self.skipped += 1
+            self.pair_seconds *= 1.0 - COST_SMOOTHING
+            metrics.inc('rerank_skipped_total')
+            logger.info(f"Skipping re-rank: budget {budget * 1000:.1f} ms is below {top_k} pairs per query")
+            return first_stage, False
+        complete = all(len(pool) <= depth for pool in pools)
+        if not complete:
+            self.truncated += 1
+            metrics.inc('rerank_truncated_total')
+
+        # One batched pass over every uncached pair of every query
+        pairs, slots = [], []
+        for i, (query, pool) in enumerate(zip(queries, pools)):
+            for j, hit in enumerate(pool[:depth]):
+                if cached[i][j] is None:
+                    pairs.append((query, hit['text']))
+                    slots.append((i, j))
+        if pairs:
+            start = time.perf_counter()
+            with metrics.span('rerank', pairs=len(pairs)):
+                predicted = np.asarray(model.predict(pairs, batch_size=len(pairs), show_progress_bar=False),
+                                       dtype=np.float32).reshape(-1)
+            elapsed = time.perf_counter() - start
+            # The estimate jumps up at once when passes get slower and decays slowly when they speed up
+            self.pair_seconds = max(elapsed / len(pairs),
+                                    self.pair_seconds + COST_SMOOTHING * (elapsed / len(pairs) - self.pair_seconds))
+            self.passes += 1
+            metrics.inc('rerank_pairs_scored_total', len(pairs))
+            for (i, j), score in zip(slots, predicted.tolist()):
+                cached[i][j] = score
+                self.scores.put((normalized[i], text_key(pools[i][j]['text'])), score, elapsed / len(pairs))
+        metrics.inc('rerank_score_cache_hits_total', sum(len(pool[:depth]) for pool in pools) - len(pairs))
+
+        results = []
+        for pool, scores in zip(pools, cached):
+            order = sorted(range(min(depth, len(pool))), key=lambda j: -scores[j])
+            results.append([dict(pool[j], rerank_score=scores[j]) for j in order[:top_k]])
+        return results, complete
+
+    def rerank(self, query: str, candidates: List[Dict[str, Any]], top_k: int,
+               budget_ms: Optional[float] = None, started: Optional[float] = None) -> List[Dict[str, Any]]:
+        # Single-query form of rerank_many
+        results, _ = self.rerank_many([query], [candidates], top_k, budget_ms, started)
+        return results[0]
+
+    def stats(self) -> Dict[str, float]:
+        cache = self.scores.stats()
+        return {
+            'passes': self.passes,
+            'skipped': self.skipped,
+            'truncated': self.truncated,
+            'pair_ms': self.pair_seconds * 1000.0,
+            'score_cache_size': cache['size'],
+            'score_cache_hit_rate': cache['hit_rate'],
+        }
+
+
+# Global re-ranker, created on first use
+_reranker = None
+
+
+def get_reranker() -> CrossEncoderReranker:
+    # Return the process-wide re-ranker
+    global _reranker
+
+    if _reranker is None:
+        _reranker = CrossEncoderReranker()
+        metrics.register_collector('reranker', _reranker.stats)
+    return _reranker
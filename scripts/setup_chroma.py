@@ -2,14 +2,19 @@
 """
 ChromaDB Setup Script for Caliper-AI 
 Simple script to initialize ChromaDB collection and store DIY snippets.
+Documents are always stored together with their local-encoder embeddings.
 """
 
-import chromadb
 import os
 import sys
 import logging
+import numpy as np
 from typing import Optional, Tuple, List, Dict, Any
-from ingest_data import load_diy_data
+from bulk_writer import bulk_upsert
+from ingest_pipeline import stream_ingest
+from local_embeddings import generate_batch_embeddings
+from projection import project_for_store
+from vector_store import VectorStore, get_store, to_store_embeddings, DEFAULT_PERSIST_DIRECTORY
 
 # Configure logging based on environment variable
 log_level = logging.DEBUG if os.getenv('DEBUG') else logging.WARNING
@@ -17,33 +22,29 @@ logging.basicConfig(level=log_level, format='%(asctime)s - %(levelname)s - %(mes
 logger = logging.getLogger(__name__)
 
 
-def setup_chroma_collection(persist_directory: str = "./chroma_db"):
+def setup_chroma_collection(persist_directory: str = DEFAULT_PERSIST_DIRECTORY,
+                            store: Optional[VectorStore] = None):
     # Initialize ChromaDB client with persistent storage
     logger.info(f"Setting up ChromaDB collection in: {persist_directory}")
     
     try:
-        # Create ChromaDB client
-        client = chromadb.EphemeralClient()
+        # Reuse the process-wide persistent client
+        store = store or get_store(persist_directory)
         logger.info("ChromaDB client initialized")
         
         # Create or get collection
-        collection_name = "diy_snippets"
-        try:
-            collection = client.get_collection(name=collection_name)
-            logger.info(f"Found existing collection: {collection_name}")
-        except Exception:
-            collection = client.create_collection(name=collection_name)
-            logger.info(f"Created new collection: {collection_name}")
+        collection = store.collection()
         
-        return client, collection
+        return store.client, collection
         
     except Exception as e:
         logger.error(f"Error setting up ChromaDB: {e}")
         return None, None
 
 
-def store_documents(collection, documents: List[Dict[str, Any]]) -> bool:
-    # Store documents in ChromaDB collection
+def store_documents(store: VectorStore, collection, documents: List[Dict[str, Any]],
+                    embeddings: Optional[np.ndarray] = None) -> bool:
+    # Store documents in a collection of store, embedding them with the local encoder if needed
     logger.info(f"Storing {len(documents)} documents in ChromaDB")
     
     try:
@@ -52,12 +53,21 @@ def store_documents(collection, documents: List[Dict[str, Any]]) -> bool:
         texts = [doc['text'] for doc in documents]
         metadatas = [doc['metadata'] for doc in documents]
         
-        # Add documents to collection
-        collection.add(
-            ids=ids,
-            documents=texts,
-            metadatas=metadatas
-        )
+        # The collection has no embedding function, so vectors are always supplied
+        if embeddings is None:
+            embeddings = generate_batch_embeddings(texts)
+        if len(embeddings) != len(documents):
+            logger.error("Failed to generate embeddings for documents")
+            return False
+        
+        # Upsert in store-sized batches so re-runs replace existing rows instead of failing on duplicate IDs;
+        # batch limits, the projection and the generation all come from the store that owns the collection
+        bulk_upsert(store, {
+            'ids': ids,
+            'documents': texts,
+            'metadatas': metadatas,
+            'embeddings': to_store_embeddings(project_for_store(store, embeddings, collection=collection))
+        }, collection)
         
         logger.info(f"Successfully stored {len(documents)} documents")
         return True
@@ -95,24 +105,18 @@ def main() -> bool:
     
     logger.info("Starting ChromaDB setup")
     
-    # Step 1: Load DIY data
-    documents = load_diy_data(csv_path)
-    if not documents:
-        logger.error("Failed to load DIY data")
-        return False
-    
-    # Step 2: Setup ChromaDB collection
+    # Step 1: Setup ChromaDB collection
     client, collection = setup_chroma_collection()
     if not collection:
         logger.error("Failed to setup ChromaDB collection")
         return False
     
-    # Step 3: Store documents
-    if not store_documents(collection, documents):
+    # Step 2: Load, embed once and write once with the unified ingest pipeline
+    if stream_ingest(csv_path) is None:
         logger.error("Failed to store documents")
         return False
     
-    # Step 4: Verify collection
+    # Step 3: Verify collection
     if not verify_collection(collection):
         logger.error("Failed to verify collection")
         return False
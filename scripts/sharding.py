@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+Sharded Collections for Caliper-AI
+Splits one logical collection into several ChromaDB collections, either one
+per category or SHARD_COUNT shards by a hash of the parent snippet id (so a
+snippet's chunks share a shard). ShardedCollection has the same surface as a
+ChromaDB collection:
+- Writes are split by shard and written in parallel.
+- Queries fan out to the shards on a thread pool, and the per-shard top-k
+  lists are merged with a heap.
+- Category-filtered queries on a category-sharded store touch only the
+  matching shards.
+
+The layout is fixed by the first write and saved next to the data as
+<collection>.shards.json. To change it, reset the collection.
+"""
+
+import heapq
+import itertools
+import json
+import logging
+import os
+import re
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import metrics
+from text_chunking import CHUNK_ID_SEPARATOR
+
+# Configure logging based on environment variable
+log_level = logging.DEBUG if os.getenv('DEBUG') else logging.WARNING
+logging.basicConfig(level=log_level, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# none, category or hash; only read when a collection is first created
+SHARDING = os.getenv('SHARDING', 'none')
+SHARD_COUNT = int(os.getenv('SHARD_COUNT', '4'))
+SHARD_WORKERS = int(os.getenv('SHARD_WORKERS', str(min(8, os.cpu_count() or 1))))
+STRATEGIES = ('none', 'category', 'hash')
+
+_LAYOUT_SUFFIX = ".shards.json"
+_DEFAULT_INCLUDE = ('metadatas', 'documents', 'distances')
+
+
+def layout_path(persist_directory: str, name: str) -> str:
+    return os.path.join(persist_directory, name + _LAYOUT_SUFFIX)
+
+
+def load_layout(persist_directory: str, name: str) -> Optional[Dict[str, Any]]:
+    # Saved layout of a sharded collection, or None if it is not sharded
+    try:
+        with open(layout_path(persist_directory, name), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def category_shard_name(base: str, category: str) -> str:
+    # Valid ChromaDB name (3-63 chars of [a-zA-Z0-9._-]) that stays readable for short categories
+    slug = re.sub(r'[^a-z0-9]+', '-', str(category).lower()).strip('-') or 'uncategorized'
+    name = f"{base}__{slug}"
+    if len(name) > 63:
+        name = f"{name[:54]}-{zlib.crc32(str(category).encode('utf-8')):08x}"
+    return name
+
+
+def parent_of(doc_id: str) -> str:
+    return doc_id.split(CHUNK_ID_SEPARATOR, 1)[0]
+
+
+def _where_categories(where: Optional[Dict[str, Any]]) -> Optional[List[str]]:
+    # Categories a where clause is limited to, or None if it does not constrain category
+    if where and '$and' in where:
+        # The intersection of every clause that constrains category
+        limited = [set(categories) for categories in map(_where_categories, where['$and']) if categories is not None]
+        return sorted(set.intersection(*limited)) if limited else None
+    if not where or 'category' not in where:
+        return None
+    condition = where['category']
+    if isinstance(condition, dict):
+        if '$eq' in condition:
+            return [condition['$eq']]
+        if '$in' in condition:
+            return list(condition['$in'])
+        return None
+    return [condition]
+
+
+def _concat(parts: List[Any]) -> Any:
+    # Join one result field from several shards; embeddings may come back as arrays
+    if any(isinstance(part, np.ndarray) for part in parts):
+        arrays = [np.asarray(part) for part in parts if part is not None and len(part)]
+        return np.concatenate(arrays) if arrays else np.empty((0, 0), dtype=np.float32)
+    if parts and all(part is None for part in parts):
+        return None
+    return list(itertools.chain.from_iterable(part for part in parts if part is not None))
+
+
+class ShardedCollection:
+    # One logical collection spread over several ChromaDB collections
+
+    def __init__(self, client, persist_directory: str, name: str, layout: Dict[str, Any],
+                 workers: int = SHARD_WORKERS):
+        self.client = client
+        self.persist_directory = persist_directory
+        self.name = name
+        self.layout = layout
+        self._collections: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="caliper-shard")
+
+    @property
+    def strategy(self) -> str:
+        return self.layout['strategy']
+
+    @property
+    def metadata(self) -> Dict[str, Any]:
+        # Logical collection metadata (e.g. the projection version), kept in the layout file
+        return self.layout.get('metadata') or {}
+
+    def reload(self) -> None:
+        # Re-read the layout, which another process may have changed (new category shards, projection)
+        layout = load_layout(self.persist_directory, self.name)
+        if layout is not None:
+            self.layout = layout
+
+    def _save_layout(self) -> None:
+        path = layout_path(self.persist_directory, self.name)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(self.layout, f, indent=2)
+        os.replace(path + '.tmp', path)
+
+    def _shard(self, shard_name: str):
+        collection = self._collections.get(shard_name)
+        if collection is None:
+            collection = self.client.get_or_create_collection(name=shard_name, embedding_function=None)
+            self._collections[shard_name] = collection
+        return collection
+
+    def shard_names(self) -> List[str]:
+        # Every shard, in a fixed order
+        if self.strategy == 'hash':
+            return [f"{self.name}__h{i}" for i in range(self.layout['count'])]
+        return sorted(self.layout['shards'].values())
+
+    def _shard_for(self, doc_id: str, metadata: Optional[Dict[str, Any]]) -> str:
+        # Shard that owns a row; new categories get a shard on first write
+        if self.strategy == 'hash':
+            return f"{self.name}__h{zlib.crc32(parent_of(doc_id).encode('utf-8')) % self.layout['count']}"
+        category = str((metadata or {}).get('category', ''))
+        shard_name = self.layout['shards'].get(category)
+        if shard_name is None:
+            with self._lock:
+                shard_name = self.layout['shards'].get(category)
+                if shard_name is None:
+                    shard_name = self.layout['shards'][category] = category_shard_name(self.name, category)
+                    self._shard(shard_name).modify(metadata=self._shard_metadata())
+                    self._save_layout()
+                    logger.info(f"Added shard {shard_name} for category '{category}'")
+        return shard_name
+
+    def _shards_for_ids(self, ids: List[str]) -> Dict[str, List[str]]:
+        # Hash shards own known ids; category shards have to be asked
+        if self.strategy == 'hash':
+            routed: Dict[str, List[str]] = {}
+            for doc_id in ids:
+                routed.setdefault(self._shard_for(doc_id, None), []).append(doc_id)
+            return routed
+        return {shard_name: list(ids) for shard_name in self.shard_names()}
+
+    def _shards_for_where(self, where: Optional[Dict[str, Any]]) -> List[str]:
+        # Category-scoped queries only touch the matching shards of a category layout
+        categories = _where_categories(where) if self.strategy == 'category' else None
+        if categories is None:
+            return self.shard_names()
+        return [self.layout['shards'][c] for c in categories if c in self.layout['shards']]
+
+    def _map(self, function, shard_names: List[str]) -> List[Any]:
+        # Run one call per shard on the thread pool, results in shard order
+        if len(shard_names) <= 1:
+            return [function(shard_name) for shard_name in shard_names]
+        return list(self._executor.map(function, shard_names))
+
+    def _shard_metadata(self) -> Optional[Dict[str, Any]]:
+        return {key: value for key, value in self.metadata.items() if not key.startswith('hnsw:')} or None
+
+    def count(self) -> int:
+        return sum(self._map(lambda shard_name: self._shard(shard_name).count(), self.shard_names()))
+
+    def upsert(self, ids: List[str], documents: Optional[List[str]] = None,
+               metadatas: Optional[List[Dict[str, Any]]] = None, embeddings: Optional[Any] = None) -> None:
+        # Split rows by shard and write the shards in parallel
+        positions: Dict[str, List[int]] = {}
+        for i, doc_id in enumerate(ids):
+            positions.setdefault(self._shard_for(doc_id, metadatas[i] if metadatas else None), []).append(i)
+
+        if self.strategy == 'category' and len(self.shard_names()) > 1:
+            # A snippet whose category changed must not keep a stale copy in its old shard; look up
+            # which shards already hold the batch's ids and delete only the rows that actually moved
+            def drop_moved(shard_name: str) -> None:
+                others = [ids[i] for owner, rows in positions.items() if owner != shard_name for i in rows]
+                shard = self._shard(shard_name)
+                moved = shard.get(ids=others, include=[])['ids'] if others else []
+                if moved:
+                    logger.debug(f"Moving {len(moved)} rows out of {shard_name}")
+                    shard.delete(ids=moved)
+
+            self._map(drop_moved, self.shard_names())
+
+        def write(shard_name: str) -> None:
+            rows = positions[shard_name]
+            self._shard(shard_name).upsert(
+                ids=[ids[i] for i in rows],
+                documents=[documents[i] for i in rows] if documents is not None else None,
+                metadatas=[metadatas[i] for i in rows] if metadatas is not None else None,
+                embeddings=[embeddings[i] for i in rows] if embeddings is not None else None)
+
+        with metrics.span('shard_upsert', shards=len(positions)):
+            self._map(write, list(positions))
+
+    add = upsert
+
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None) -> None:
+        if ids is not None:
+            routed = self._shards_for_ids(ids)
+            self._map(lambda shard_name: self._shard(shard_name).delete(ids=routed[shard_name]), list(routed))
+        elif where is not None:
+            self._map(lambda shard_name: self._shard(shard_name).delete(where=where), self._shards_for_where(where))
+
+    def get(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None,
+            limit: Optional[int] = None, offset: Optional[int] = None,
+            include: Any = ('metadatas', 'documents')) -> Dict[str, Any]:
+        # By ids: fan out and concatenate. Otherwise page through the shards in a fixed order
+        include = list(include)
+        if ids is not None:
+            routed = self._shards_for_ids(ids)
+            shard_names = list(routed)
+            parts = self._map(lambda shard_name: self._shard(shard_name).get(
+                ids=routed[shard_name], where=where, include=include), shard_names)
+        else:
+            parts = []
+            skip, remaining = offset or 0, limit
+            for shard_name in self._shards_for_where(where):
+                if remaining is not None and remaining <= 0:
+                    break
+                shard = self._shard(shard_name)
+                size = shard.count() if where is None else len(shard.get(where=where, include=[])['ids'])
+                if skip >= size:
+                    skip -= size
+                    continue
+                part = shard.get(where=where, limit=remaining, offset=skip or None, include=include)
+                skip = 0
+                parts.append(part)
+                if remaining is not None:
+                    remaining -= len(part['ids'])
+
+        merged: Dict[str, Any] = {'ids': _concat([part['ids'] for part in parts])}
+        for field in ('documents', 'metadatas', 'embeddings'):
+            merged[field] = _concat([part.get(field) for part in parts]) if field in include else None
+        return merged
+
+    def query(self, query_embeddings: Any, n_results: int = 10, where: Optional[Dict[str, Any]] = None,
+              include: Any = _DEFAULT_INCLUDE) -> Dict[str, Any]:
+        # Scatter the query to the shards concurrently, then heap-merge each query's top n_results
+        include = list(include)
+        if 'distances' not in include:
+            include.append('distances')
+        n_queries = len(query_embeddings)
+        shard_names = [shard_name for shard_name in self._shards_for_where(where)
+                       if self._shard(shard_name).count() > 0]
+
+        def search(shard_name: str) -> Dict[str, Any]:
+            shard = self._shard(shard_name)
+            return shard.query(query_embeddings=query_embeddings, n_results=min(n_results, shard.count()),
+                               where=where, include=include)
+
+        with metrics.span('shard_query', shards=len(shard_names)):
+            parts = self._map(search, shard_names)
+
+        fields = ['ids'] + [field for field in ('documents', 'metadatas', 'embeddings', 'distances')
+                            if field in include]
+        merged: Dict[str, List[Any]] = {field: [] for field in ('ids', 'documents', 'metadatas', 'distances')}
+        for q in range(n_queries):
+            # Each shard's list is already sorted by distance, so a heap merge yields the global order
+            streams = [[{field: part[field][q][j] for field in fields} for j in range(len(part['ids'][q]))]
+                       for part in parts]
+            best = list(itertools.islice(heapq.merge(*streams, key=lambda hit: hit['distances']), n_results))
+            for field in fields:
+                merged.setdefault(field, []).append([hit[field] for hit in best])
+        return merged
+
+    def modify(self, metadata: Optional[Dict[str, Any]] = None, name: Optional[str] = None) -> None:
+        # Metadata applies to the logical collection and every shard; shards cannot be renamed together
+        if name is not None:
+            raise ValueError("Sharded collections cannot be renamed")
+        if metadata is not None:
+            self.layout['metadata'] = dict(metadata)
+            self._save_layout()
+            shard_metadata = self._shard_metadata()
+            self._map(lambda shard_name: self._shard(shard_name).modify(metadata=shard_metadata),
+                      self.shard_names())
+
+    def drop(self) -> None:
+        # Delete every shard and the layout file
+        for shard_name in self.shard_names():
+            try:
+                self.client.delete_collection(name=shard_name)
+            except Exception:
+                pass
+        try:
+            os.remove(layout_path(self.persist_directory, self.name))
+        except FileNotFoundError:
+            pass
+        self._executor.shutdown(wait=False)
+
+
+def unsharded_count(client, name: str) -> int:
+    # Rows in the plain collection called name, 0 if there is none
+    try:
+        return client.get_collection(name=name).count()
+    except Exception:
+        return 0
+
+
+def open_sharded(client, persist_directory: str, name: str,
+                 strategy: str = SHARDING, count: int = SHARD_COUNT) -> Optional[ShardedCollection]:
+    # The sharded collection for name: its saved layout wins over the environment; None if unsharded
+    layout = load_layout(persist_directory, name)
+    if layout is None:
+        if strategy == 'none':
+            return None
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown sharding strategy '{strategy}', expected one of {STRATEGIES}")
+        # A new empty layout would hide every row already stored in the unsharded collection
+        existing = unsharded_count(client, name)
+        if existing:
+            raise RuntimeError(f"Collection {name} already holds {existing} unsharded documents; "
+                               f"reset it (or unset SHARDING) before sharding it by {strategy}")
+        layout = {'strategy': strategy, 'count': count if strategy == 'hash' else None,
+                  'shards': {}, 'metadata': {}}
+        collection = ShardedCollection(client, persist_directory, name, layout)
+        collection._save_layout()
+        logger.info(f"Created {strategy}-sharded collection {name}"
+                    + (f" with {count} shards" if strategy == 'hash' else ""))
+        return collection
+    if strategy != 'none' and (strategy != layout['strategy'] or (strategy == 'hash' and count != layout['count'])):
+        logger.warning(f"Collection {name} is already sharded by {layout['strategy']}; "
+                       f"ignoring SHARDING={strategy}. Reset the collection to change its layout.")
+    return ShardedCollection(client, persist_directory, name, layout)
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Startup Timing Report for Caliper-AI
+Measures cold-start cost in a fresh interpreter: module import, store open,
+model load and the first and second query. Results can be saved as JSON and
+compared against an earlier run to catch startup regressions.
+
+    python scripts/startup_timing.py [--json out.json] [--baseline old.json]
+"""
+
+import json
+import os
+import subprocess
+import sys
+import logging
+from typing import Dict, Optional
+
+# Configure logging based on environment variable
+log_level = logging.DEBUG if os.getenv('DEBUG') else logging.WARNING
+logging.basicConfig(level=log_level, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Slower than the baseline by this fraction counts as a regression
+REGRESSION_THRESHOLD = 0.20
+
+# Runs in a child process so every number is a true cold start
+_PROBE = r'''
+import json, sys, time
+sys.path.insert(0, {scripts_dir!r})
+timings = {{}}
+start = time.perf_counter()
+import query_system
+timings['import_s'] = time.perf_counter() - start
+
+from vector_store import get_store
+t = time.perf_counter()
+store = get_store()
+store.collection()
+timings['store_open_s'] = time.perf_counter() - t
+
+from local_embeddings import warm_up
+t = time.perf_counter()
+warm_up()
+timings['model_load_s'] = time.perf_counter() - t
+
+t = time.perf_counter()
+query_system.search_chroma("how to fix a leaky faucet", store=store)
+timings['first_query_s'] = time.perf_counter() - t
+
+t = time.perf_counter()
+query_system.search_chroma("what tools do I need for woodworking", store=store)
+timings['second_query_s'] = time.perf_counter() - t
+
+timings['total_s'] = time.perf_counter() - start
+print(json.dumps(timings))
+'''
+
+
+def measure_startup() -> Optional[Dict[str, float]]:
+    # Run the probe in a fresh interpreter and return its timings
+    probe = _PROBE.format(scripts_dir=SCRIPTS_DIR)
+    completed = subprocess.run([sys.executable, '-c', probe], capture_output=True, text=True)
+    if completed.returncode != 0:
+        logger.error(f"Startup probe failed: {completed.stderr.strip()}")
+        return None
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def compare(current: Dict[str, float], baseline: Dict[str, float]) -> Dict[str, float]:
+    # Relative change per phase, positive means slower
+    return {
+        phase: (current[phase] - baseline[phase]) / baseline[phase]
+        for phase in current
+        if baseline.get(phase)
+    }
+
+
+def main() -> bool:
+    # Main function to report startup timings
+    args = sys.argv[1:]
+    out_path = args[args.index('--json') + 1] if '--json' in args else None
+    baseline_path = args[args.index('--baseline') + 1] if '--baseline' in args else None
+
+    timings = measure_startup()
+    if timings is None:
+        return False
+
+    print("⏱️  Caliper-AI startup timings")
+    print("=" * 50)
+    for phase, seconds in timings.items():
+        print(f"  {phase:<16} {seconds * 1000:9.1f} ms")
+
+    if out_path:
+        with open(out_path, 'w', encoding='utf-8') as f:
+            json.dump(timings, f, indent=2)
+        print(f"\nSaved to {out_path}")
+
+    if baseline_path:
+        with open(baseline_path, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = {phase: change for phase, change in compare(timings, baseline).items()
+                       if change > REGRESSION_THRESHOLD}
+        for phase, change in regressions.items():
+            print(f"❌ Regression: {phase} is {change:.0%} slower than baseline")
+        if regressions:
+            return False
+        print("✅ No startup regressions against baseline")
+
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Incremental Index Sync for Caliper-AI
+Diffs the CSV against what is already indexed using per-row content hashes,
+then embeds and upserts only changed rows and deletes only removed rows.
+The keyword index is updated in place for the changed and removed rows.
+"""
+
+import os
+import sys
+import logging
+from typing import List, Dict, Any, Optional, Tuple
+import metrics
+from bulk_writer import bulk_upsert
+from ingest_data import load_diy_data
+from keyword_index import build_from_store as build_keyword_index, update_index as update_keyword_index
+from text_chunking import chunk_documents
+from local_embeddings import generate_batch_embeddings
+from projection import project_for_store
+from vector_store import VectorStore, get_store, to_store_embeddings
+
+# Configure logging based on environment variable
+log_level = logging.DEBUG if os.getenv('DEBUG') else logging.WARNING
+logging.basicConfig(level=log_level, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Page size when reading indexed hashes, keeps the diff from pulling the whole collection at once
+HASH_PAGE_SIZE = 5000
+
+
+def get_indexed_rows(collection) -> Dict[str, Dict[str, Any]]:
+    # Read id -> metadata for everything in the collection, metadata only
+    indexed: Dict[str, Dict[str, Any]] = {}
+    offset = 0
+
+    while True:
+        page = collection.get(include=['metadatas'], limit=HASH_PAGE_SIZE, offset=offset)
+        ids = page['ids']
+        if not ids:
+            break
+        for doc_id, metadata in zip(ids, page['metadatas']):
+            indexed[doc_id] = metadata or {}
+        offset += len(ids)
+        if len(ids) < HASH_PAGE_SIZE:
+            break
+
+    return indexed
+
+
+def get_parent_hashes(indexed: Dict[str, Dict[str, Any]]) -> Tuple[Dict[str, Optional[str]], Dict[str, List[str]]]:
+    # Parent id -> content hash of the indexed snippet, and parent id -> the ids of its indexed rows
+    # Split rows written before parent_hash was stored give None, so their snippet is re-chunked once
+    hashes: Dict[str, Optional[str]] = {}
+    rows: Dict[str, List[str]] = {}
+    for doc_id, metadata in indexed.items():
+        parent_id = metadata.get('parent_id', doc_id)
+        rows.setdefault(parent_id, []).append(doc_id)
+        parent_hash = metadata.get('parent_hash')
+        if parent_hash is None and metadata.get('chunk_count', 1) == 1:
+            parent_hash = metadata.get('content_hash')
+        if parent_id in hashes and hashes[parent_id] != parent_hash:
+            parent_hash = None
+        hashes[parent_id] = parent_hash
+    return hashes, rows
+
+
+def diff_documents(documents: List[Dict[str, Any]],
+                   indexed: Dict[str, Optional[str]]) -> Dict[str, List]:
+    # Split incoming documents into added / updated / unchanged and find removed ids
+    added, updated, unchanged = [], [], []
+
+    for doc in documents:
+        previous = indexed.get(doc['id'], '')
+        if previous == '':
+            added.append(doc)
+        elif previous != doc['metadata']['content_hash']:
+            updated.append(doc)
+        else:
+            unchanged.append(doc['id'])
+
+    incoming_ids = {doc['id'] for doc in documents}
+    removed = [doc_id for doc_id in indexed if doc_id not in incoming_ids]
+
+    return {'added': added, 'updated': updated, 'unchanged': unchanged, 'removed': removed}
+
+
+@metrics.timed()
+def sync_documents(documents: List[Dict[str, Any]],
+                   store: Optional[VectorStore] = None) -> Optional[Dict[str, int]]:
+    # Bring the collection in line with documents, touching only what changed
+    logger.info(f"Syncing {len(documents)} documents with the index")
+
+    try:
+        store = store or get_store()
+        collection = store.collection()
+
+        # Diff whole snippets on their content hash first; unchanged ones are never chunked or tokenized
+        indexed = get_indexed_rows(collection)
+        parent_hashes, parent_rows = get_parent_hashes(indexed)
+        diff = diff_documents(documents, parent_hashes)
+        touched = diff['added'] + diff['updated']
+        chunks = chunk_documents(touched) if touched else []
+
+        # Chunks of an updated snippet whose text and hashes are unchanged keep their vectors
+        changed = [doc for doc in chunks
+                   if any(indexed.get(doc['id'], {}).get(key) != doc['metadata'][key]
+                          for key in ('content_hash', 'parent_hash'))]
+        produced = {doc['id'] for doc in chunks}
+        removed = [doc_id for parent_id in diff['removed'] for doc_id in parent_rows[parent_id]]
+        removed += [doc_id for doc in diff['updated'] for doc_id in parent_rows.get(doc['id'], [])
+                    if doc_id not in produced]
+
+        # Embed and upsert changed rows only
+        if changed:
+            embeddings = generate_batch_embeddings([doc['text'] for doc in changed])
+            if len(embeddings) != len(changed):
+                logger.error("Failed to generate embeddings for changed documents")
+                return None
+
+            bulk_upsert(store, {
+                'ids': [doc['id'] for doc in changed],
+                'documents': [doc['text'] for doc in changed],
+                'metadatas': [doc['metadata'] for doc in changed],
+                'embeddings': to_store_embeddings(project_for_store(store, embeddings, collection=collection))
+            }, collection)
+
+        # Delete rows that are no longer in the source, including chunks a shortened snippet dropped
+        if removed:
+            collection.delete(ids=removed)
+
+        if changed or removed:
+            store.mark_changed()
+            # Only the changed rows are re-tokenized; a missing keyword index is built once from the store
+            keyword_changes = {'ids': [doc['id'] for doc in changed],
+                               'documents': [doc['text'] for doc in changed],
+                               'metadatas': [doc['metadata'] for doc in changed]}
+            if update_keyword_index(keyword_changes, removed,
+                                    manifest={'generation': store.generation()}) is None:
+                build_keyword_index(store=store)
+
+        summary = {
+            'added': len(diff['added']),
+            'updated': len(diff['updated']),
+            'deleted': len(diff['removed']),
+            'unchanged': len(diff['unchanged']),
+            'rows_written': len(changed),
+            'rows_deleted': len(removed)
+        }
+        logger.info(f"Sync complete: {summary}")
+        return summary
+
+    except Exception as e:
+        logger.error(f"Error syncing index: {e}")
+        return None
+
+
+def main() -> bool:
+    # Main function to incrementally sync the CSV into the index
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else "data/diy_snippets.csv"
+
+    logger.info("Starting incremental sync")
+
+    documents = load_diy_data(csv_path)
+    if documents is None:
+        logger.error("Failed to load documents")
+        return False
+
+    summary = sync_documents(documents)
+    if summary is None:
+        logger.error("Sync failed")
+        return False
+
+    print(f"Sync complete: {summary['added']} added, {summary['updated']} updated, "
+          f"{summary['deleted']} deleted, {summary['unchanged']} unchanged "
+          f"({summary['rows_written']} rows written, {summary['rows_deleted']} rows deleted)")
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
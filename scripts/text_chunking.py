@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Text Chunking for Caliper-AI
+Splits snippets longer than the encoder's max_seq_length into overlapping
+token-bounded chunks linked to their parent id, counts tokens for
+length-bucketed batching, and collapses chunk hits back to parent documents.
+
+Every indexed row carries 'parent_id', 'parent_hash' (the snippet's content
+hash), 'chunk_index' and 'chunk_count' metadata. Snippets that fit in one chunk keep their own id; longer ones are
+stored as '<id>#chunk<n>'.
+"""
+
+import hashlib
+import logging
+import os
+import re
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Configure logging based on environment variable
+log_level = logging.DEBUG if os.getenv('DEBUG') else logging.WARNING
+logging.basicConfig(level=log_level, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 0 means "the encoder's max_seq_length minus the [CLS]/[SEP] tokens"
+DEFAULT_MAX_TOKENS = int(os.getenv('CHUNK_MAX_TOKENS', '0'))
+DEFAULT_OVERLAP_TOKENS = int(os.getenv('CHUNK_OVERLAP_TOKENS', '32'))
+CHUNK_ID_SEPARATOR = "#chunk"
+SPECIAL_TOKENS = 2
+
+_WORD_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+def get_tokenizer():
+    # The loaded encoder's tokenizer and max_seq_length, or (None, 256) if it has none
+    from local_embeddings import load_model
+
+    model = load_model()
+    return getattr(model, 'tokenizer', None), getattr(model, 'max_seq_length', 256) or 256
+
+
+def token_spans(text: str, tokenizer=None) -> List[Tuple[int, int]]:
+    # Character span of every token in text, without special tokens
+    if tokenizer is not None:
+        try:
+            encoded = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)
+            return [tuple(span) for span in encoded['offset_mapping']]
+        except (TypeError, NotImplementedError, KeyError):
+            pass
+    # No fast tokenizer: words and punctuation approximate wordpiece tokens from below
+    return [match.span() for match in _WORD_PATTERN.finditer(text)]
+
+
+def count_tokens(texts: Sequence[str], tokenizer=None, max_length: Optional[int] = None) -> np.ndarray:
+    # Token count per text including special tokens, capped at max_length when given
+    if tokenizer is not None:
+        try:
+            encoded = tokenizer(list(texts), add_special_tokens=True,
+                                truncation=max_length is not None, max_length=max_length)
+            return np.fromiter((len(ids) for ids in encoded['input_ids']), dtype=np.int64, count=len(texts))
+        except (TypeError, KeyError):
+            pass
+    counts = np.fromiter((len(_WORD_PATTERN.findall(text)) + SPECIAL_TOKENS for text in texts),
+                         dtype=np.int64, count=len(texts))
+    return counts if max_length is None else np.minimum(counts, max_length)
+
+
+def split_text(text: str, max_tokens: int, overlap: int = DEFAULT_OVERLAP_TOKENS,
+               tokenizer=None) -> List[str]:
+    # Overlapping windows of at most max_tokens tokens, cut on word starts where possible
+    if len(text) <= max_tokens:
+        # Every token covers at least one character, so this cannot be too long
+        return [text]
+
+    spans = token_spans(text, tokenizer)
+    if len(spans) <= max_tokens:
+        return [text]
+
+    overlap = min(overlap, max_tokens // 2)
+    chunks = []
+    start = 0
+    while start < len(spans):
+        end = min(start + max_tokens, len(spans))
+        if end < len(spans):
+            # Back off to the start of a word so chunks do not split words in half
+            for cut in range(end, start + max_tokens // 2, -1):
+                if spans[cut][0] > spans[cut - 1][1]:
+                    end = cut
+                    break
+        chunks.append(text[spans[start][0]:spans[end - 1][1]].strip())
+        if end == len(spans):
+            break
+        start = max(end - overlap, start + 1)
+    return chunks
+
+
+def chunk_id(parent_id: str, index: int, count: int) -> str:
+    # Id of one chunk; single-chunk snippets keep the parent id
+    return parent_id if count == 1 else f"{parent_id}{CHUNK_ID_SEPARATOR}{index}"
+
+
+def chunk_columns(columns: Dict[str, List[Any]], max_tokens: Optional[int] = None,
+                  overlap: int = DEFAULT_OVERLAP_TOKENS) -> Dict[str, List[Any]]:
+    # Expand {'ids', 'documents', 'metadatas'} columns into one row per chunk
+    tokenizer = None
+    if not max_tokens:
+        tokenizer, max_seq_length = get_tokenizer()
+        max_tokens = DEFAULT_MAX_TOKENS or max_seq_length - SPECIAL_TOKENS
+    elif any(len(text) > max_tokens for text in columns['documents']):
+        tokenizer, _ = get_tokenizer()
+
+    ids, documents, metadatas = [], [], []
+    split_count = 0
+    for parent_id, text, metadata in zip(columns['ids'], columns['documents'], columns['metadatas']):
+        pieces = split_text(text, max_tokens, overlap, tokenizer)
+        split_count += len(pieces) > 1
+        for index, piece in enumerate(pieces):
+            ids.append(chunk_id(parent_id, index, len(pieces)))
+            documents.append(piece)
+            # parent_hash lets sync diff whole snippets before chunking anything
+            chunk_metadata = dict(metadata, parent_id=parent_id, parent_hash=metadata.get('content_hash', ''),
+                                  chunk_index=index, chunk_count=len(pieces))
+            if len(pieces) > 1:
+                # Chunk text changes with the chunking settings, so it is part of the hash
+                chunk_metadata['content_hash'] = hashlib.sha256(
+                    f"{metadata.get('content_hash', '')}\x1f{piece}".encode('utf-8')).hexdigest()
+            metadatas.append(chunk_metadata)
+
+    if split_count:
+        logger.info(f"Split {split_count} long snippets into {len(ids) - len(columns['ids']) + split_count} chunks")
+    return dict(columns, ids=ids, documents=documents, metadatas=metadatas)
+
+
+def chunk_documents(documents: List[Dict[str, Any]], max_tokens: Optional[int] = None,
+                    overlap: int = DEFAULT_OVERLAP_TOKENS) -> List[Dict[str, Any]]:
+    # Same as chunk_columns for a list of {'id', 'text', 'metadata'} documents
+    columns = chunk_columns({'ids': [doc['id'] for doc in documents],
+                             'documents': [doc['text'] for doc in documents],
+                             'metadatas': [doc['metadata'] for doc in documents]}, max_tokens, overlap)
+    return [{'id': doc_id, 'text': text, 'metadata': metadata}
+            for doc_id, text, metadata in zip(columns['ids'], columns['documents'], columns['metadatas'])]
+
+
+def collapse_to_parents(results: List[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
+    # Keep the best-ranked chunk of each parent; the hit takes the parent id, its text is the matching chunk
+    collapsed = []
+    seen = set()
+    for result in results:
+        metadata = result.get('metadata') or {}
+        parent_id = metadata.get('parent_id', result['id'])
+        if parent_id in seen:
+            continue
+        seen.add(parent_id)
+        if parent_id != result['id']:
+            result = dict(result, id=parent_id, chunk_id=result['id'])
+        collapsed.append(result)
+        if len(collapsed) == top_k:
+            break
+    return collapsed
+
+
+def length_buckets(lengths: np.ndarray, token_budget: int, max_batch: int) -> Iterator[np.ndarray]:
+    # Positions grouped longest-first into batches whose padded size stays within token_budget
+    order = np.argsort(-lengths, kind='stable')
+    start = 0
+    while start < len(order):
+        # The first text in each bucket is the longest, so it sets the padded length
+        longest = max(int(lengths[order[start]]), 1)
+        size = max(1, min(max_batch, token_budget // longest))
+        yield order[start:start + size]
+        start += size
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Compressed Vector Storage for Caliper-AI
+Codecs that shrink the in-process index's scoring matrix: float16, int8 with
+a per-vector scale, and product quantization (PQ) with a trained codebook.
+Compressed codes are scored first; the best candidates are then re-ranked
+against the exact float32 vectors by numpy_search.
+
+    Storage   bytes per 384-dim vector
+    fp32      1536
+    fp16       768
+    int8       388   (384 codes + float32 scale)
+    pq          48   (48 subspaces x 1 byte, plus a shared 48 x 256 x 8 codebook)
+"""
+
+import logging
+import os
+from typing import Any, Dict, Optional, Union
+
+import numpy as np
+
+# Configure logging based on environment variable
+log_level = logging.DEBUG if os.getenv('DEBUG') else logging.WARNING
+logging.basicConfig(level=log_level, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+STORAGE_TYPES = ('fp32', 'fp16', 'int8', 'pq')
+DEFAULT_STORAGE = os.getenv('VECTOR_STORAGE', 'fp32')
+PQ_SUBSPACES = int(os.getenv('PQ_SUBSPACES', '48'))
+PQ_CENTROIDS = 256           # one uint8 code per subspace
+PQ_TRAIN_SAMPLE = 50000
+PQ_ITERATIONS = 12
+ASSIGN_BLOCK_ROWS = 65536
+
+_CODES_FILE = "codes.npy"
+_SCALES_FILE = "code_scales.npy"
+_CODEBOOK_FILE = "pq_codebook.npy"
+
+Rows = Union[slice, np.ndarray]
+
+
+def _nearest_centroids(points: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    # Index of the closest centroid (squared L2) for each point
+    distances = (np.einsum('ij,ij->i', centroids, centroids)[None, :] - 2.0 * points @ centroids.T)
+    return np.argmin(distances, axis=1)
+
+
+def train_pq_codebook(vectors: np.ndarray, subspaces: int = PQ_SUBSPACES,
+                      iterations: int = PQ_ITERATIONS, sample_size: int = PQ_TRAIN_SAMPLE,
+                      seed: int = 0) -> np.ndarray:
+    # k-means per subspace over a sample; returns a (subspaces, centroids, sub_dim) float32 codebook
+    n, dim = vectors.shape
+    if dim % subspaces:
+        raise ValueError(f"PQ needs the dimension ({dim}) to be a multiple of the subspaces ({subspaces})")
+    sub_dim = dim // subspaces
+    rng = np.random.default_rng(seed)
+    sample = np.asarray(vectors[np.sort(rng.choice(n, size=min(sample_size, n), replace=False))],
+                        dtype=np.float32)
+    n_centroids = min(PQ_CENTROIDS, len(sample))
+
+    codebook = np.zeros((subspaces, PQ_CENTROIDS, sub_dim), dtype=np.float32)
+    for j in range(subspaces):
+        points = sample[:, j * sub_dim:(j + 1) * sub_dim]
+        centroids = points[rng.choice(len(points), size=n_centroids, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = _nearest_centroids(points, centroids)
+            counts = np.bincount(assignment, minlength=n_centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, points)
+            filled = counts > 0
+            centroids[filled] = sums[filled] / counts[filled, None]
+        codebook[j, :n_centroids] = centroids
+    return codebook
+
+
+class VectorCodec:
+    # Compressed copy of the index vectors that can score query blocks directly
+
+    def __init__(self, storage: str, codes: np.ndarray, scales: Optional[np.ndarray] = None,
+                 codebook: Optional[np.ndarray] = None):
+        self.storage = storage
+        self.codes = codes
+        self.scales = scales
+        self.codebook = codebook
+
+    @classmethod
+    def encode(cls, vectors: np.ndarray, storage: str, subspaces: int = PQ_SUBSPACES) -> "VectorCodec":
+        # Compress normalized float32 vectors with the given storage type
+        if storage == 'fp16':
+            return cls(storage, np.asarray(vectors, dtype=np.float16))
+
+        if storage == 'int8':
+            # Symmetric per-vector scale so each row uses the full int8 range
+            scales = np.abs(vectors).max(axis=1) / 127.0
+            scales = np.where(scales > 0, scales, 1.0).astype(np.float32)
+            codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+            return cls(storage, codes, scales=scales)
+
+        if storage == 'pq':
+            codebook = train_pq_codebook(vectors, subspaces)
+            sub_dim = codebook.shape[2]
+            codes = np.empty((len(vectors), subspaces), dtype=np.uint8)
+            for start in range(0, len(vectors), ASSIGN_BLOCK_ROWS):
+                block = np.asarray(vectors[start:start + ASSIGN_BLOCK_ROWS], dtype=np.float32)
+                for j in range(subspaces):
+                    codes[start:start + len(block), j] = _nearest_centroids(
+                        block[:, j * sub_dim:(j + 1) * sub_dim], codebook[j])
+            return cls(storage, codes, codebook=codebook)
+
+        raise ValueError(f"Unknown vector storage '{storage}', expected one of {STORAGE_TYPES[1:]}")
+
+    def save(self, index_dir: str) -> Dict[str, Any]:
+        # Write the codes next to the index; returns the manifest entries describing them
+        np.save(os.path.join(index_dir, _CODES_FILE), self.codes)
+        if self.scales is not None:
+            np.save(os.path.join(index_dir, _SCALES_FILE), self.scales)
+        if self.codebook is not None:
+            np.save(os.path.join(index_dir, _CODEBOOK_FILE), self.codebook)
+        entries: Dict[str, Any] = {'storage': self.storage, 'code_bytes': self.nbytes}
+        if self.codebook is not None:
+            entries['pq_subspaces'] = int(self.codebook.shape[0])
+        return entries
+
+    @classmethod
+    def load(cls, index_dir: str, manifest: Dict[str, Any]) -> Optional["VectorCodec"]:
+        # Open the codes of a compressed index (memory-mapped); None for fp32 indexes
+        storage = manifest.get('storage', 'fp32')
+        if storage == 'fp32':
+            return None
+        codes = np.load(os.path.join(index_dir, _CODES_FILE), mmap_mode='r')
+        scales = np.load(os.path.join(index_dir, _SCALES_FILE)) if storage == 'int8' else None
+        codebook = np.load(os.path.join(index_dir, _CODEBOOK_FILE)) if storage == 'pq' else None
+        return cls(storage, codes, scales, codebook)
+
+    @property
+    def nbytes(self) -> int:
+        # Bytes of codes plus scales / codebook, i.e. what scoring keeps resident
+        return int(sum(array.nbytes for array in (self.codes, self.scales, self.codebook) if array is not None))
+
+    def prepare(self, queries: np.ndarray) -> np.ndarray:
+        # Per-search query state: PQ lookup tables (queries, subspaces, centroids), else the queries
+        if self.storage != 'pq':
+            return queries
+        subspaces, _, sub_dim = self.codebook.shape
+        split = queries.reshape(len(queries), subspaces, sub_dim)
+        return np.einsum('qjd,jcd->qjc', split, self.codebook)
+
+    def score(self, prepared: np.ndarray, rows: Rows) -> np.ndarray:
+        # Approximate inner products (queries x rows) computed from the codes
+        codes = np.asarray(self.codes[rows])
+        # Scalar codes are widened one block at a time; only the block is ever float32
+        if self.storage == 'fp16':
+            return prepared @ codes.astype(np.float32).T
+        if self.storage == 'int8':
+            return (prepared @ codes.astype(np.float32).T) * self.scales[rows]
+        # PQ asymmetric distance: sum one table lookup per subspace
+        scores = np.zeros((len(prepared), len(codes)), dtype=np.float32)
+        for j in range(codes.shape[1]):
+            scores += prepared[:, j, codes[:, j]]
+        return scores
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Vector Store Session for Caliper-AI
+Shared, persistent ChromaDB client that is opened once per process and
+passed to ingestion, embedding and query code.
+"""
+
+import os
+import logging
+import threading
+import time
+import numpy as np
+from typing import Dict, List, Optional
+
+# Configure logging based on environment variable
+log_level = logging.DEBUG if os.getenv('DEBUG') else logging.WARNING
+logging.basicConfig(level=log_level, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_PERSIST_DIRECTORY = os.getenv('CHROMA_PERSIST_DIRECTORY', './chroma_db')
+DEFAULT_COLLECTION_NAME = "diy_snippets"
+
+# Touched on every write so other processes can tell the index changed
+_GENERATION_FILE = ".caliper_generation"
+
+# Global store instance, one per process
+_store = None
+
+
+def read_generation(persist_directory: str = DEFAULT_PERSIST_DIRECTORY) -> Optional[str]:
+    # Generation token persisted in a store directory, or None if nothing was ever written there
+    # Reads one small file and never opens ChromaDB, so query nodes can check it on every request
+    try:
+        with open(os.path.join(persist_directory, _GENERATION_FILE), 'r', encoding='utf-8') as f:
+            token = f.read().strip()
+    except FileNotFoundError:
+        return None
+    return token if ':' in token and token.split(':', 1)[0].isdigit() else None
+
+
+def store_generation() -> Optional[str]:
+    # Generation of the process-wide store's directory, whether or not the store has been opened
+    return read_generation(_store.persist_directory if _store is not None else DEFAULT_PERSIST_DIRECTORY)
+
+
+def to_store_embeddings(embeddings: np.ndarray) -> List[List[float]]:
+    # Convert a float32 embedding matrix to the nested lists ChromaDB validates against
+    # This is the only place embeddings leave NumPy on the way into the store
+    return np.atleast_2d(np.asarray(embeddings, dtype=np.float32)).tolist()
+
+
+class VectorStore:
+    # Persistent ChromaDB client with cached collection handles
+
+    def __init__(self, persist_directory: str = DEFAULT_PERSIST_DIRECTORY,
+                 collection_name: str = DEFAULT_COLLECTION_NAME):
+        # Imported here so scripts that never touch the store do not pay for chromadb
+        import chromadb
+        
+        logger.info(f"Opening ChromaDB store in: {persist_directory}")
+        self.persist_directory = persist_directory
+        self.collection_name = collection_name
+        self.client = chromadb.PersistentClient(path=persist_directory)
+        self._collections: Dict[str, object] = {}
+        self._handles_generation = self.generation()
+
+    @property
+    def _generation_path(self) -> str:
+        return os.path.join(self.persist_directory, _GENERATION_FILE)
+
+    def mark_changed(self) -> None:
+        # Record that the index was written to; invalidates cached query results in every process
+        # The file holds "<write count>:<time_ns>", replaced atomically so readers never see a partial token
+        count = int(self.generation().split(':', 1)[0]) + 1
+        staging = f"{self._generation_path}.{os.getpid()}.{threading.get_ident()}"
+        with open(staging, 'w', encoding='utf-8') as f:
+            f.write(f"{count}:{time.time_ns()}")
+        os.replace(staging, self._generation_path)
+
+    def generation(self) -> str:
+        # Token that changes whenever this or another process writes to the index
+        # Only persisted state goes into it, so an ingest process and a query process agree on it
+        return read_generation(self.persist_directory) or "0:0"
+
+    def _refresh_handles(self) -> None:
+        # Handles hold the collection metadata (e.g. the projection version) as it was when opened;
+        # once the store has been written, possibly by another process, they are re-read
+        generation = self.generation()
+        if generation == self._handles_generation:
+            return
+        self._handles_generation = generation
+        for name, collection in list(self._collections.items()):
+            if hasattr(collection, 'reload'):
+                collection.reload()
+            else:
+                self._collections.pop(name, None)
+
+    def collection(self, name: Optional[str] = None):
+        # Get or create a collection, reusing the handle until the store generation changes
+        name = name or self.collection_name
+        self._refresh_handles()
+        collection = self._collections.get(name)
+        if collection is None and name == self.collection_name:
+            # The main collection may be spread over shards (see sharding.py)
+            from sharding import open_sharded
+            collection = open_sharded(self.client, self.persist_directory, name)
+            if collection is not None:
+                self._collections[name] = collection
+                logger.info(f"Using {collection.strategy}-sharded collection: {name} "
+                            f"({len(collection.shard_names())} shards, {collection.count()} documents)")
+        if collection is None:
+            # No embedding function: every vector comes from the configured local encoder,
+            # so ChromaDB never embeds texts itself in a different embedding space
+            collection = self.client.get_or_create_collection(name=name, embedding_function=None)
+            self._collections[name] = collection
+            logger.info(f"Using collection: {name} ({collection.count()} documents)")
+        return collection
+
+    def reset_collection(self, name: Optional[str] = None):
+        # Drop and recreate a collection
+        name = name or self.collection_name
+        collection = self._collections.get(name)
+        if hasattr(collection, 'drop'):
+            collection.drop()
+        elif name == self.collection_name:
+            from sharding import open_sharded
+            sharded = open_sharded(self.client, self.persist_directory, name, strategy='none')
+            if sharded is not None:
+                sharded.drop()
+        try:
+            self.client.delete_collection(name=name)
+            logger.info(f"Deleted collection: {name}")
+        except Exception:
+            pass
+        self._collections.pop(name, None)
+        self.mark_changed()
+        return self.collection(name)
+
+    def count(self, name: Optional[str] = None) -> int:
+        # Number of documents in a collection
+        return self.collection(name).count()
+
+
+def get_store(persist_directory: Optional[str] = None) -> VectorStore:
+    # Return the process-wide store, opening it on first use
+    global _store
+
+    if _store is None:
+        _store = VectorStore(persist_directory or DEFAULT_PERSIST_DIRECTORY)
+    elif persist_directory and os.path.abspath(persist_directory) != os.path.abspath(_store.persist_directory):
+        logger.warning(f"Store already open at {_store.persist_directory}, ignoring {persist_directory}")
+
+    return _store
@@ -0,0 +1,103 @@
+import numpy as np
+
+
+def matches(metadata, where) -> bool:
+    # The subset of ChromaDB's where syntax the code under test sends
+    if not where:
+        return True
+    for key, condition in where.items():
+        if key == '$and':
+            if not all(matches(metadata, clause) for clause in condition):
+                return False
+            continue
+        value = metadata.get(key)
+        if isinstance(condition, dict):
+            (operator, operand), = condition.items()
+            if operator == '$eq' and value != operand or operator == '$in' and value not in operand \
+                    or operator == '$nin' and value in operand:
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+class MemoryCollection:
+    # In-memory stand-in for a ChromaDB collection: squared L2 distances, where filters, id deletes
+
+    def __init__(self, name):
+        self.name = name
+        self.metadata = {}
+        self.rows = {}
+        self.deleted_ids = 0
+
+    def count(self):
+        return len(self.rows)
+
+    def modify(self, metadata=None):
+        self.metadata = dict(metadata or {})
+
+    def upsert(self, ids, documents=None, metadatas=None, embeddings=None):
+        for i, doc_id in enumerate(ids):
+            self.rows[doc_id] = (documents[i], metadatas[i], np.asarray(embeddings[i], dtype=np.float32))
+
+    def delete(self, ids=None, where=None):
+        for doc_id in ids or [doc_id for doc_id, row in self.rows.items() if matches(row[1], where)]:
+            self.deleted_ids += 1
+            self.rows.pop(doc_id, None)
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=('metadatas', 'documents')):
+        keys = [doc_id for doc_id in (ids if ids is not None else self.rows)
+                if doc_id in self.rows and matches(self.rows[doc_id][1], where)]
+        keys = keys[offset or 0:(offset or 0) + limit if limit is not None else None]
+        page = {'ids': keys, 'documents': [self.rows[k][0] for k in keys],
+                'metadatas': [self.rows[k][1] for k in keys]}
+        if 'embeddings' in include:
+            page['embeddings'] = [self.rows[k][2] for k in keys]
+        return page
+
+    def query(self, query_embeddings, n_results=10, where=None, include=('metadatas', 'documents', 'distances')):
+        keys = [doc_id for doc_id, row in self.rows.items() if matches(row[1], where)]
+        result = {'ids': [], 'documents': [], 'metadatas': [], 'distances': []}
+        for query in np.asarray(query_embeddings, dtype=np.float32):
+            distances = [float(np.sum((self.rows[k][2] - query) ** 2)) for k in keys]
+            order = sorted(range(len(keys)), key=lambda i: distances[i])[:n_results]
+            result['ids'].append([keys[i] for i in order])
+            result['documents'].append([self.rows[keys[i]][0] for i in order])
+            result['metadatas'].append([self.rows[keys[i]][1] for i in order])
+            result['distances'].append([distances[i] for i in order])
+        return result
+
+
+class MemoryClient:
+    def __init__(self):
+        self.collections = {}
+
+    def get_or_create_collection(self, name, embedding_function=None):
+        return self.collections.setdefault(name, MemoryCollection(name))
+
+    def get_collection(self, name):
+        if name not in self.collections:
+            raise ValueError(f"Collection {name} does not exist")
+        return self.collections[name]
+
+    def delete_collection(self, name):
+        self.collections.pop(name)
+
+
+class MemoryStore:
+    # Stand-in for VectorStore: one in-memory client and a generation that counts writes
+
+    def __init__(self, persist_directory, collection_name='diy_snippets'):
+        self.persist_directory = str(persist_directory)
+        self.collection_name = collection_name
+        self.client = MemoryClient()
+        self.changes = 0
+
+    def collection(self, name=None):
+        return self.client.get_or_create_collection(name or self.collection_name)
+
+    def mark_changed(self):
+        self.changes += 1
+
+    def generation(self):
+        return f"{self.changes}:0"
@@ -0,0 +1,67 @@
+import pytest
+
+import bulk_writer
+from bulk_writer import BulkWriter, split_batches, upsert_with_retry
+from memory_store import MemoryCollection, MemoryStore
+
+
+class FlakyCollection(MemoryCollection):
+    # Fails the first `failures` upserts, then behaves like the in-memory collection
+
+    def __init__(self, failures):
+        super().__init__('flaky')
+        self.failures = failures
+        self.attempts = 0
+
+    def upsert(self, **batch):
+        self.attempts += 1
+        if self.attempts <= self.failures:
+            raise ConnectionError("store unavailable")
+        super().upsert(**batch)
+
+
+def columns(count):
+    return {'ids': [str(i) for i in range(count)], 'documents': [f"doc {i}" for i in range(count)],
+            'metadatas': [{} for _ in range(count)], 'embeddings': [[float(i)] for i in range(count)]}
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    slept = []
+    monkeypatch.setattr(bulk_writer.time, 'sleep', slept.append)
+    return slept
+
+
+def test_retries_back_off_exponentially(sleeps):
+    collection = FlakyCollection(failures=2)
+
+    assert upsert_with_retry(collection, columns(3), retries=3, backoff=0.5) == 2
+    assert sleeps == [0.5, 1.0]
+    assert len(collection.rows) == 3
+
+
+def test_gives_up_after_the_last_retry(sleeps):
+    collection = FlakyCollection(failures=5)
+
+    with pytest.raises(ConnectionError):
+        upsert_with_retry(collection, columns(1), retries=2, backoff=0.1)
+    assert collection.attempts == 3 and sleeps == pytest.approx([0.1, 0.2])
+
+
+def test_split_batches_keeps_columns_parallel():
+    batches = list(split_batches(columns(5), 2))
+
+    assert [batch['ids'] for batch in batches] == [['0', '1'], ['2', '3'], ['4']]
+    assert batches[2]['embeddings'] == [[4.0]]
+
+
+def test_writer_counts_retries_and_reports_failures(sleeps, tmp_path):
+    store = MemoryStore(tmp_path)
+    with BulkWriter(store, FlakyCollection(failures=1), batch_size=2, retries=1) as writer:
+        writer.submit(columns(5))
+    assert writer.stats()['rows'] == 5 and writer.stats()['batches'] == 3 and writer.stats()['retries'] == 1
+
+    writer = BulkWriter(store, FlakyCollection(failures=10), batch_size=2, retries=1)
+    writer.submit(columns(1))
+    with pytest.raises(RuntimeError, match="Bulk write failed"):
+        writer.close()
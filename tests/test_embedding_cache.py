@@ -0,0 +1,60 @@
+import numpy as np
+
+from embedding_cache import EmbeddingCache
+
+DIM = 4
+
+
+def vector(seed):
+    return np.full(DIM, seed, dtype=np.float32)
+
+
+def cached(cache, texts):
+    # Texts that hit, mapped to the first component of their vector
+    positions, vectors, _ = cache.lookup(texts)
+    return {texts[i]: float(row[0]) for i, row in zip(positions, vectors)}
+
+
+def test_max_entries_bounds_the_cache(tmp_path):
+    cache = EmbeddingCache('test-model', DIM, cache_dir=str(tmp_path), max_entries=4)
+    texts = [f"text {i}" for i in range(10)]
+    cache.put_many(texts, [vector(i) for i in range(10)])
+
+    assert len(cache) == 4
+    assert cache.evictions == 6
+    assert cache.stats()['size_bytes'] == 4 * DIM * 4
+    # The most recent writes survive with their own vectors
+    assert cached(cache, texts) == {f"text {i}": float(i) for i in range(6, 10)}
+
+
+def test_eviction_drops_least_recently_used(tmp_path):
+    cache = EmbeddingCache('test-model', DIM, cache_dir=str(tmp_path), max_entries=3)
+    cache.put_many(["a", "b", "c"], [vector(1), vector(2), vector(3)])
+    # Reading "a" makes "b" the oldest entry
+    cache.lookup(["a"])
+    cache.put_many(["d"], [vector(4)])
+
+    assert cached(cache, ["a", "b", "c", "d"]) == {"a": 1.0, "c": 3.0, "d": 4.0}
+    # Rewriting an entry also refreshes it
+    cache.put_many(["c"], [vector(5)])
+    cache.put_many(["e"], [vector(6)])
+    assert cached(cache, ["a", "c", "d", "e"]) == {"c": 5.0, "d": 4.0, "e": 6.0}
+
+
+def test_reload_after_evict_never_returns_another_texts_vector(tmp_path):
+    cache = EmbeddingCache('test-model', DIM, cache_dir=str(tmp_path), max_entries=2)
+    cache.put_many(["a", "b"], [vector(1), vector(2)])
+    cache.save()
+    # Evicting "a" saves the index before its row is reused for "c"; "c" itself is not saved
+    cache.put_many(["c"], [vector(3)])
+
+    reloaded = EmbeddingCache('test-model', DIM, cache_dir=str(tmp_path), max_entries=2)
+    assert cached(reloaded, ["a", "b", "c"]) == {"b": 2.0}
+
+    cache.save()
+    reloaded = EmbeddingCache('test-model', DIM, cache_dir=str(tmp_path), max_entries=2)
+    assert cached(reloaded, ["a", "b", "c"]) == {"b": 2.0, "c": 3.0}
+    # A smaller bound on reload is enforced on the next write
+    smaller = EmbeddingCache('test-model', DIM, cache_dir=str(tmp_path), max_entries=1)
+    smaller.put_many(["d"], [vector(4)])
+    assert len(smaller) == 1 and cached(smaller, ["b", "c", "d"]) == {"d": 4.0}
@@ -0,0 +1,96 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+import index_snapshot
+import numpy_search
+import projection
+from index_snapshot import export_snapshot, load_snapshot, restore_snapshot
+from memory_store import MemoryStore
+
+
+@pytest.fixture(autouse=True)
+def json_records(monkeypatch):
+    # The round trip must not depend on pyarrow being installed
+    monkeypatch.setattr(index_snapshot, 'SNAPSHOT_RECORDS', 'json')
+
+
+def populated_store(path, rows=20, dim=16):
+    store = MemoryStore(path)
+    vectors = np.random.default_rng(0).normal(size=(rows, dim)).astype(np.float32)
+    store.collection().upsert(ids=[str(i) for i in range(rows)],
+                              documents=[f"snippet {i}" for i in range(rows)],
+                              metadatas=[{'category': 'Plumbing' if i % 2 else 'Painting'} for i in range(rows)],
+                              embeddings=vectors)
+    store.mark_changed()
+    return store, vectors
+
+
+def test_export_then_load_round_trips_the_index(tmp_path):
+    store, vectors = populated_store(tmp_path / 'store')
+    snapshot_dir = str(tmp_path / 'snapshot')
+
+    exported = export_snapshot(snapshot_dir, store)
+    loaded = load_snapshot(snapshot_dir)
+
+    assert len(exported) == len(loaded) == 20
+    assert loaded.ids == [str(i) for i in range(20)]
+    assert loaded.documents[3] == "snippet 3" and loaded.metadatas[3] == {'category': 'Plumbing'}
+    np.testing.assert_allclose(loaded.vectors, numpy_search.normalize_rows(vectors), rtol=1e-6)
+    assert loaded.manifest['snapshot_format'] == index_snapshot.SNAPSHOT_FORMAT
+    assert loaded.manifest['records_format'] == 'json'
+    # A re-export replaces the snapshot without leaving staging directories behind
+    export_snapshot(snapshot_dir, store)
+    assert [name for name in os.listdir(tmp_path) if name.startswith('snapshot')] == ['snapshot']
+
+
+def test_restore_writes_the_snapshot_into_an_empty_collection(tmp_path):
+    store, _ = populated_store(tmp_path / 'store')
+    snapshot_dir = str(tmp_path / 'snapshot')
+    snapshot = export_snapshot(snapshot_dir, store)
+
+    target = MemoryStore(tmp_path / 'target')
+    assert restore_snapshot(snapshot_dir, target) == 20
+    rows = target.collection().rows
+    assert rows['7'][0] == "snippet 7" and rows['7'][1] == {'category': 'Plumbing'}
+    np.testing.assert_allclose(rows['7'][2], snapshot.vectors[7], rtol=1e-6)
+
+
+def test_projection_travels_with_the_snapshot(tmp_path, monkeypatch):
+    monkeypatch.setattr(projection, 'PROJECTION_DIMS', 4)
+    store = MemoryStore(tmp_path / 'store')
+    vectors = projection.project_for_store(store, np.random.default_rng(0).normal(size=(20, 16)))
+    store.collection().upsert(ids=[str(i) for i in range(20)], documents=['d'] * 20,
+                              metadatas=[{}] * 20, embeddings=vectors)
+    snapshot_dir = str(tmp_path / 'snapshot')
+    export_snapshot(snapshot_dir, store)
+
+    target = MemoryStore(tmp_path / 'target')
+    assert restore_snapshot(snapshot_dir, target) == 20
+    version = store.collection().metadata[projection.VERSION_KEY]
+    assert target.collection().metadata[projection.VERSION_KEY] == version
+    assert projection.collection_projection(target).version == version
+
+    # A collection already holding vectors in another space is left alone
+    other = MemoryStore(tmp_path / 'other')
+    other.collection().upsert(ids=['x'], documents=['d'], metadatas=[{}], embeddings=[np.zeros(16)])
+    assert restore_snapshot(snapshot_dir, other) is None
+    assert list(other.collection().rows) == ['x']
+
+
+def test_load_rejects_other_encoders_and_newer_formats(tmp_path):
+    store, _ = populated_store(tmp_path / 'store')
+    snapshot_dir = str(tmp_path / 'snapshot')
+    export_snapshot(snapshot_dir, store)
+    manifest_path = os.path.join(snapshot_dir, 'manifest.json')
+    with open(manifest_path, encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    for change in ({'model_name': 'some/other-model'}, {'snapshot_format': index_snapshot.SNAPSHOT_FORMAT + 1}):
+        with open(manifest_path, 'w', encoding='utf-8') as f:
+            json.dump(dict(manifest, **change), f)
+        assert load_snapshot(snapshot_dir) is None
+
+    assert load_snapshot(str(tmp_path / 'missing')) is None
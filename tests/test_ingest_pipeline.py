@@ -0,0 +1,115 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import ingest_pipeline
+import text_chunking
+from keyword_index import KeywordIndex
+from memory_store import MemoryStore
+
+LONG_SNIPPET = " ".join(f"step{i}" for i in range(30))
+
+
+def fake_embeddings(texts):
+    # Deterministic vectors derived from the text, so unchanged rows embed identically
+    return np.stack([np.frombuffer(hashlib.sha256(text.encode('utf-8')).digest()[:16], dtype=np.uint8)
+                     .astype(np.float32) for text in texts]) if texts else np.zeros((0, 16), dtype=np.float32)
+
+
+@pytest.fixture
+def ingest(monkeypatch, tmp_path):
+    # Word-level chunks of at most 10 tokens and fake embeddings, so no model is loaded
+    monkeypatch.setattr(text_chunking, 'get_tokenizer', lambda: (None, 12))
+    embedded = []
+
+    def generate(texts):
+        embedded.extend(texts)
+        return fake_embeddings(texts)
+
+    monkeypatch.setattr(ingest_pipeline, 'generate_batch_embeddings', generate)
+    store = MemoryStore(tmp_path / 'store')
+
+    def run(rows, **kwargs):
+        csv_path = tmp_path / 'snippets.csv'
+        pd.DataFrame(rows, columns=['id', 'category', 'snippet_text', 'tools_required', 'ppe_required']) \
+            .to_csv(csv_path, index=False)
+        embedded.clear()
+        return ingest_pipeline.stream_ingest(str(csv_path), store, chunk_size=2,
+                                             keyword_index_dir=str(tmp_path / 'keywords'), **kwargs)
+
+    run.store = store
+    run.embedded = embedded
+    run.keyword_dir = str(tmp_path / 'keywords')
+    return run
+
+
+ROWS = [
+    (1, 'Plumbing', 'Fix a leaky faucet', 'Wrench', 'Gloves'),
+    (2, 'Painting', LONG_SNIPPET, 'Brush', 'Mask'),
+    (3, 'Woodworking', 'Sand the table top', 'Sander', 'Glasses'),
+]
+
+
+def test_ingest_writes_every_chunk(ingest):
+    totals = ingest(ROWS)
+
+    ids = set(ingest.store.collection().rows)
+    assert totals['read'] == 3 and totals['written'] == len(ids) and totals['deleted'] == 0
+    assert {'1', '3'} < ids and len([doc_id for doc_id in ids if doc_id.startswith('2#chunk')]) > 1
+    assert totals['rows_per_sec'] > 0
+
+
+def test_reingest_deletes_removed_rows_and_trailing_chunks(ingest):
+    ingest(ROWS)
+    # Row 3 is removed and row 2 shrinks to a single chunk
+    totals = ingest([ROWS[0], (2, 'Painting', 'Paint the trim', 'Brush', 'Mask')])
+
+    assert set(ingest.store.collection().rows) == {'1', '2'}
+    assert totals['written'] == 1 and totals['deleted'] > 1
+    # The keyword index drops the same rows the store did
+    keywords = KeywordIndex.load(ingest.keyword_dir)
+    assert len(keywords) == 2
+    assert keywords.search("step0 sand", 5) == []
+    assert sorted(doc_id for doc_id, _ in keywords.search("trim faucet", 5)) == ['1', '2']
+
+
+def test_reingest_of_unchanged_csv_writes_nothing(ingest):
+    ingest(ROWS)
+    generation = ingest.store.generation()
+    totals = ingest(ROWS)
+
+    assert totals['written'] == 0 and totals['deleted'] == 0
+    assert ingest.embedded == []
+    assert ingest.store.generation() == generation
+
+
+def test_only_changed_snippets_are_chunked(ingest, monkeypatch):
+    ingest(ROWS)
+    chunked = []
+
+    def chunk_columns(columns):
+        chunked.extend(columns['ids'])
+        return text_chunking.chunk_columns(columns)
+
+    monkeypatch.setattr(ingest_pipeline, 'chunk_columns', chunk_columns)
+    totals = ingest([ROWS[0], ROWS[1], (3, 'Woodworking', 'Sand and oil the table top', 'Sander', 'Glasses')])
+
+    assert chunked == ['3']
+    assert totals['written'] == 1 and totals['deleted'] == 0
+    assert len(KeywordIndex.load(ingest.keyword_dir)) == len(ingest.store.collection().rows)
+    assert [doc_id for doc_id, _ in KeywordIndex.load(ingest.keyword_dir).search("oil", 5)] == ['3']
+
+
+def test_failed_ingest_removes_keyword_spill_files(ingest, monkeypatch, tmp_path):
+    spill_dir = tmp_path / 'spill'
+    builder = ingest_pipeline.KeywordIndexBuilder
+    monkeypatch.setattr(ingest_pipeline, 'KeywordIndexBuilder', lambda: builder(spill_dir=str(spill_dir)))
+
+    def fail(texts):
+        raise RuntimeError("encoder crashed")
+
+    monkeypatch.setattr(ingest_pipeline, 'generate_batch_embeddings', fail)
+    assert ingest(ROWS) is None
+    assert not spill_dir.exists()
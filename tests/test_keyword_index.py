@@ -0,0 +1,169 @@
+import math
+import os
+
+import numpy as np
+import pytest
+
+import keyword_index
+from keyword_index import (KeywordIndex, KeywordIndexBuilder, build_from_columns, compact, main_rows_for_ids,
+                           read_filter_rows, reciprocal_rank_fusion, tokenize, update_index)
+
+DOCUMENTS = [
+    "Fix a leaky faucet by replacing the washer",
+    "Sand the table before painting the table top",
+    "Use a stud finder before drilling into drywall",
+    "Replace the faucet cartridge and check the washer seat",
+    "Paint trim with an angled brush",
+]
+METADATAS = [
+    {'tools_required': 'Wrench'},
+    {'tools_required': 'Random Orbital Sander'},
+    {'tools_required': 'Stud finder, Power Drill'},
+    {'tools_required': 'Wrench, Pliers'},
+    {'tools_required': 'Paintbrush'},
+]
+
+
+def columns(rows):
+    return {'ids': [str(i) for i in rows], 'documents': [DOCUMENTS[i] for i in rows],
+            'metadatas': [METADATAS[i] for i in rows]}
+
+
+def expected_bm25(query: str, documents, metadatas, k1: float, b: float):
+    # Textbook BM25 with the same idf and tokenization as the index
+    docs = [tokenize(text) + tokenize(metadata.get('tools_required')) for text, metadata in zip(documents, metadatas)]
+    avg_length = sum(len(doc) for doc in docs) / len(docs)
+    scores = [0.0] * len(docs)
+    for term in set(tokenize(query)):
+        df = sum(1 for doc in docs if term in doc)
+        if not df:
+            continue
+        idf = math.log1p((len(docs) - df + 0.5) / (df + 0.5))
+        for i, doc in enumerate(docs):
+            tf = doc.count(term)
+            if tf:
+                scores[i] += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(doc) / avg_length))
+    return scores
+
+
+def test_bm25_scores_match_formula(tmp_path):
+    index = build_from_columns([columns(range(5))], str(tmp_path))
+    expected = expected_bm25("faucet washer wrench", DOCUMENTS, METADATAS, index.k1, index.b)
+
+    results = index.search("faucet washer wrench", 5)
+    assert [doc_id for doc_id, _ in results] == ['0', '3']
+    for doc_id, score in results:
+        assert abs(score - expected[int(doc_id)]) < 1e-4
+    assert index.search("nothing matches this", 5) == []
+
+
+def test_chunked_build_matches_single_build(tmp_path):
+    single = build_from_columns([columns(range(5))], str(tmp_path / 'single'))
+    builder = KeywordIndexBuilder(spill_dir=str(tmp_path / 'spill'))
+    for rows in ([0, 1], [2], [3, 4]):
+        part = columns(rows)
+        builder.add(part['ids'], part['documents'], part['metadatas'])
+    chunked = builder.save(str(tmp_path / 'chunked'))
+
+    for query in ("faucet washer", "table painting", "drill"):
+        assert chunked.search(query, 5) == single.search(query, 5)
+    assert not (tmp_path / 'spill').exists()
+
+
+def test_incremental_update_matches_fresh_build(tmp_path):
+    index_dir = str(tmp_path / 'index')
+    build_from_columns([columns(range(4))], index_dir)
+
+    # Row 1 changes, row 2 is removed and row 4 is added
+    changed = {'ids': ['1', '4'], 'documents': ["Stain the table with a rag", DOCUMENTS[4]],
+               'metadatas': [{'tools_required': 'Rag'}, METADATAS[4]]}
+    assert update_index(changed, ['2'], index_dir)['rows'] == 4
+    updated = KeywordIndex.load(index_dir)
+
+    assert len(updated) == 4
+    assert [doc_id for doc_id, _ in updated.search("table", 5)] == ['1']
+    assert updated.search("drywall", 5) == []
+    # Compaction folds the delta back in and gives the same ranking as a fresh build over the live rows
+    fresh_documents = [DOCUMENTS[0], "Stain the table with a rag", DOCUMENTS[3], DOCUMENTS[4]]
+    fresh_metadatas = [METADATAS[0], {'tools_required': 'Rag'}, METADATAS[3], METADATAS[4]]
+    fresh = build_from_columns([{'ids': ['0', '1', '3', '4'], 'documents': fresh_documents,
+                                 'metadatas': fresh_metadatas}], str(tmp_path / 'fresh'))
+    compacted = compact(index_dir, updated)
+    for query in ("faucet washer", "table rag", "paint brush"):
+        assert [doc_id for doc_id, _ in compacted.search(query, 5)] == [doc_id for doc_id, _ in fresh.search(query, 5)]
+        np.testing.assert_allclose([score for _, score in compacted.search(query, 5)],
+                                   [score for _, score in fresh.search(query, 5)], rtol=1e-5)
+
+
+def test_update_writes_only_the_delta(tmp_path, monkeypatch):
+    monkeypatch.setattr(keyword_index, 'COMPACT_FRACTION', 10.0)
+    index_dir = str(tmp_path / 'index')
+    build_from_columns([columns(range(5))], index_dir)
+    main_files = ('ids.json', 'vocab.json', 'postings_docs.npy', 'postings_tf.npy', 'doc_lengths.npy')
+    before = {name: os.stat(os.path.join(index_dir, name)).st_mtime_ns for name in main_files}
+
+    update_index({'ids': ['1'], 'documents': ["Stain the oak table"], 'metadatas': [{'tools_required': 'Rag'}]},
+                 ['2'], index_dir)
+    manifest = update_index({'ids': ['1', '5'], 'documents': ["Oil the oak table", "Hang a shelf"],
+                             'metadatas': [{}, {'tools_required': 'Level'}]}, [], index_dir)
+
+    assert {name: os.stat(os.path.join(index_dir, name)).st_mtime_ns for name in main_files} == before
+    # Row 1 was replaced twice: its main row and its first delta row are both deleted
+    assert manifest['rows'] == 5 and manifest['delta_rows'] == 3 and manifest['deleted'] == 3
+    index = KeywordIndex.load(index_dir)
+    assert [doc_id for doc_id, _ in index.search("oak", 5)] == ['1']
+    assert [doc_id for doc_id, _ in index.search("shelf level", 5)] == ['5']
+    assert index.search("drywall", 5) == []
+    assert manifest['avg_length'] == pytest.approx(float(np.mean(index.lengths[~index.deleted])))
+
+
+def test_id_map_finds_main_rows(tmp_path):
+    index_dir = str(tmp_path / 'index')
+    build_from_columns([columns([3, 0, 4])], index_dir)
+    assert main_rows_for_ids(index_dir, ['4', 'missing', '3']).tolist() == [0, 2]
+
+
+def test_builder_cleans_up_when_the_build_fails(tmp_path):
+    spill_dir = tmp_path / 'spill'
+    with pytest.raises(RuntimeError):
+        with KeywordIndexBuilder(spill_dir=str(spill_dir)) as builder:
+            builder.add(['0'], [DOCUMENTS[0]], [METADATAS[0]])
+            raise RuntimeError("source failed")
+    assert not spill_dir.exists()
+
+
+def test_update_without_index_returns_none(tmp_path):
+    assert update_index(columns([0]), [], str(tmp_path / 'missing')) is None
+
+
+def test_reciprocal_rank_fusion():
+    fused = reciprocal_rank_fusion([['a', 'b', 'c'], ['b', 'd']], k=60)
+    scores = dict(fused)
+    # 'b' is ranked by both lists, so it beats 'a' which only one list ranks first
+    assert [doc_id for doc_id, _ in fused][:2] == ['b', 'a']
+    assert abs(scores['b'] - (1 / 62 + 1 / 61)) < 1e-12
+    assert abs(scores['d'] - 1 / 62) < 1e-12
+    assert reciprocal_rank_fusion([]) == []
+
+
+def test_filter_rows_follow_updates_and_compaction(tmp_path, monkeypatch):
+    monkeypatch.setattr(keyword_index, 'COMPACT_FRACTION', 10.0)
+    index_dir = str(tmp_path / 'index')
+    rows = [{'category': 'Plumbing', 'tools_required': 'Wrench'}, {'category': 'Painting'}]
+    build_from_columns([{'ids': ['a', 'b'], 'documents': ['fix', 'paint'], 'metadatas': rows}], index_dir)
+
+    manifest, first, ids, metadatas, deleted = read_filter_rows(index_dir)
+    assert (first, ids, metadatas, deleted.tolist()) == (0, ['a', 'b'], rows, [])
+
+    update_index({'ids': ['b'], 'documents': ['paint trim'], 'metadatas': [{'category': 'Painting',
+                                                                             'ppe_required': 'Mask'}]}, [], index_dir)
+    # Same main segment: only the rows after the ones already read come back
+    _, first, ids, metadatas, deleted = read_filter_rows(index_dir, manifest['main_build'], 2)
+    assert (first, ids, metadatas, deleted.tolist()) == (2, ['b'], [{'category': 'Painting', 'ppe_required': 'Mask'}],
+                                                          [1])
+
+    compact(index_dir, KeywordIndex.load(index_dir))
+    compacted, first, ids, metadatas, deleted = read_filter_rows(index_dir, manifest['main_build'], 3)
+    assert compacted['main_build'] != manifest['main_build']
+    assert (first, ids, deleted.tolist()) == (0, ['a', 'b'], [])
+    assert metadatas[1] == {'category': 'Painting', 'ppe_required': 'Mask'}
@@ -0,0 +1,36 @@
+import numpy as np
+
+import local_embeddings
+
+
+class RecordingPool:
+    workers = 2
+    batch_size = 1
+
+    def encode(self, texts):
+        return np.array([[float(len(text))] for text in texts], dtype=np.float32)
+
+
+def test_model_source_prefers_the_snapshot(monkeypatch, tmp_path):
+    monkeypatch.setattr(local_embeddings, 'MODEL_SNAPSHOT_DIR', str(tmp_path))
+    assert local_embeddings.model_source('org/model') == 'org/model'
+    (tmp_path / 'org__model').mkdir()
+    assert local_embeddings.model_source('org/model') == str(tmp_path / 'org__model')
+
+
+def test_pool_workers_load_the_snapshot(monkeypatch, tmp_path):
+    monkeypatch.setattr(local_embeddings, 'MODEL_SNAPSHOT_DIR', str(tmp_path))
+    monkeypatch.setattr(local_embeddings, 'DEFAULT_BACKEND', 'torch')
+    (tmp_path / local_embeddings._model_name.replace('/', '__')).mkdir()
+    sources = []
+
+    def get_embedding_pool(source):
+        sources.append(source)
+        return RecordingPool()
+
+    monkeypatch.setattr(local_embeddings, 'get_embedding_pool', get_embedding_pool)
+    embeddings = local_embeddings._encode_batch(["a", "abc", "ab"])
+
+    assert sources == [local_embeddings.snapshot_path()]
+    # Rows come back in input order after the length sort
+    assert embeddings[:, 0].tolist() == [1.0, 3.0, 2.0]
@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+import metadata_index
+from memory_store import matches
+from metadata_index import MetadataIndex, parse_list, validate_filters
+
+METADATAS = [
+    {'category': 'Plumbing', 'tools_required': 'Wrench, Pliers', 'ppe_required': 'Work gloves'},
+    {'category': 'Woodworking', 'tools_required': 'Power Drill, Screws', 'ppe_required': 'Safety Glasses'},
+    {'category': 'Painting', 'tools_required': 'Paintbrush', 'ppe_required': 'Respirator, Safety Glasses'},
+    {'category': 'plumbing', 'tools_required': 'Powerful Plunger', 'ppe_required': ''},
+    {'category': 'Electrical', 'tools_required': 'Voltage tester, Power Drill', 'ppe_required': 'Safety Glasses'},
+]
+
+FILTERS = [
+    {'category': 'Plumbing'},
+    {'category': ['painting', 'Electrical']},
+    {'tools_required': ['power']},
+    {'tools_required': ['power drill'], 'ppe_required': ['glasses']},
+    {'exclude_tools': ['power']},
+    {'ppe_required': ['safety glasses'], 'exclude_ppe': ['respirator']},
+    {'category': 'Plumbing', 'exclude_tools': ['wrench']},
+    {'tools_required': ['hammer']},
+]
+
+
+def test_parse_list_normalizes():
+    assert parse_list(" Wrench , pliers,, ") == ['wrench', 'pliers']
+    assert parse_list(None) == []
+
+
+def test_validate_filters():
+    assert validate_filters({}) is None
+    with pytest.raises(ValueError):
+        validate_filters({'colour': 'red'})
+
+
+def test_candidates():
+    index = MetadataIndex(METADATAS)
+    assert index.candidates(None) is None
+    # Categories match case-insensitively; 'power' matches 'Power Drill' as a whole word, not 'Powerful'
+    assert index.candidates({'category': 'Plumbing'}).tolist() == [0, 3]
+    assert index.candidates({'tools_required': ['power']}).tolist() == [1, 4]
+    assert index.candidates({'exclude_tools': ['power']}).tolist() == [0, 2, 3]
+    assert index.candidates({'ppe_required': ['safety glasses'], 'exclude_ppe': ['respirator']}).tolist() == [1, 4]
+    assert index.candidates({'tools_required': ['hammer']}).tolist() == []
+
+
+@pytest.mark.parametrize('filters', FILTERS)
+def test_where_selects_the_same_rows_as_candidates(filters):
+    index = MetadataIndex(METADATAS)
+    where = index.where(filters)
+    selected = [row for row, metadata in enumerate(METADATAS) if matches(metadata, where)]
+    assert selected == index.candidates(filters).tolist()
+
+
+def test_where_falls_back_when_a_term_matches_too_many_values(monkeypatch):
+    monkeypatch.setattr(metadata_index, 'WHERE_MAX_VALUES', 1)
+    index = MetadataIndex(METADATAS)
+    assert index.where({'exclude_tools': ['power']}) is None
+    assert index.where({'tools_required': ['wrench']}) == {'tools_required': {'$in': ['Wrench, Pliers']}}
+
+
+def test_candidates_are_sorted_unique_int_rows():
+    rows = MetadataIndex(METADATAS * 3).candidates({'ppe_required': ['glasses']})
+    assert rows.dtype == np.int64
+    assert np.all(np.diff(rows) > 0)
+
+
+def test_extended_index_matches_a_fresh_build():
+    base = MetadataIndex(METADATAS[:3])
+    added = [{'category': 'Painting', 'tools_required': 'Roller, Power Sander', 'ppe_required': 'Respirator'},
+             METADATAS[3], METADATAS[4]]
+    # Row 1 was replaced by row 5 and row 2 was removed
+    extended = base.extended(added, deleted_rows=[1, 2])
+    fresh = MetadataIndex(METADATAS[:3] + added)
+    live = np.array([0, 3, 4, 5])
+
+    for filters in FILTERS + [{'category': 'painting'}, {'tools_required': ['sander']}]:
+        assert extended.candidates(filters).tolist() == np.intersect1d(fresh.candidates(filters), live).tolist()
+    # The original is untouched, so a reader holding it sees a consistent index
+    assert base.size == 3 and base.candidates({'category': 'Painting'}).tolist() == [2]
+    assert 'roller' not in base.postings['tools_required']
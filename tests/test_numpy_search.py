@@ -0,0 +1,100 @@
+import numpy as np
+
+import numpy_search
+from numpy_search import NumpySearchIndex, merge_top_k, normalize_rows, read_records, write_records
+
+
+def random_unit_vectors(n: int, dim: int = 16, seed: int = 0) -> np.ndarray:
+    return normalize_rows(np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32))
+
+
+def brute_force(queries: np.ndarray, vectors: np.ndarray, top_k: int) -> np.ndarray:
+    return np.argsort(-(normalize_rows(queries) @ vectors.T), axis=1, kind='stable')[:, :top_k]
+
+
+def test_merge_top_k_keeps_best_sorted():
+    rng = np.random.default_rng(0)
+    scores = rng.normal(size=(3, 50)).astype(np.float32)
+    rows = np.broadcast_to(np.arange(50), scores.shape)
+
+    best_scores, best_rows = merge_top_k(scores, rows, 5)
+    expected = np.argsort(-scores, axis=1)[:, :5]
+    np.testing.assert_array_equal(best_rows, expected)
+    np.testing.assert_array_equal(best_scores, np.take_along_axis(scores, expected, axis=1))
+    # Asking for more than there is returns everything, still sorted
+    all_scores, _ = merge_top_k(scores, rows, 80)
+    assert all_scores.shape == (3, 50)
+    assert np.all(np.diff(all_scores, axis=1) <= 0)
+
+
+def test_blocked_search_matches_brute_force(monkeypatch):
+    # Blocks smaller than top_k and a ragged last block exercise the running merge
+    monkeypatch.setattr(numpy_search, 'BLOCK_ROWS', 7)
+    vectors = random_unit_vectors(101)
+    queries = random_unit_vectors(4, seed=1)
+    ids = [str(i) for i in range(len(vectors))]
+    index = NumpySearchIndex(vectors, ids, ids, [{}] * len(ids))
+
+    results = index.search_vectors(queries, 10, exact=True)
+    np.testing.assert_array_equal(np.stack([rows for rows, _ in results]), brute_force(queries, vectors, 10))
+
+
+def test_candidate_rows_restrict_search():
+    vectors = random_unit_vectors(60)
+    ids = [str(i) for i in range(len(vectors))]
+    index = NumpySearchIndex(vectors, ids, ids, [{}] * len(ids))
+    candidates = index.rows_for_ids(['5', '17', '42', 'missing'])
+
+    rows, _ = index.search_vectors(vectors[17:18], 10, candidates=candidates)[0]
+    assert rows[0] == 17
+    assert set(rows.tolist()) == {5, 17, 42}
+
+
+def test_ivf_probing_every_list_is_exact():
+    vectors = random_unit_vectors(400)
+    queries = random_unit_vectors(3, seed=2)
+    ids = [str(i) for i in range(len(vectors))]
+    lists = 8
+    centroids, offsets, list_rows = numpy_search.train_ivf(vectors, lists)
+    index = NumpySearchIndex(vectors, ids, ids, [{}] * len(ids), ivf=(centroids, offsets, list_rows))
+
+    assert sorted(list_rows.tolist()) == list(range(len(vectors)))
+    results = index.search_vectors(queries, 5, nprobe=lists)
+    np.testing.assert_array_equal(np.stack([rows for rows, _ in results]), brute_force(queries, vectors, 5))
+
+
+def test_filtered_search_scores_only_matching_rows():
+    vectors = random_unit_vectors(30)
+    ids = [str(i) for i in range(len(vectors))]
+    metadatas = [{'category': 'Plumbing' if i % 3 == 0 else 'Painting',
+                  'tools_required': 'Power Drill, Screws' if i % 2 else 'Wrench',
+                  'ppe_required': 'Safety Glasses'} for i in range(len(vectors))]
+    index = NumpySearchIndex(vectors, ids, ids, metadatas)
+
+    hits = index.search(vectors[:1], 30, filters={'category': 'plumbing', 'exclude_tools': ['power']})[0]
+    assert [hit['id'] for hit in hits] and all(int(hit['id']) % 6 == 0 for hit in hits)
+    assert len(hits) == 5
+    assert hits[0]['id'] == '0' and abs(hits[0]['distance']) < 1e-5
+
+
+def test_build_and_load_round_trip(tmp_path):
+    vectors = random_unit_vectors(20) * 3.0
+    ids = [f"doc{i}" for i in range(len(vectors))]
+    metadatas = [{'category': 'Tools', 'chunk_index': i} for i in range(len(vectors))]
+    NumpySearchIndex.build(str(tmp_path), ids, ids, metadatas, vectors, use_ivf=False,
+                           manifest={'generation': '3:1'})
+
+    index = NumpySearchIndex.load(str(tmp_path))
+    assert index.manifest['generation'] == '3:1' and index.manifest['rows'] == 20
+    # Vectors come back normalized and memory-mapped
+    assert isinstance(index.vectors, np.memmap)
+    np.testing.assert_allclose(np.linalg.norm(index.vectors, axis=1), 1.0, rtol=1e-5)
+    hit = index.search(vectors[7:8], 1)[0][0]
+    assert hit['id'] == 'doc7' and hit['metadata'] == metadatas[7]
+
+
+def test_json_records_round_trip(tmp_path):
+    metadatas = [{'category': 'Tools'}, {}]
+    write_records(str(tmp_path), ['a', 'b'], ['first', 'second'], metadatas)
+    assert read_records(str(tmp_path)) == {'ids': ['a', 'b'], 'documents': ['first', 'second'],
+                                           'metadatas': metadatas}
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+import projection
+from memory_store import MemoryStore
+from projection import Projection, collection_projection, fit_for_collection, project_for_store, reservoir_sample
+
+
+def sample_vectors(rows=200, dim=16, seed=0):
+    # Most of the variance lies in the first few directions
+    rng = np.random.default_rng(seed)
+    return rng.normal(size=(rows, dim)) * np.geomspace(10, 0.1, dim)
+
+
+def test_fit_keeps_top_directions_and_normalizes():
+    fitted = Projection.fit(sample_vectors(), 4)
+    projected = fitted.apply(sample_vectors(10, seed=1))
+
+    assert projected.shape == (10, 4)
+    assert np.allclose(np.linalg.norm(projected, axis=1), 1.0, atol=1e-5)
+    assert fitted.info['explained_variance'] > 0.9
+
+    with pytest.raises(ValueError):
+        Projection.fit(sample_vectors(), 16)
+    with pytest.raises(ValueError):
+        Projection.fit(sample_vectors(3), 4)
+
+
+def test_version_follows_content_and_survives_save(tmp_path):
+    fitted = Projection.fit(sample_vectors(), 4)
+    version = fitted.save(str(tmp_path))
+    loaded = Projection.load(str(tmp_path), version)
+
+    assert version == fitted.version == loaded.version and version.startswith('pca4-')
+    assert Projection.fit(sample_vectors(seed=2), 4).version != version
+    assert loaded.info['fitted_rows'] == 200
+
+
+def test_collection_records_the_projection_it_was_written_with(tmp_path, monkeypatch):
+    monkeypatch.setattr(projection, 'PROJECTION_DIMS', 4)
+    store = MemoryStore(tmp_path)
+    collection = store.collection()
+    collection.modify(metadata={'hnsw:space': 'l2'})
+
+    stored = project_for_store(store, sample_vectors())
+    assert stored.shape == (200, 4)
+    version = collection.metadata[projection.VERSION_KEY]
+    assert collection.metadata[projection.DIMS_KEY] == 4 and 'hnsw:space' not in collection.metadata
+    # Queries are projected with the recorded matrix, not refitted
+    collection.upsert(ids=['1'], documents=['d'], metadatas=[{}], embeddings=stored[:1])
+    assert np.allclose(project_for_store(store, sample_vectors(1)), stored[:1])
+    assert collection_projection(store).version == version
+
+    # A collection whose projection file has gone missing refuses to project
+    projection._projections.clear()
+    other = MemoryStore(tmp_path / 'elsewhere')
+    other.collection().modify(metadata=collection.metadata)
+    with pytest.raises(RuntimeError, match=version):
+        project_for_store(other, sample_vectors(1))
+
+
+def test_populated_collection_is_not_fitted(tmp_path, monkeypatch):
+    monkeypatch.setattr(projection, 'PROJECTION_DIMS', 4)
+    store = MemoryStore(tmp_path)
+    store.collection().upsert(ids=['1'], documents=['d'], metadatas=[{}], embeddings=[np.zeros(16)])
+
+    assert project_for_store(store, sample_vectors(10)).shape == (10, 16)
+    assert projection.VERSION_KEY not in store.collection().metadata
+
+
+def test_reservoir_sample_is_uniform_and_bounded():
+    sample = reservoir_sample(range(10000), 500, seed=3)
+
+    assert len(sample) == 500 and len(set(sample)) == 500
+    # Rows from the end of the stream are as likely to be kept as rows from the start
+    assert 0.4 < np.mean(np.asarray(sample) < 5000) < 0.6
+    assert reservoir_sample(range(3), 5) == [0, 1, 2]
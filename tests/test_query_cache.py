@@ -0,0 +1,59 @@
+import numpy as np
+
+import query_cache
+from query_cache import LRUCache, QueryCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(query_cache.time, 'monotonic', clock)
+    cache = LRUCache(max_size=10, ttl=5)
+    cache.put('a', 1, cost_seconds=0.25)
+
+    clock.now += 5
+    assert cache.get('a') == 1
+    clock.now += 0.1
+    assert cache.get('a') is None
+    assert len(cache) == 0
+    assert cache.stats()['expirations'] == 1 and cache.stats()['saved_seconds'] == 0.25
+
+
+def test_lru_bound_evicts_least_recently_read():
+    cache = LRUCache(max_size=2, ttl=None)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.get('a')
+    cache.put('c', 3)
+
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+    assert cache.evictions == 1
+
+
+def test_results_are_keyed_by_query_and_dropped_on_generation_change():
+    cache = QueryCache(max_size=10, ttl=None)
+    embedding = np.ones(4, dtype=np.float32)
+    cache.put_embedding("How do I fix a faucet?", embedding)
+    cache.put_results(embedding, 3, ['r1'], filters={'category': 'Plumbing', 'exclude_tools': ['power']},
+                      generation='1:0')
+
+    assert cache.get_embedding("how do i  fix a FAUCET") is embedding
+    assert cache.get_results(embedding, 3, filters={'exclude_tools': ['power'], 'category': 'Plumbing'},
+                             generation='1:0') == ['r1']
+    assert cache.get_results(embedding, 3, generation='1:0') is None
+    assert cache.get_results(embedding, 3, filters={'category': 'Plumbing', 'exclude_tools': ['power']},
+                             generation='1:0', mode='hybrid') is None
+
+    # A write to the collection invalidates results but keeps query embeddings
+    assert cache.get_results(embedding, 3, filters={'category': 'Plumbing', 'exclude_tools': ['power']},
+                             generation='2:0') is None
+    assert cache.invalidations == 1 and len(cache.results) == 0
+    assert cache.get_embedding("how do i fix a faucet") is embedding
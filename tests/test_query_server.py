@@ -0,0 +1,87 @@
+import asyncio
+import json
+
+import pytest
+
+import query_server
+from query_server import QueryServer
+
+
+class RecordingWriter:
+    # Collects what the server writes to one connection
+
+    def __init__(self):
+        self.data = b''
+        self.closed = False
+
+    def write(self, data):
+        self.data += data
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+def exchange(raw: bytes, limit: int = 2 ** 16):
+    # Feed one connection's bytes to the server and return (status codes, last JSON body, writer)
+    async def run():
+        reader = asyncio.StreamReader(limit=limit)
+        reader.feed_data(raw)
+        reader.feed_eof()
+        writer = RecordingWriter()
+        await QueryServer(store=None).handle_connection(reader, writer)
+        return writer
+
+    writer = asyncio.run(run())
+    responses = writer.data.split(b'HTTP/1.1 ')[1:]
+    statuses = [int(response[:3]) for response in responses]
+    body = json.loads(responses[-1].split(b'\r\n\r\n', 1)[1]) if responses else None
+    return statuses, body, writer
+
+
+def post(body: bytes, headers: str = '') -> bytes:
+    return (f"POST /search HTTP/1.1\r\nContent-Length: {len(body)}\r\n{headers}\r\n").encode('latin-1') + body
+
+
+def test_oversized_body_gets_413_without_being_read(monkeypatch):
+    monkeypatch.setattr(query_server, 'MAX_BODY_BYTES', 16)
+    statuses, body, writer = exchange(post(b'{"query": "' + b'x' * 32 + b'"}'))
+
+    assert statuses == [413] and body == {'error': 'payload too large'}
+    assert writer.closed
+
+
+@pytest.mark.parametrize('raw', [
+    b"GARBAGE\r\n\r\n",
+    b"POST /search HTTP/1.1\r\nContent-Length: -5\r\n\r\n",
+    b"POST /search HTTP/1.1\r\nContent-Length: ten\r\n\r\n",
+    b"GET /health HTTP/1.1\r\nX-Long: " + b"a" * 200 + b"\r\n\r\n",
+])
+def test_malformed_requests_get_400_and_close(raw):
+    statuses, body, writer = exchange(raw, limit=128)
+
+    assert statuses == [400] and body['error'].startswith('bad request')
+    assert writer.closed
+
+
+@pytest.mark.parametrize('payload', [
+    b'not json',
+    b'{"top_k": 3}',
+    b'{"query": "faucet", "top_k": "many"}',
+    b'{"query": "faucet", "filters": {"colour": "red"}}',
+    b'{"query": "faucet", "mode": "fuzzy"}',
+    b'{"query": "faucet", "rerank": "yes"}',
+    b'{"query": "   "}',
+])
+def test_invalid_search_bodies_get_400_and_keep_the_connection(payload):
+    # A second request on the same connection is still served
+    statuses, _, _ = exchange(post(payload) + b"GET /nowhere HTTP/1.1\r\nConnection: close\r\n\r\n")
+
+    assert statuses == [400, 404]
+
+
+def test_search_requires_post():
+    statuses, body, _ = exchange(b"GET /search HTTP/1.1\r\nConnection: close\r\n\r\n")
+    assert statuses == [405] and body == {'error': 'use POST'}
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+import query_system
+from keyword_index import build_from_columns, update_index
+from memory_store import MemoryStore
+
+METADATAS = [
+    {'category': 'Plumbing', 'tools_required': 'Wrench'},
+    {'category': 'Painting', 'tools_required': 'Brush'},
+    {'category': 'Plumbing', 'tools_required': 'Plunger'},
+]
+
+
+@pytest.fixture
+def store(monkeypatch, tmp_path):
+    # A store whose rows the keyword index in tmp_path mirrors, with collection reads counted
+    monkeypatch.setattr(query_system, 'KEYWORD_INDEX_DIR', str(tmp_path / 'keywords'))
+    monkeypatch.setattr(query_system, '_store_metadata',
+                        {'generation': None, 'index': None, 'ids': None, 'main_build': None})
+    store = MemoryStore(tmp_path / 'store')
+    collection = store.collection()
+    ids = [str(i) for i in range(len(METADATAS))]
+    collection.upsert(ids, ids, METADATAS, np.eye(len(ids), dtype=np.float32))
+    store.mark_changed()
+    build_from_columns([{'ids': ids, 'documents': ids, 'metadatas': METADATAS}], str(tmp_path / 'keywords'),
+                       manifest={'generation': store.generation()})
+    store.reads = 0
+    get = collection.get
+
+    def counted_get(*args, **kwargs):
+        store.reads += 1
+        return get(*args, **kwargs)
+
+    collection.get = counted_get
+    return store
+
+
+def test_metadata_index_follows_writes_without_reading_the_store(store):
+    index, ids = query_system.get_store_metadata_index(store)
+    assert [ids[row] for row in index.candidates({'category': 'plumbing'})] == ['0', '2']
+
+    # Row 0 moves to Painting and row 2 is removed, the way sync applies a write to both indexes
+    changed = {'ids': ['0'], 'documents': ['0'], 'metadatas': [{'category': 'Painting', 'tools_required': 'Roller'}]}
+    store.collection().upsert(changed['ids'], changed['documents'], changed['metadatas'], np.ones((1, 3)))
+    store.collection().delete(ids=['2'])
+    store.mark_changed()
+    update_index(changed, ['2'], query_system.KEYWORD_INDEX_DIR, manifest={'generation': store.generation()})
+
+    index, ids = query_system.get_store_metadata_index(store)
+    assert [ids[row] for row in index.candidates({'category': 'painting'})] == ['1', '0']
+    assert index.candidates({'category': 'plumbing'}).tolist() == []
+    assert store.reads == 0
+
+
+def test_metadata_index_reads_the_store_when_the_keyword_index_is_behind(store):
+    store.mark_changed()
+    index, ids = query_system.get_store_metadata_index(store)
+    assert store.reads == 1
+    assert sorted(ids[row] for row in index.candidates({'tools_required': ['wrench']})) == ['0']
@@ -0,0 +1,82 @@
+import pytest
+
+from reranker import COST_SMOOTHING, CrossEncoderReranker
+
+
+class FakeCrossEncoder:
+    # Scores a pair by how many query words the text contains and counts the pairs it scored
+
+    def __init__(self):
+        self.pairs = 0
+
+    def predict(self, pairs, batch_size=None, show_progress_bar=False):
+        self.pairs += len(pairs)
+        return [float(sum(word in text.split() for word in query.split())) for query, text in pairs]
+
+
+def reranker_with(model, **kwargs):
+    reranker = CrossEncoderReranker(**kwargs)
+    reranker._model = model
+    return reranker
+
+
+def hits(*texts):
+    return [{'id': str(i), 'text': text} for i, text in enumerate(texts)]
+
+
+def test_reorders_by_cross_encoder_score_and_caches_pairs():
+    model = FakeCrossEncoder()
+    reranker = reranker_with(model, budget_ms=1000)
+    candidates = hits("paint the wall", "fix the leaky faucet washer", "replace faucet")
+
+    results, complete = reranker.rerank_many(["leaky faucet"], [candidates], 2)
+    assert complete
+    assert [hit['id'] for hit in results[0]] == ['1', '2']
+    assert results[0][0]['rerank_score'] == 2.0
+    # The same question again is answered from the score cache
+    reranker.rerank_many(["Leaky  faucet"], [candidates], 2)
+    assert model.pairs == 3 and reranker.passes == 1
+
+
+def test_nothing_to_rerank_is_complete():
+    reranker = reranker_with(FakeCrossEncoder())
+    assert reranker.rerank_many(["anything"], [[]], 3) == ([[]], True)
+
+    # A cross-encoder that cannot be loaded disables re-ranking rather than truncating it
+    disabled = CrossEncoderReranker()
+    disabled._load_failed = True
+    candidates = hits("a", "b", "c")
+    assert disabled.rerank_many(["query"], [candidates], 2) == ([candidates[:2]], True)
+
+
+def test_plan_shrinks_depth_to_fit_the_budget():
+    reranker = CrossEncoderReranker()
+    reranker.pair_seconds = 0.001
+    missing = [[True] * 20, [True] * 20]
+
+    assert reranker._plan(missing, 3, 0.040) == 20
+    assert reranker._plan(missing, 3, 0.013) == 6
+    # Not even top_k pairs per query fit
+    assert reranker._plan(missing, 3, 0.005) == 0
+    # Cached pairs are free
+    assert reranker._plan([[False] * 10 + [True] * 10], 3, 0.002) == 12
+    # A pool smaller than top_k only needs to fit itself
+    assert reranker._plan([[True, True]], 5, 0.002) == 2
+
+
+def test_budget_truncation_and_skips():
+    model = FakeCrossEncoder()
+    reranker = reranker_with(model, max_candidates=10)
+    reranker.pair_seconds = 0.001
+    candidates = hits(*[f"doc {i}" for i in range(10)])
+
+    results, complete = reranker.rerank_many(["doc"], [candidates], 2, budget_ms=5)
+    assert not complete and reranker.truncated == 1
+    assert len(results[0]) == 2 and model.pairs == 5
+
+    # A skip leaves the first-stage order and lowers the cost estimate so a later pass can re-measure it
+    reranker.pair_seconds = 0.01
+    results, complete = reranker.rerank_many(["fresh query"], [candidates], 2, budget_ms=5)
+    assert not complete and reranker.skipped == 1
+    assert results == [candidates[:2]]
+    assert reranker.pair_seconds == pytest.approx(0.01 * (1 - COST_SMOOTHING))
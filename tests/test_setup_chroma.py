@@ -0,0 +1,18 @@
+import numpy as np
+
+import setup_chroma
+from memory_store import MemoryStore
+
+
+def test_store_documents_writes_through_the_owning_store(tmp_path, monkeypatch):
+    def default_store(*args):
+        raise AssertionError("store_documents must not open the default store")
+
+    monkeypatch.setattr(setup_chroma, 'get_store', default_store)
+    store = MemoryStore(tmp_path, collection_name='other_snippets')
+    collection = store.collection()
+    documents = [{'id': str(i), 'text': f"snippet {i}", 'metadata': {'category': 'Plumbing'}} for i in range(3)]
+
+    assert setup_chroma.store_documents(store, collection, documents, np.ones((3, 4), dtype=np.float32))
+    assert sorted(collection.rows) == ['0', '1', '2']
+    assert store.generation() == "1:0"
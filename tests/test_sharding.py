@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+
+from memory_store import MemoryClient, MemoryCollection
+from sharding import _where_categories, open_sharded
+
+
+CATEGORIES = ['Plumbing', 'Painting', 'Electrical', 'Woodworking']
+
+
+def corpus(n=120, dim=8, seed=0):
+    rng = np.random.default_rng(seed)
+    ids = [f"doc{i}" for i in range(n)]
+    metadatas = [{'category': CATEGORIES[i % len(CATEGORIES)], 'tools_required': 'Wrench' if i % 2 else 'Drill'}
+                 for i in range(n)]
+    return ids, ids, metadatas, rng.normal(size=(n, dim)).astype(np.float32)
+
+
+@pytest.fixture(params=['hash', 'category'])
+def sharded(request, tmp_path):
+    collection = open_sharded(MemoryClient(), str(tmp_path), 'snippets', strategy=request.param, count=3)
+    yield collection
+    collection._executor.shutdown(wait=True)
+
+
+def test_heap_merge_matches_single_collection(sharded):
+    ids, documents, metadatas, embeddings = corpus()
+    single = MemoryCollection('single')
+    single.upsert(ids, documents, metadatas, embeddings)
+    sharded.upsert(ids, documents, metadatas, embeddings)
+    queries = np.random.default_rng(1).normal(size=(5, embeddings.shape[1])).astype(np.float32)
+
+    assert sharded.count() == len(ids)
+    assert len(sharded.shard_names()) == (3 if sharded.strategy == 'hash' else len(CATEGORIES))
+    expected = single.query(queries, n_results=10)
+    merged = sharded.query(queries, n_results=10)
+    assert merged['ids'] == expected['ids']
+    np.testing.assert_allclose(np.asarray(merged['distances']), np.asarray(expected['distances']), rtol=1e-6)
+    assert merged['metadatas'] == expected['metadatas']
+
+
+def test_filtered_query_matches_single_collection(sharded):
+    ids, documents, metadatas, embeddings = corpus()
+    single = MemoryCollection('single')
+    single.upsert(ids, documents, metadatas, embeddings)
+    sharded.upsert(ids, documents, metadatas, embeddings)
+    where = {'$and': [{'category': {'$in': ['Plumbing', 'Painting']}}, {'tools_required': {'$nin': ['Drill']}}]}
+
+    assert sharded.query(embeddings[:2], n_results=7, where=where)['ids'] == \
+        single.query(embeddings[:2], n_results=7, where=where)['ids']
+
+
+def test_get_pages_through_every_shard(sharded):
+    ids, documents, metadatas, embeddings = corpus(50)
+    sharded.upsert(ids, documents, metadatas, embeddings)
+
+    paged = []
+    for offset in range(0, 50, 16):
+        paged.extend(sharded.get(limit=16, offset=offset)['ids'])
+    assert sorted(paged) == sorted(ids)
+    assert sorted(sharded.get(ids=['doc3', 'doc40', 'missing'])['ids']) == ['doc3', 'doc40']
+
+
+def test_category_upsert_deletes_only_moved_rows(tmp_path):
+    client = MemoryClient()
+    sharded = open_sharded(client, str(tmp_path), 'snippets', strategy='category')
+    ids, documents, metadatas, embeddings = corpus(40)
+    sharded.upsert(ids, documents, metadatas, embeddings)
+    assert sum(collection.deleted_ids for collection in client.collections.values()) == 0
+
+    metadatas[0] = dict(metadatas[0], category='Painting')
+    sharded.upsert(ids, documents, metadatas, embeddings)
+    assert sum(collection.deleted_ids for collection in client.collections.values()) == 1
+    assert sharded.count() == 40
+    assert sharded.get(ids=['doc0'])['metadatas'] == [metadatas[0]]
+    sharded._executor.shutdown(wait=True)
+
+
+def test_refuses_to_hide_an_unsharded_collection(tmp_path):
+    client = MemoryClient()
+    ids, documents, metadatas, embeddings = corpus(5)
+    client.get_or_create_collection('snippets').upsert(ids, documents, metadatas, embeddings)
+
+    with pytest.raises(RuntimeError, match='5 unsharded documents'):
+        open_sharded(client, str(tmp_path), 'snippets', strategy='hash')
+    assert open_sharded(client, str(tmp_path), 'snippets', strategy='none') is None
+
+    # An empty plain collection holds nothing to lose
+    client.delete_collection('snippets')
+    client.get_or_create_collection('snippets')
+    sharded = open_sharded(client, str(tmp_path), 'snippets', strategy='hash')
+    assert sharded is not None
+    sharded._executor.shutdown(wait=True)
+
+
+def test_where_categories():
+    assert _where_categories({'category': 'Plumbing'}) == ['Plumbing']
+    assert _where_categories({'category': {'$in': ['A', 'B']}}) == ['A', 'B']
+    assert _where_categories({'category': {'$ne': 'A'}}) is None
+    assert _where_categories({'$and': [{'category': {'$in': ['A', 'B']}}, {'category': 'B'}]}) == ['B']
+    assert _where_categories({'$and': [{'tools_required': {'$in': ['Drill']}}]}) is None
+    assert _where_categories(None) is None
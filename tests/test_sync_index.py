@@ -0,0 +1,102 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import keyword_index
+import sync_index
+import text_chunking
+from ingest_data import documents_from_frame
+from keyword_index import KeywordIndex
+from memory_store import MemoryStore
+
+LONG_SNIPPET = " ".join(f"step{i}" for i in range(30))
+
+
+def fake_embeddings(texts):
+    return np.stack([np.frombuffer(hashlib.sha256(text.encode('utf-8')).digest()[:16], dtype=np.uint8)
+                     .astype(np.float32) for text in texts])
+
+
+@pytest.fixture
+def sync(monkeypatch, tmp_path):
+    # Word-level chunks of at most 10 tokens, fake embeddings and a keyword index under tmp_path
+    monkeypatch.setattr(text_chunking, 'get_tokenizer', lambda: (None, 12))
+    embedded = []
+
+    def generate(texts):
+        embedded.extend(texts)
+        return fake_embeddings(texts)
+
+    monkeypatch.setattr(sync_index, 'generate_batch_embeddings', generate)
+    keyword_dir = str(tmp_path / 'keywords')
+    monkeypatch.setattr(sync_index, 'update_keyword_index',
+                        lambda changes, removed, manifest: keyword_index.update_index(
+                            changes, removed, keyword_dir, manifest=manifest))
+    monkeypatch.setattr(sync_index, 'build_keyword_index',
+                        lambda store: keyword_index.build_from_store(keyword_dir, store=store))
+    store = MemoryStore(tmp_path / 'store')
+
+    def run(rows):
+        frame = pd.DataFrame(rows, columns=['id', 'category', 'snippet_text', 'tools_required', 'ppe_required'])
+        embedded.clear()
+        return sync_index.sync_documents(documents_from_frame(frame.astype(str)), store)
+
+    run.store = store
+    run.embedded = embedded
+    run.keyword_dir = keyword_dir
+    return run
+
+
+ROWS = [
+    (1, 'Plumbing', 'Fix a leaky faucet', 'Wrench', 'Gloves'),
+    (2, 'Painting', LONG_SNIPPET, 'Brush', 'Mask'),
+    (3, 'Woodworking', 'Sand the table top', 'Sander', 'Glasses'),
+]
+
+
+def test_diff_documents_classifies_by_content_hash():
+    documents = [{'id': doc_id, 'metadata': {'content_hash': content}}
+                 for doc_id, content in (('1', 'a'), ('2', 'b'), ('4', 'd'))]
+    diff = sync_index.diff_documents(documents, {'1': 'a', '2': 'old', '3': 'c'})
+
+    assert [doc['id'] for doc in diff['added']] == ['4']
+    assert [doc['id'] for doc in diff['updated']] == ['2']
+    assert diff['unchanged'] == ['1'] and diff['removed'] == ['3']
+
+
+def test_first_sync_adds_every_row(sync):
+    summary = sync(ROWS)
+
+    rows = sync.store.collection().rows
+    assert summary['added'] == 3 and summary['rows_written'] == len(rows)
+    assert len([doc_id for doc_id in rows if doc_id.startswith('2#chunk')]) > 1
+    assert len(KeywordIndex.load(sync.keyword_dir)) == len(rows)
+
+
+def test_unchanged_sync_embeds_and_writes_nothing(sync):
+    sync(ROWS)
+    generation = sync.store.generation()
+    summary = sync(ROWS)
+
+    assert summary['unchanged'] == 3
+    assert summary['rows_written'] == 0 and summary['rows_deleted'] == 0
+    assert sync.embedded == [] and sync.store.generation() == generation
+
+
+def test_sync_updates_changed_rows_and_deletes_removed_ones(sync):
+    sync(ROWS)
+    # Row 1 changes, row 2 shrinks to a single chunk and row 3 is removed
+    summary = sync([(1, 'Plumbing', 'Fix a dripping faucet', 'Wrench', 'Gloves'),
+                    (2, 'Painting', 'Paint the trim', 'Brush', 'Mask')])
+
+    assert set(sync.store.collection().rows) == {'1', '2'}
+    assert summary['updated'] == 2 and summary['deleted'] == 1
+    assert summary['rows_written'] == 2 and summary['rows_deleted'] > 2
+    assert sorted(sync.embedded) == ['Fix a dripping faucet', 'Paint the trim']
+
+    keywords = KeywordIndex.load(sync.keyword_dir)
+    assert len(keywords) == 2
+    assert keywords.search("leaky step0 sand", 5) == []
+    assert [doc_id for doc_id, _ in keywords.search("dripping", 5)] == ['1']
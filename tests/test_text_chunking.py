@@ -0,0 +1,58 @@
+import pytest
+
+import text_chunking
+from text_chunking import chunk_columns, collapse_to_parents, split_text
+
+WORDS = [f"word{i}" for i in range(25)]
+
+
+def test_short_text_is_one_chunk():
+    assert split_text("Fix a leaky faucet", 10) == ["Fix a leaky faucet"]
+    # Short in tokens but long in characters
+    assert split_text(" ".join(WORDS[:5]), 10) == [" ".join(WORDS[:5])]
+
+
+def test_long_text_splits_into_overlapping_windows():
+    chunks = split_text(" ".join(WORDS), 10, overlap=2)
+
+    assert all(len(chunk.split()) <= 10 for chunk in chunks)
+    assert chunks[0].split() == WORDS[:10]
+    # Each window repeats the last overlap tokens of the one before
+    for previous, current in zip(chunks, chunks[1:]):
+        assert current.split()[:2] == previous.split()[-2:]
+    assert chunks[-1].split()[-1] == WORDS[-1]
+
+
+def test_windows_end_on_word_boundaries():
+    # Punctuation is its own token, so a cut at 6 tokens would leave "ff" without "ee-"
+    chunks = split_text("aa bb cc dd ee-ff", 6, overlap=0)
+
+    assert chunks == ["aa bb cc dd", "ee-ff"]
+
+
+def test_chunk_columns_links_chunks_to_their_parent(monkeypatch):
+    monkeypatch.setattr(text_chunking, 'get_tokenizer', lambda: (None, 12))
+    columns = chunk_columns({'ids': ['1', '2'], 'documents': ["short one", " ".join(WORDS)],
+                             'metadatas': [{'content_hash': 'h1'}, {'content_hash': 'h2'}]})
+
+    assert columns['ids'][0] == '1' and columns['metadatas'][0]['content_hash'] == 'h1'
+    chunks = columns['metadatas'][1:]
+    assert columns['ids'][1:] == [f"2#chunk{i}" for i in range(len(chunks))]
+    assert {(m['parent_id'], m['parent_hash'], m['chunk_count']) for m in chunks} == {('2', 'h2', len(chunks))}
+    assert [m['chunk_index'] for m in chunks] == list(range(len(chunks)))
+    # Chunks get their own content hashes, so an edited chunk is told apart from its siblings
+    assert len({m['content_hash'] for m in chunks}) == len(chunks) and 'h2' not in {m['content_hash'] for m in chunks}
+
+
+@pytest.mark.parametrize('top_k, expected', [(3, ['2', '1', '3']), (2, ['2', '1'])])
+def test_collapse_keeps_best_chunk_per_parent(top_k, expected):
+    results = [
+        {'id': '2#chunk1', 'metadata': {'parent_id': '2'}},
+        {'id': '1', 'metadata': {'parent_id': '1'}},
+        {'id': '2#chunk0', 'metadata': {'parent_id': '2'}},
+        {'id': '3', 'metadata': None},
+    ]
+    collapsed = collapse_to_parents(results, top_k)
+
+    assert [hit['id'] for hit in collapsed] == expected
+    assert collapsed[0]['chunk_id'] == '2#chunk1' and 'chunk_id' not in collapsed[1]
@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from numpy_search import NumpySearchIndex, normalize_rows
+from vector_codecs import PQ_CENTROIDS, VectorCodec, train_pq_codebook
+
+
+def clustered_vectors(n: int, dim: int, clusters: int = 16, seed: int = 0) -> np.ndarray:
+    # Unit vectors scattered around a few directions, closer to real embeddings than isotropic noise
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    vectors = centers[rng.integers(clusters, size=n)] + 0.5 * rng.normal(size=(n, dim))
+    return normalize_rows(vectors.astype(np.float32))
+
+
+def recall_at(found: np.ndarray, truth: np.ndarray) -> float:
+    return float(np.mean([len(set(f) & set(t)) / len(t) for f, t in zip(found.tolist(), truth.tolist())]))
+
+
+def test_int8_uses_per_row_scale():
+    vectors = clustered_vectors(200, 32)
+    vectors[0] = 0.0
+    codec = VectorCodec.encode(vectors, 'int8')
+
+    assert codec.codes.dtype == np.int8
+    # Every non-zero row spans the full int8 range; an all-zero row keeps a usable scale
+    assert np.all(np.abs(codec.codes[1:]).max(axis=1) == 127)
+    assert codec.scales[0] == 1.0
+    decoded = codec.codes.astype(np.float32) * codec.scales[:, None]
+    assert np.all(np.abs(decoded - vectors) <= codec.scales[:, None] / 2 + 1e-6)
+
+
+def test_int8_and_fp16_scores_match_exact():
+    vectors = clustered_vectors(300, 32)
+    queries = clustered_vectors(5, 32, seed=1)
+    exact = queries @ vectors.T
+    for storage, tolerance in (('fp16', 1e-2), ('int8', 5e-2)):
+        codec = VectorCodec.encode(vectors, storage)
+        scores = codec.score(codec.prepare(queries), slice(0, len(vectors)))
+        assert np.abs(scores - exact).max() < tolerance, storage
+
+
+def test_pq_codebook_shape_and_dimension_check():
+    vectors = clustered_vectors(500, 32)
+    codebook = train_pq_codebook(vectors, subspaces=8, iterations=4)
+    assert codebook.shape == (8, PQ_CENTROIDS, 4)
+    with pytest.raises(ValueError):
+        train_pq_codebook(vectors, subspaces=5)
+
+
+def test_pq_adc_scores_equal_inner_product_with_reconstruction():
+    vectors = clustered_vectors(600, 32)
+    queries = clustered_vectors(4, 32, seed=2)
+    codec = VectorCodec.encode(vectors, 'pq', subspaces=8)
+
+    subspaces, _, sub_dim = codec.codebook.shape
+    reconstructed = np.concatenate([codec.codebook[j, codec.codes[:, j]] for j in range(subspaces)], axis=1)
+    scores = codec.score(codec.prepare(queries), np.arange(len(vectors)))
+    np.testing.assert_allclose(scores, queries @ reconstructed.T, rtol=1e-4, atol=1e-4)
+
+
+def test_pq_recall_with_rerank_matches_exact():
+    vectors = clustered_vectors(2000, 32)
+    queries = clustered_vectors(20, 32, seed=3)
+    ids = [str(i) for i in range(len(vectors))]
+    exact_index = NumpySearchIndex(vectors, ids, ids, [{}] * len(ids))
+    pq_index = NumpySearchIndex(vectors, ids, ids, [{}] * len(ids),
+                                codec=VectorCodec.encode(vectors, 'pq', subspaces=8))
+
+    truth = np.stack([rows for rows, _ in exact_index.search_vectors(queries, 10, exact=True)])
+    approximate = np.stack([rows for rows, _ in pq_index.search_vectors(queries, 10, rerank=False)])
+    reranked = pq_index.search_vectors(queries, 10)
+    reranked_rows = np.stack([rows for rows, _ in reranked])
+
+    assert recall_at(reranked_rows, truth) >= 0.95
+    assert recall_at(reranked_rows, truth) >= recall_at(approximate, truth)
+    # Re-ranked scores are exact cosine scores of the returned rows
+    for (rows, scores), query in zip(reranked, queries):
+        np.testing.assert_allclose(scores, vectors[rows] @ query, rtol=1e-5, atol=1e-6)